@@ -5,7 +5,6 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "@
 import { useState, useEffect } from "react";
 import { 
   ResponsiveContainer, 
-  LineChart, 
   Line, 
   XAxis, 
   YAxis, 
@@ -14,7 +13,8 @@ import {
   Legend,
   ReferenceLine,
   AreaChart,
-  Area
+  Area,
+  ComposedChart
 } from "recharts";
 import { Skeleton } from "@/components/ui/skeleton";
 
@@ -27,6 +27,14 @@ type ResponseCurve = {
     decay: number;
     peak: number;
   };
+  // Posterior response over a spend-multiplier grid, precomputed by the trainer
+  curve?: {
+    multipliers: number[];
+    spend: number[];
+    mean: number[];
+    lower: number[];
+    upper: number[];
+  };
 };
 
 type ResponseCurves = Record<string, ResponseCurve>;
@@ -53,6 +61,30 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
     }
   }, [responseCurves]);
 
+  // Precomputed posterior curves are used when every channel has one
+  const hasPosteriorCurves = !!responseCurves && Object.keys(responseCurves).length > 0 &&
+    Object.values(responseCurves).every((curve) => !!curve.curve);
+
+  // Posterior mean and credible band per grid point, in KPI units
+  const generatePosteriorCurveData = () => {
+    if (!responseCurves || selectedChannelsResponse.length === 0) {
+      return [];
+    }
+
+    const grid = responseCurves[selectedChannelsResponse[0]].curve!.multipliers;
+    return grid.map((multiplier, i) => {
+      const dataPoint: any = { spend: multiplier };
+      selectedChannelsResponse.forEach((channel) => {
+        const curve = responseCurves[channel]?.curve;
+        if (curve) {
+          dataPoint[channel] = curve.mean[i];
+          dataPoint[`${channel}_band`] = [curve.lower[i], curve.upper[i]];
+        }
+      });
+      return dataPoint;
+    });
+  };
+
   // Generate response curve data points for multiple channels
   const generateResponseCurveData = () => {
     if (!responseCurves || selectedChannelsResponse.length === 0) {
@@ -102,6 +134,17 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
   // Calculate average response at 1x spend (current spend level)
   const calculateAverageResponse = () => {
     if (!responseCurves || selectedChannelsResponse.length === 0) return 0;
+
+    if (hasPosteriorCurves) {
+      // Grid point closest to current spend
+      const responses = selectedChannelsResponse.map(channel => {
+        const curve = responseCurves[channel].curve!;
+        const closest = curve.multipliers.reduce((best, m, i) =>
+          Math.abs(m - 1) < Math.abs(curve.multipliers[best] - 1) ? i : best, 0);
+        return curve.mean[closest];
+      });
+      return responses.reduce((sum, resp) => sum + resp, 0) / responses.length;
+    }
     
     const responses = selectedChannelsResponse.map(channel => {
       const channelData = responseCurves[channel];
@@ -208,7 +251,7 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
     }
   };
 
-  const responseCurveData = generateResponseCurveData();
+  const responseCurveData = hasPosteriorCurves ? generatePosteriorCurveData() : generateResponseCurveData();
   const adstockData = generateAdstockData();
 
   return (
@@ -244,7 +287,7 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
                 <Skeleton className="w-full h-full" />
               ) : responseCurveData.length > 0 ? (
                 <ResponsiveContainer width="100%" height="100%">
-                  <LineChart
+                  <ComposedChart
                     data={responseCurveData}
                     margin={{ top: 5, right: 30, left: 20, bottom: 5 }}
                   >
@@ -255,13 +298,27 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
                       tickFormatter={(value) => `${Number(value).toFixed(1)}x`}
                     />
                     <YAxis 
-                      label={{ value: 'Response', angle: -90, position: 'insideLeft' }} 
+                      label={{ value: hasPosteriorCurves ? 'Incremental Outcome' : 'Response', angle: -90, position: 'insideLeft' }} 
                     />
                     <Tooltip 
-                      formatter={(value, name) => [`${Number(value).toFixed(2)}`, name]}
+                      formatter={(value, name) => Array.isArray(value)
+                        ? [`${Number(value[0]).toFixed(2)} – ${Number(value[1]).toFixed(2)}`, name]
+                        : [`${Number(value).toFixed(2)}`, name]}
                       labelFormatter={(label) => `${Number(label).toFixed(1)}x Spend`}
                     />
                     <Legend />
+                    {hasPosteriorCurves && selectedChannelsResponse.map((channel, index) => (
+                      <Area
+                        key={`${channel}_band`}
+                        type="monotone"
+                        dataKey={`${channel}_band`}
+                        stroke="none"
+                        fill={channelColors[index % channelColors.length]}
+                        fillOpacity={0.15}
+                        name={`${channel} credible band`}
+                        legendType="none"
+                      />
+                    ))}
                     {selectedChannelsResponse.map((channel, index) => (
                       <Line 
                         key={channel}
@@ -271,9 +328,10 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
                         activeDot={{ r: 6 }} 
                         name={channel}
                         strokeWidth={2}
+                        dot={!hasPosteriorCurves}
                       />
                     ))}
-                    {responseCurves && Object.keys(responseCurves).length > 1 && (
+                    {!hasPosteriorCurves && responseCurves && Object.keys(responseCurves).length > 1 && (
                       <Line
                         key="average"
                         type="monotone"
@@ -314,7 +372,7 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
                         </text>
                       </>
                     )}
-                  </LineChart>
+                  </ComposedChart>
                 </ResponsiveContainer>
               ) : (
                 <div className="h-full flex items-center justify-center text-neutral-500 dark:text-neutral-400">
@@ -327,7 +385,9 @@ export function ResponseCurvesSection({ responseCurves, loading = false }: Respo
               {!loading && selectedChannelsResponse.length > 0 && responseCurves && (
                 <p>
                   Hill saturation curves show diminishing returns as spend increases. 
-                  Each channel has unique saturation characteristics based on real Meridian model parameters.
+                  {hasPosteriorCurves
+                    ? ' Lines are the posterior mean incremental outcome over the full history; shaded areas are credible bands across all posterior draws.'
+                    : ' Each channel has unique saturation characteristics based on real Meridian model parameters.'}
                 </p>
               )}
             </div>
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+On-demand analysis of a trained model from its stored posterior
+
+Answers ROI / contribution and response-curve queries for any date window,
+channel subset or channel grouping without re-fitting. Stores and response
+models are kept open per model, and answers are memoized per (model, query)
+in LRU caches that live as long as the warm worker process.
+
+Query (JSON):
+  {"type": "metrics" | "response_curve",
+   "start": "YYYY-MM-DD", "end": "YYYY-MM-DD",        optional window
+   "channels": [...],                                 optional subset
+   "groups": {"search": ["google_spend", ...]},       optional groupings
+   "quantiles": [0.05, 0.5, 0.95],
+   "multipliers": [0.0, 0.5, ...] or "max_multiplier": 3, "steps": 100,
+   "draws": 500}                                      posterior draws used
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from posterior_store import MANIFEST, STORE_DIR, open_store
+from response_model import ResponseModel
+
+DEFAULT_QUANTILES = (0.05, 0.5, 0.95)
+# Subsample of posterior draws used for queries; enough for stable bands
+DEFAULT_QUERY_DRAWS = int(os.getenv('MERIDIAN_ANALYSIS_DRAWS', '500'))
+# Curves evaluate every draw at every grid point, so they use fewer draws by default
+DEFAULT_CURVE_DRAWS = int(os.getenv('MERIDIAN_ANALYSIS_CURVE_DRAWS', '200'))
+RESULT_CACHE_SIZE = int(os.getenv('MERIDIAN_ANALYSIS_CACHE_SIZE', '256'))
+MODEL_CACHE_SIZE = int(os.getenv('MERIDIAN_ANALYSIS_MODELS', '8'))
+
+_models: 'OrderedDict[tuple, ResponseModel]' = OrderedDict()
+_results: 'OrderedDict[tuple, Dict[str, Any]]' = OrderedDict()
+
+
+def _lru_get(cache: OrderedDict, key):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    return None
+
+
+def _lru_put(cache: OrderedDict, key, value, max_size: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+
+
+def _store_version(model_dir: str) -> float:
+    """Manifest mtime, so a re-trained model never hits stale cache entries"""
+    return os.path.getmtime(os.path.join(model_dir, STORE_DIR, MANIFEST))
+
+
+def response_model(model_dir: str, draws: int) -> ResponseModel:
+    """Open (or reuse) the response model of a stored posterior"""
+    key = (os.path.abspath(model_dir), _store_version(model_dir), draws)
+    model = _lru_get(_models, key)
+    if model is None:
+        store = open_store(model_dir)
+        if store is None:
+            raise ValueError(f"No stored posterior in {model_dir}")
+        model = ResponseModel(store, max_draws=draws)
+        _lru_put(_models, key, model, MODEL_CACHE_SIZE)
+    return model
+
+
+def summarize(draws: np.ndarray, quantiles: List[float]) -> Dict[str, Any]:
+    """Mean and requested quantiles over the leading draw axis"""
+    values = np.quantile(draws, quantiles, axis=0)
+    return {
+        "mean": np.mean(draws, axis=0).tolist(),
+        "quantiles": {str(q): v.tolist() for q, v in zip(quantiles, values)},
+    }
+
+
+def _groups(query: Dict[str, Any], channels: List[str]) -> Dict[str, List[str]]:
+    """Named channel groups; every selected channel is its own group by default"""
+    return query.get('groups') or {channel: [channel] for channel in channels}
+
+
+def metrics_query(model: ResponseModel, query: Dict[str, Any]) -> Dict[str, Any]:
+    """ROI and contribution per channel or channel group within the window"""
+    quantiles = list(query.get('quantiles') or DEFAULT_QUANTILES)
+    groups = query.get('groups')
+    selected = sorted({c for members in groups.values() for c in members}) if groups else query.get('channels')
+    channel_idx = model.channel_index(selected)
+    names = [model.channels[i] for i in channel_idx]
+    mask = model.time_mask(query.get('start'), query.get('end'))
+
+    incremental = model.incremental(channel_idx, mask)[:, 0, :]
+    spend = model.window_spend(channel_idx, mask)
+
+    # Group columns by summing their members (a one-hot matrix product)
+    groups = _groups(query, names)
+    membership = np.array([[name in members for name in names] for members in groups.values()], dtype=float)
+    group_incremental = incremental @ membership.T
+    group_spend = membership @ spend
+    total = incremental.sum(axis=1, keepdims=True)
+    share = group_incremental / np.where(total != 0, total, np.nan)
+    roi = group_incremental / np.where(group_spend > 0, group_spend, np.nan)
+
+    incremental_summary = summarize(group_incremental, quantiles)
+    roi_summary = summarize(np.nan_to_num(roi), quantiles)
+    share_summary = summarize(np.nan_to_num(share), quantiles)
+    result = {}
+    for i, name in enumerate(groups):
+        result[name] = {
+            "channels": list(groups[name]),
+            "spend": float(group_spend[i]),
+            "incremental_outcome": _column(incremental_summary, i),
+            "roi": _column(roi_summary, i),
+            "contribution_share": _column(share_summary, i),
+        }
+    return {"groups": result, "n_periods": int(mask.sum())}
+
+
+def curve_query(model: ResponseModel, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Incremental outcome vs spend per channel over a grid of spend multipliers"""
+    quantiles = list(query.get('quantiles') or DEFAULT_QUANTILES)
+    channel_idx = model.channel_index(query.get('channels'))
+    mask = model.time_mask(query.get('start'), query.get('end'))
+    multipliers = query.get('multipliers')
+    if multipliers is None:
+        multipliers = np.linspace(0.0, float(query.get('max_multiplier', 3.0)), int(query.get('steps', 100))).tolist()
+
+    incremental = model.incremental(channel_idx, mask, multipliers)
+    spend = model.window_spend(channel_idx, mask)
+    summary = summarize(incremental, quantiles)
+
+    curves = {}
+    for j, i in enumerate(channel_idx):
+        curves[model.channels[i]] = {
+            "spend": (np.asarray(multipliers) * spend[j]).tolist(),
+            "mean": [row[j] for row in summary["mean"]],
+            "quantiles": {q: [row[j] for row in values] for q, values in summary["quantiles"].items()},
+        }
+    return {"multipliers": list(multipliers), "curves": curves}
+
+
+def stored_curve_query(model_dir: str, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The same answer as curve_query, read from the grid precomputed at training time
+
+    Applies to full-history queries on the stored grid with stored quantiles;
+    returns None for anything else so the caller computes it.
+    """
+    store = open_store(model_dir)
+    if store is None or not store.has('mean', 'curves'):
+        return None
+    if query.get('start') or query.get('end') or query.get('draws') or query.get('multipliers') is not None:
+        return None
+    multipliers = store.get('multipliers', 'curves')
+    if ('steps' in query and int(query['steps']) != len(multipliers)) or \
+            ('max_multiplier' in query and not np.isclose(float(query['max_multiplier']), multipliers[-1])):
+        return None
+    stored_quantiles = [round(float(q), 6) for q in store.get('quantiles', 'curves')]
+    quantiles = [round(float(q), 6) for q in query.get('quantiles') or DEFAULT_QUANTILES]
+    if any(q not in stored_quantiles for q in quantiles):
+        return None
+
+    channel_idx = [store.channels.index(c) for c in query.get('channels') or store.channels
+                   if c in store.channels]
+    if len(channel_idx) != len(query.get('channels') or store.channels):
+        return None
+    mean, bands, spend = store.get('mean', 'curves'), store.get('bands', 'curves'), store.get('spend', 'curves')
+    curves = {}
+    for i in channel_idx:
+        curves[store.channels[i]] = {
+            "spend": (multipliers * spend[i]).tolist(),
+            "mean": mean[:, i].tolist(),
+            "quantiles": {str(q): bands[stored_quantiles.index(q), :, i].tolist() for q in quantiles},
+        }
+    return {"multipliers": multipliers.tolist(), "curves": curves, "precomputed": True}
+
+
+def _column(summary: Dict[str, Any], i: int) -> Dict[str, Any]:
+    return {
+        "mean": summary["mean"][i],
+        "quantiles": {q: values[i] for q, values in summary["quantiles"].items()},
+    }
+
+
+QUERIES = {
+    'metrics': metrics_query,
+    'roi': metrics_query,
+    'contribution': metrics_query,
+    'response_curve': curve_query,
+}
+
+
+def run_query(model_dir: str, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer one query, from the LRU if the same model and query were seen before"""
+    start = time.perf_counter()
+    query_type = query.get('type', 'metrics')
+    if query_type not in QUERIES:
+        raise ValueError(f"Unknown query type: {query_type}")
+
+    default_draws = DEFAULT_CURVE_DRAWS if query_type == 'response_curve' else DEFAULT_QUERY_DRAWS
+    draws = int(query.get('draws') or default_draws)
+    key = (os.path.abspath(model_dir), _store_version(model_dir),
+           json.dumps(query, sort_keys=True, default=str))
+    cached = _lru_get(_results, key)
+    if cached is None and query_type == 'response_curve':
+        stored = stored_curve_query(model_dir, query)
+        if stored is not None:
+            cached = {"type": query_type, **stored}
+            _lru_put(_results, key, cached, RESULT_CACHE_SIZE)
+            return {**cached, "cached": False, "seconds": round(time.perf_counter() - start, 4)}
+    if cached is None:
+        model = response_model(model_dir, draws)
+        cached = {"type": query_type, "n_draws": model.n_draws, **QUERIES[query_type](model, query)}
+        _lru_put(_results, key, cached, RESULT_CACHE_SIZE)
+        hit = False
+    else:
+        hit = True
+    return {**cached, "cached": hit, "seconds": round(time.perf_counter() - start, 4)}
+
+
+def main(model_dir: str, query_json: str):
+    """Run one analysis query against a model directory; bad queries return an error"""
+    try:
+        return run_query(model_dir, json.loads(query_json))
+    except (ValueError, OSError) as e:
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(json.dumps({
+            "error": "Usage: python analysis_service.py <model_dir> <query_json>"
+        }))
+        sys.exit(1)
+
+    print(json.dumps(main(sys.argv[1], sys.argv[2])))
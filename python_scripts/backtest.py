@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Rolling-origin backtest of a model config (out-of-sample accuracy)
+
+The last folds x horizon periods are split into consecutive holdout windows.
+Fold k is fitted on every period before its window (an expanding window) and
+forecasts the window from its posterior: the fold's data ends with the window,
+whose KPI is masked out of the likelihood with ModelSpec.holdout_id while its
+media and controls are used as observed. Each fold reports MAPE, WAPE, bias
+and credible-interval coverage on its window next to the in-sample fit.
+
+Baseline time effects get one knot per training period (Meridian's default
+for geo models), so holdout periods carry the last fitted period's baseline
+instead of knots that only the prior informs.
+
+Folds run in spawned processes pinned to their own cores. They share the
+upload's prepared arrays (built once, then memory-mapped and sliced per
+fold) and skip everything a training run adds after sampling. Folds can
+start their chains, with shortened warmup, from a stored posterior, but only
+one fitted on data that ends within the fold's training window: a fit that saw
+a holdout window would leak it into the starting point. Folds that cannot use
+one sample cold and say why. The prior draws a warm start needs are read from
+or added to the prior cache, so rerunning a backtest does not sample them again.
+
+Each process runs a contiguous chain of folds, and every fold after the first
+in a chain starts from the previous fold's posterior. That fit ends with the
+previous holdout window, which is exactly the end of this fold's training
+window, and its KPI was masked out of the likelihood, so nothing leaks. The
+first fold of a chain starts from config.backtest.warm_start_dir, if given.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from data_prep import input_data_from_arrays
+from data_refresh import TIME_BLOCKS
+from dataset_cache import load_dataset
+from posterior_metrics import flatten_draws, to_numpy
+from posterior_store import open_store, save_posterior
+from prior_cache import PRIOR_DRAWS, PriorSamples, prior_cache, prior_cache_key
+from sampling import (available_cores, core_groups, model_coords, pin_to_cores, sample_posterior,
+                      sampler_variables, warm_start_state)
+from train_meridian_corrected import get_sampling_config, meridian_version
+from train_sweep import CORES_PER_FIT
+
+DEFAULT_FOLDS = 4
+DEFAULT_HORIZON = 4
+# Fewest periods the first fold may be trained on
+DEFAULT_MIN_TRAIN_PERIODS = 26
+# Credible mass of the forecast interval whose coverage is reported
+INTERVAL_MASS = 0.9
+
+
+def backtest_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold settings from config.backtest, with defaults"""
+    backtest = config.get('backtest') or {}
+    return {
+        "folds": int(backtest.get('folds', DEFAULT_FOLDS)),
+        "horizon": int(backtest.get('horizon', DEFAULT_HORIZON)),
+        "min_train_periods": int(backtest.get('min_train_periods', DEFAULT_MIN_TRAIN_PERIODS)),
+        "processes": backtest.get('processes'),
+        "warm_start_dir": backtest.get('warm_start_dir') or None,
+    }
+
+
+def fold_windows(n_times: int, folds: int, horizon: int, min_train_periods: int) -> List[Dict[str, int]]:
+    """Training length and holdout window of each fold, the last ending at the final period"""
+    if folds < 1 or horizon < 1:
+        raise ValueError("A backtest needs at least one fold and a horizon of at least one period")
+    first = n_times - folds * horizon
+    if first < min_train_periods:
+        raise ValueError(f"{folds} folds of {horizon} periods leave {max(first, 0)} periods to train "
+                         f"the first fold on; at least {min_train_periods} are needed")
+    return [{"fold": k, "train_periods": first + k * horizon, "end": first + (k + 1) * horizon}
+            for k in range(folds)]
+
+
+def fold_arrays(arrays: Dict[str, Any], end: int) -> Dict[str, Any]:
+    """Prepared arrays cut after period end (views of the cached arrays)"""
+    fold = dict(arrays)
+    fold['times'] = list(arrays['times'])[:end]
+    for name in TIME_BLOCKS:
+        if arrays[name] is not None:
+            fold[name] = arrays[name][:, :end]
+    return fold
+
+
+def holdout_id(n_geos: int, n_times: int, train_periods: int) -> np.ndarray:
+    """ModelSpec.holdout_id marking the periods after train_periods"""
+    mask = np.zeros((n_geos, n_times), dtype=bool)
+    mask[:, train_periods:] = True
+    return mask[0] if n_geos == 1 else mask
+
+
+def fold_knots(n_geos: int, train_periods: int) -> Optional[List[int]]:
+    """One knot per training period for geo models; national models keep Meridian's single knot"""
+    return list(range(train_periods)) if n_geos > 1 else None
+
+
+def fold_chains(n_folds: int, n_processes: int) -> List[List[int]]:
+    """Contiguous runs of fold indices, one per process; each fold warm-starts from the one before it"""
+    return [chain.tolist() for chain in np.array_split(np.arange(n_folds), max(1, min(n_processes, n_folds)))]
+
+
+def warm_start_source(warm_start_dir: str, last_training_period: str) -> Tuple[Optional[str], Optional[str]]:
+    """(warm_start_dir, None) if its stored fit saw no period after last_training_period, else (None, reason)"""
+    store = open_store(warm_start_dir)
+    if store is None:
+        return None, "no stored posterior"
+    times = [str(t) for t in store.coords.get('time') or []]
+    if not times:
+        return None, "stored fit has no time labels"
+    if max(times) > last_training_period:
+        return None, f"stored fit includes periods up to {max(times)}, after the fold's training window"
+    return warm_start_dir, None
+
+
+def _errors(actual: np.ndarray, forecast: np.ndarray) -> Dict[str, float]:
+    residual = forecast - actual
+    nonzero = actual != 0
+    total = np.sum(np.abs(actual))
+    return {
+        "mape": float(np.mean(np.abs(residual[nonzero] / actual[nonzero]))) if nonzero.any() else None,
+        "wape": float(np.sum(np.abs(residual)) / total) if total > 0 else None,
+        "bias": float(np.sum(residual) / total) if total > 0 else None,
+    }
+
+
+def forecast_metrics(actual: np.ndarray, draws: np.ndarray, train_periods: int,
+                     mass: float = INTERVAL_MASS) -> Dict[str, Any]:
+    """Holdout and in-sample errors of the posterior mean, per geo-period and summed over geos
+
+    actual is (geo, time) and draws (draw, geo, time) over the fold's periods.
+    """
+    forecast = draws.mean(axis=0)
+    holdout = slice(train_periods, None)
+    lower, upper = np.quantile(draws[:, :, holdout], [(1 - mass) / 2, (1 + mass) / 2], axis=0)
+    window = actual[:, holdout]
+    return {
+        "holdout": {
+            **_errors(window, forecast[:, holdout]),
+            "coverage": float(np.mean((window >= lower) & (window <= upper))),
+            "interval_mass": mass,
+        },
+        "holdout_total": _errors(window.sum(axis=0), forecast[:, holdout].sum(axis=0)),
+        "in_sample": _errors(actual[:, :train_periods], forecast[:, :train_periods]),
+    }
+
+
+def run_fold(data_file: str, config: Dict[str, Any], window: Dict[str, int],
+             sampling_config: Dict[str, Any], warm_start_dir: Optional[str],
+             save_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Fit one fold on its training periods and score its forecast of the holdout window
+
+    With save_dir, the fold's posterior is stored there for the next fold to start from.
+    """
+    start = time.perf_counter()
+    from meridian.analysis.analyzer import Analyzer
+    from meridian.model.model import Meridian
+    from meridian.model.spec import ModelSpec
+
+    arrays = fold_arrays(load_dataset(data_file).prepared_arrays(config), window['end'])
+    n_geos, train_periods = len(arrays['geos']), window['train_periods']
+    model_spec = ModelSpec(holdout_id=holdout_id(n_geos, window['end'], train_periods),
+                           knots=fold_knots(n_geos, train_periods))
+    input_data = input_data_from_arrays(arrays)
+    model = Meridian(input_data=input_data, model_spec=model_spec)
+
+    # Warm-starting needs the fold model's prior for anything the stored fit does not cover
+    warm_start, prior, skipped = None, None, None
+    if warm_start_dir:
+        warm_start_dir, skipped = warm_start_source(warm_start_dir, str(arrays['times'][train_periods - 1]))
+    if warm_start_dir:
+        seed = sampling_config.get('seed')
+        prior = PriorSamples(prior_cache(), prior_cache_key(arrays, model_spec, PRIOR_DRAWS, seed,
+                                                            meridian_version()))
+        prior.start(input_data, model_spec, PRIOR_DRAWS, seed)
+        warm_start = warm_start_state(warm_start_dir, prior, int(sampling_config['n_chains']), config,
+                                      model_coords(model, arrays), sampler_variables(model))
+
+    diagnostics = sample_posterior(model, sampling_config, 1, data_file, config, warm_start=warm_start)
+    if prior is not None:
+        prior.attach(model)
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        save_posterior(model, arrays, save_dir)
+
+    # Expected outcome of every draw over every period, train and holdout alike
+    draws = flatten_draws(to_numpy(Analyzer(model).expected_outcome(aggregate_geos=False, aggregate_times=False)))
+    actual = np.asarray(arrays['kpi'], dtype=np.float64).reshape(draws.shape[1:])
+    times = arrays['times']
+    return {
+        **window,
+        "train_start": str(times[0]),
+        "holdout_start": str(times[train_periods]),
+        "holdout_end": str(times[-1]),
+        **forecast_metrics(actual, draws, train_periods),
+        "converged": diagnostics.get('converged'),
+        "rhat_max": diagnostics.get('rhat_max'),
+        "warm_start": diagnostics.get('warm_start'),
+        "warm_start_skipped": skipped,
+        "prior_cache_hit": prior.hit if prior is not None else None,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def summarize_folds(folds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mean holdout errors over the folds that finished"""
+    done = [fold for fold in folds if fold.get('success')]
+    summary = {"folds": len(folds), "succeeded": len(done)}
+    for group in ('holdout', 'holdout_total', 'in_sample'):
+        for metric in ('mape', 'wape', 'bias'):
+            values = [fold[group][metric] for fold in done if fold[group].get(metric) is not None]
+            summary[f"{group}_{metric}"] = float(np.mean(values)) if values else None
+    coverage = [fold['holdout']['coverage'] for fold in done]
+    summary["holdout_coverage"] = float(np.mean(coverage)) if coverage else None
+    return summary
+
+
+def backtest_processes(settings: Dict[str, Any], n_folds: int) -> int:
+    """Pool size, from config.backtest.processes, MERIDIAN_BACKTEST_PROCESSES or the available cores"""
+    value = settings.get('processes')
+    if value is None:
+        value = os.getenv('MERIDIAN_BACKTEST_PROCESSES') or len(available_cores()) // CORES_PER_FIT
+    return max(1, min(int(value), n_folds))
+
+
+def _initialize_fold_process(queue):
+    """Pool initializer: pin this process to one core group before Meridian is imported"""
+    pin_to_cores(queue.get())
+
+
+def run_backtest(data_file: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    settings = backtest_settings(config)
+    # Built once here; the folds memory-map the cached arrays
+    arrays = load_dataset(data_file).prepared_arrays(config)
+    windows = fold_windows(len(arrays['times']), settings['folds'], settings['horizon'],
+                           settings['min_train_periods'])
+    sampling_config = get_sampling_config()
+    n_processes = backtest_processes(settings, len(windows))
+    print(json.dumps({"status": "backtest_started", "folds": len(windows), "horizon": settings['horizon'],
+                      "processes": n_processes, "warm_start_dir": settings['warm_start_dir']}), flush=True)
+
+    folds = [None] * len(windows)
+    chains = fold_chains(len(windows), n_processes)
+    following = {chain[j]: chain[j + 1] for chain in chains for j in range(len(chain) - 1)}
+    # Each fold's posterior goes to its own directory; sources[i] is the fold that fold i starts from
+    work_dir = tempfile.mkdtemp(prefix='meridian_backtest_')
+    sources = {chain[0]: None for chain in chains}
+
+    def done(index: int, fold: Dict[str, Any]):
+        folds[index] = fold
+        completed = sum(f is not None for f in folds)
+        print(json.dumps({"status": "backtest_fold_done", "fold": index, "success": fold['success'],
+                          "holdout_mape": (fold.get('holdout') or {}).get('mape'),
+                          "holdout_wape": (fold.get('holdout') or {}).get('wape'),
+                          "progress": int(100 * completed / len(windows))}), flush=True)
+
+    def fold_args(i: int) -> tuple:
+        source = settings['warm_start_dir']
+        if sources[i] is not None:
+            source = os.path.join(work_dir, f'fold_{sources[i]}')
+        save_dir = os.path.join(work_dir, f'fold_{i}') if i in following else None
+        return data_file, config, windows[i], sampling_config, source, save_dir
+
+    def finish(i: int, run) -> Optional[int]:
+        """Record fold i from run() and return the next fold of its chain, if any"""
+        try:
+            fold = {**run(), "success": True, "warm_start_fold": sources[i]}
+        except Exception as e:
+            fold = {**windows[i], "success": False, "error": str(e)}
+        done(i, fold)
+        if i not in following:
+            return None
+        # A failed fold hands on its own starting point, which ends even earlier
+        sources[following[i]] = i if fold['success'] else sources[i]
+        return following[i]
+
+    try:
+        if n_processes == 1:
+            i = chains[0][0]
+            while i is not None:
+                i = finish(i, lambda: run_fold(*fold_args(i)))
+        else:
+            context = multiprocessing.get_context('spawn')
+            queue = context.Queue()
+            for cores in core_groups(available_cores(), [1] * n_processes):
+                queue.put(cores)
+            with ProcessPoolExecutor(max_workers=n_processes, mp_context=context,
+                                     initializer=_initialize_fold_process, initargs=(queue,)) as pool:
+                pending = {pool.submit(run_fold, *fold_args(chain[0])): chain[0] for chain in chains}
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        following_fold = finish(pending.pop(future), future.result)
+                        if following_fold is not None:
+                            pending[pool.submit(run_fold, *fold_args(following_fold))] = following_fold
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "settings": {key: settings[key] for key in ('folds', 'horizon', 'min_train_periods', 'warm_start_dir')},
+        "processes": n_processes,
+        "summary": summarize_folds(folds),
+        "folds": folds,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main(data_file: str, config_file: str, output_file: str):
+    """Backtest the config on the upload and write the per-fold report to output_file"""
+    with open(config_file) as f:
+        config = json.load(f)
+
+    try:
+        report = run_backtest(data_file, config)
+    except (ValueError, OSError) as e:
+        print(json.dumps({"status": "error", "message": str(e)}))
+        with open(output_file, 'w') as f:
+            json.dump({"success": False, "error": str(e)}, f, indent=2)
+        return {"status": "error", "error": str(e)}
+
+    with open(output_file, 'w') as f:
+        json.dump({"success": True, **report}, f, indent=2)
+    print(json.dumps({"status": "completed", "progress": 100, **report['summary']}))
+    return {"status": "completed", **report['summary']}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(json.dumps({
+            "error": "Usage: python backtest.py <data_file> <config_file> <output_file>"
+        }))
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3])
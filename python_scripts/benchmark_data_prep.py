@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark InputData array preparation: shared columnar builder vs the old per-channel loop
+
+Usage: python benchmark_data_prep.py [n_geos] [n_weeks] [n_channels]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from data_prep import prepare_arrays, parse_dates
+
+
+def synthetic_frame(n_geos: int, n_weeks: int, n_channels: int, n_controls: int = 3) -> pd.DataFrame:
+    """Random long-format geo panel with the column layout of our uploads"""
+    rng = np.random.default_rng(0)
+    n_rows = n_geos * n_weeks
+    weeks = pd.date_range('2021-01-03', periods=n_weeks, freq='W').strftime('%d/%m/%Y')
+    data = {
+        'geo': np.repeat([f'geo_{g:03d}' for g in range(n_geos)], n_weeks),
+        'date': np.tile(weeks, n_geos),
+        'revenue': rng.gamma(5.0, 1000.0, n_rows),
+        'population': np.repeat(rng.integers(50000, 5000000, n_geos), n_weeks),
+    }
+    for i in range(n_channels):
+        data[f'ch{i}_spend'] = rng.gamma(2.0, 500.0, n_rows)
+        data[f'ch{i}_impressions'] = rng.gamma(2.0, 50000.0, n_rows)
+    for i in range(n_controls):
+        data[f'control_{i}'] = rng.normal(size=n_rows)
+    return pd.DataFrame(data)
+
+
+def legacy_prepare(df: pd.DataFrame, config: dict) -> dict:
+    """The zero-fill-then-copy loop the trainers used before data_prep
+
+    It has no geo support, so it treats the whole panel as one long series.
+    """
+    n_time_periods = len(df)
+    n_geos = 1
+    dates = pd.to_datetime(df[config['date_column']], dayfirst=True).dt.strftime('%Y-%m-%d').tolist()
+    kpi_vals = df[config['target_column']].values.reshape(n_geos, n_time_periods)
+
+    channels = config['channel_columns']
+    media_vals = np.zeros((n_geos, n_time_periods, len(channels)))
+    spend_vals = np.zeros((n_geos, n_time_periods, len(channels)))
+    for i, channel in enumerate(channels):
+        impression_col = channel.replace('_spend', '_impressions')
+        if impression_col in df.columns:
+            media_vals[0, :, i] = df[impression_col].values
+        elif channel in df.columns:
+            media_vals[0, :, i] = df[channel].values
+        if channel in df.columns:
+            spend_vals[0, :, i] = df[channel].values
+
+    control_cols = config['control_columns']
+    controls_vals = np.zeros((n_geos, n_time_periods, len(control_cols)))
+    for i, col in enumerate(control_cols):
+        controls_vals[0, :, i] = df[col].values
+
+    return {'times': dates, 'kpi': kpi_vals, 'media': media_vals,
+            'media_spend': spend_vals, 'controls_values': controls_vals}
+
+
+def measure(fn, *args, repeats: int = 3, **kwargs) -> dict:
+    """Best wall time of fn, plus its peak traced allocation from a separate run"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    # tracemalloc slows allocation down, so measure memory on its own
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(min(times), 4), "peak_mb": round(peak / 2**20, 1)}
+
+
+def main(n_geos: int = 200, n_weeks: int = 156, n_channels: int = 40):
+    """Run the benchmark and print one JSON line per builder"""
+    n_rows = n_geos * n_weeks
+    df = synthetic_frame(n_geos, n_weeks, n_channels)
+    config = {
+        'date_column': 'date',
+        'target_column': 'revenue',
+        'geo_column': 'geo',
+        'channel_columns': [f'ch{i}_spend' for i in range(n_channels)],
+        'control_columns': ['control_0', 'control_1', 'control_2'],
+    }
+
+    print(json.dumps({"benchmark": "data_prep", "rows": n_rows, "geos": n_geos,
+                      "weeks": n_weeks, "channels": n_channels}))
+    print(json.dumps({"builder": "legacy_loop", **measure(legacy_prepare, df, config)}))
+    print(json.dumps({"builder": "columnar_float64", **measure(prepare_arrays, df, config)}))
+    print(json.dumps({"builder": "columnar_float32",
+                      **measure(prepare_arrays, df, config, dtype=np.float32)}))
+
+    # Array work alone, with the date column already parsed
+    dates = parse_dates(df['date'])
+    print(json.dumps({"builder": "columnar_float64_parsed_dates",
+                      **measure(prepare_arrays, df, config, dates=dates)}))
+
+    # Rows in random order exercise the sort-once geo pivot
+    shuffled = df.sample(frac=1.0, random_state=0).reset_index(drop=True)
+    print(json.dumps({"builder": "columnar_float64_shuffled_rows",
+                      **measure(prepare_arrays, shuffled, config)}))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:4]])
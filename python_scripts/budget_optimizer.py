@@ -0,0 +1,566 @@
+#!/usr/bin/env python3
+"""
+Budget allocation over a fitted model's response curves
+
+Maximizes total incremental outcome sum_m R_m(x_m) subject to a total budget,
+per-channel spend bounds and locked channels. R_m is either the stored
+model's adstock + Hill response at posterior-mean parameters (StoreResponse)
+or, for results without a stored posterior, each channel's Hill curve scaled
+to its fitted contribution (HillResponse). Both evaluate values and analytic
+gradients for every channel in one vectorized call.
+
+The solver starts from the better of the current allocation and a greedy
+marginal-return fill, then runs projected gradient ascent with backtracking.
+The projection onto {sum x = budget, lo <= x <= hi} is a bisection on a single
+shift. grid_reference() brute-forces small problems to check the solver.
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from posterior_store import open_store
+from response_model import ANALYSIS_THREADS, CHUNK_ELEMENTS, ResponseModel, geometric_adstock
+
+# Meridian's default: each channel may move 30% either way from current spend
+DEFAULT_SPEND_CONSTRAINT = 0.3
+MAX_ITERATIONS = 500
+TOLERANCE = 1e-9
+GREEDY_STEPS = 100
+# Posterior draws per batched evaluation in posterior mode (0 = every stored draw)
+OPTIMIZER_DRAWS = int(os.getenv('MERIDIAN_OPTIMIZER_DRAWS', '1000'))
+# Smallest draw chunk worth handing to another thread
+DRAW_CHUNK = 64
+DISTRIBUTION_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Multipliers below this are treated as this, so gradients stay finite at zero spend
+MIN_MULTIPLIER = 1e-6
+# Fewest budget levels per frontier process by default: warm starts chain only
+# within a segment, and each process pays to start and rebuild the response
+FRONTIER_MIN_SEGMENT_LEVELS = 25
+
+
+class HillResponse:
+    """Per-channel Hill curve in spend multipliers, scaled to the fitted contribution at current spend"""
+
+    def __init__(self, spend: np.ndarray, contribution: np.ndarray, ec: np.ndarray, slope: np.ndarray):
+        self.spend = np.asarray(spend, dtype=np.float64)
+        self.ec = np.asarray(ec, dtype=np.float64)
+        self.slope = np.asarray(slope, dtype=np.float64)
+        self.scale = np.asarray(contribution, dtype=np.float64) * (1 + self.ec ** self.slope)
+
+    def value_and_grad(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Outcome per channel at spend x (M,) and its derivative with respect to spend"""
+        spend = np.where(self.spend > 0, self.spend, 1.0)
+        k = np.maximum(x / spend, MIN_MULTIPLIER)
+        h = 1.0 / (1.0 + (self.ec / k) ** self.slope)
+        value = np.where(self.spend > 0, self.scale * h, 0.0)
+        grad = np.where(self.spend > 0, self.scale * self.slope * h * (1 - h) / k / spend, 0.0)
+        return value, grad
+
+    @property
+    def row_elements(self) -> int:
+        return len(self.spend)
+
+    def batch_values(self, x: np.ndarray) -> np.ndarray:
+        """Outcome per channel for each row of spend x (B, M)"""
+        spend = np.where(self.spend > 0, self.spend, 1.0)
+        k = np.maximum(x / spend, MIN_MULTIPLIER)
+        return np.where(self.spend > 0, self.scale / (1.0 + (self.ec / k) ** self.slope), 0.0)
+
+
+class StoreResponse:
+    """Adstock + Hill response of a stored model as a function of each channel's spend
+
+    Each channel's media is scaled over the whole history by x_m / spend_m,
+    as in ResponseModel.incremental; the outcome is summed over the time
+    window. Adstock is linear, so adstocked media and (ec / a)^slope are
+    computed once, and each evaluation is one batched pass over
+    (draws, M, geo, time). With per_draw=False the posterior-mean parameters
+    are used as a single draw.
+    """
+
+    def __init__(self, model: ResponseModel, mask: Optional[np.ndarray] = None, per_draw: bool = False):
+        if mask is None:
+            mask = model.time_mask()
+        if per_draw:
+            alpha, ec, slope, beta = model.alpha, model.ec, model.slope, model.beta
+            dtype = np.float32
+        else:
+            alpha, ec, slope, beta = (v.mean(axis=0, keepdims=True).astype(np.float64)
+                                      for v in (model.alpha, model.ec, model.slope, model.beta))
+            dtype = np.float64
+
+        channels = list(range(len(model.channels)))
+        self.channels = list(model.channels)
+        self.spend = model.window_spend(channels, mask)
+        adstocked = geometric_adstock(model.media_scaled[None].astype(dtype), alpha.astype(dtype), model.max_lag)
+
+        # (draws, channel, geo, time) within the window; geo weights are not broadcast over time
+        adstocked = np.ascontiguousarray(adstocked[:, :, mask].transpose(0, 3, 1, 2))
+        with np.errstate(divide='ignore', over='ignore'):
+            self.ratio = np.power(ec[:, :, None, None] / adstocked, slope[:, :, None, None]).astype(dtype)
+        self.geo_weights = (beta * model.outcome_scale[None, :, None]).transpose(0, 2, 1).astype(dtype)
+        self.slope = np.asarray(slope, dtype=np.float64)
+
+    @property
+    def n_draws(self) -> int:
+        return self.ratio.shape[0]
+
+    def draw_values_and_grads(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Outcome per draw and channel at spend x (M,), and its derivative, both (draws, M)
+
+        Large draw counts are split into chunks evaluated on a thread pool.
+        """
+        spend = np.where(self.spend > 0, self.spend, 1.0)
+        k = np.maximum(x / spend, MIN_MULTIPLIER)
+        scale = (k[None, :] ** -self.slope).astype(self.ratio.dtype)
+        values = np.empty((self.n_draws, len(k)))
+        grads = np.empty((self.n_draws, len(k)))
+
+        def run(chunk: slice):
+            h = self.ratio[chunk] * scale[chunk, :, None, None]
+            h += 1.0
+            with np.errstate(over='ignore'):
+                np.reciprocal(h, out=h)
+            values[chunk] = np.einsum('smg,smgt->sm', self.geo_weights[chunk], h)
+            # d/dk 1 / (1 + k^-s r) = s h (1 - h) / k
+            h *= 1.0 - h
+            grads[chunk] = np.einsum('smg,smgt->sm', self.geo_weights[chunk], h)
+
+        size = max(DRAW_CHUNK, -(-self.n_draws // ANALYSIS_THREADS))
+        chunks = [slice(i, i + size) for i in range(0, self.n_draws, size)]
+        if len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(ANALYSIS_THREADS, len(chunks))) as pool:
+                list(pool.map(run, chunks))
+        else:
+            run(chunks[0])
+
+        grads *= self.slope / k / spend
+        has_spend = self.spend > 0
+        return np.where(has_spend, values, 0.0), np.where(has_spend, grads, 0.0)
+
+    @property
+    def row_elements(self) -> int:
+        """Intermediate elements per evaluated allocation, for sizing batches"""
+        return self.ratio.size
+
+    def batch_values(self, x: np.ndarray) -> np.ndarray:
+        """Outcome per channel for each row of spend x (B, M), averaged over draws"""
+        spend = np.where(self.spend > 0, self.spend, 1.0)
+        k = np.maximum(np.atleast_2d(x) / spend, MIN_MULTIPLIER)
+        values = np.zeros(k.shape)
+        for s in range(self.n_draws):
+            h = self.ratio[s][None] * (k ** -self.slope[s]).astype(self.ratio.dtype)[:, :, None, None]
+            h += 1.0
+            with np.errstate(over='ignore'):
+                np.reciprocal(h, out=h)
+            values += np.einsum('mg,bmgt->bm', self.geo_weights[s], h)
+        return np.where(self.spend > 0, values / self.n_draws, 0.0)
+
+    def value_and_grad(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Posterior expected outcome per channel at spend x (M,) and its derivative"""
+        values, grads = self.draw_values_and_grads(x)
+        return values.mean(axis=0), grads.mean(axis=0)
+
+
+class ShortfallObjective:
+    """Risk-adjusted objective: mean total outcome of the draws at or below the q-quantile
+
+    Per-channel values are the channel outcomes averaged over those tail
+    draws, so they sum to the objective and the optimizer interface is
+    unchanged; the gradient is the tail draws' mean gradient.
+    """
+
+    def __init__(self, response: StoreResponse, quantile: float):
+        if not 0 < quantile < 1:
+            raise ValueError(f"risk_quantile must be between 0 and 1, got {quantile}")
+        self.response = response
+        self.n_tail = max(1, int(np.ceil(quantile * response.n_draws)))
+
+    def value_and_grad(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        values, grads = self.response.draw_values_and_grads(x)
+        tail = np.argpartition(values.sum(axis=1), self.n_tail - 1)[:self.n_tail]
+        return values[tail].mean(axis=0), grads[tail].mean(axis=0)
+
+
+def outcome_distribution(response: StoreResponse, x: np.ndarray, current: np.ndarray,
+                         quantiles: Sequence[float] = DISTRIBUTION_QUANTILES) -> Dict[str, Any]:
+    """Posterior distribution of total outcome at allocation x and of its lift over the current one"""
+    totals = response.draw_values_and_grads(x)[0].sum(axis=1)
+    lift = totals - response.draw_values_and_grads(current)[0].sum(axis=1)
+
+    def summary(values: np.ndarray) -> Dict[str, Any]:
+        return {
+            "mean": float(values.mean()),
+            "sd": float(values.std()),
+            "quantiles": {str(q): float(v) for q, v in zip(quantiles, np.quantile(values, quantiles))},
+        }
+    return {
+        "n_draws": int(len(totals)),
+        "outcome": summary(totals),
+        "lift": {**summary(lift), "prob_positive": float((lift > 0).mean())},
+    }
+
+
+def channel_values(response, x: np.ndarray) -> np.ndarray:
+    """Per-channel objective value for each row of x (B, M), in memory-bounded row chunks"""
+    x = np.atleast_2d(x)
+    if hasattr(response, 'batch_values'):
+        rows = max(1, CHUNK_ELEMENTS // response.row_elements)
+        return np.concatenate([response.batch_values(x[i:i + rows]) for i in range(0, len(x), rows)])
+    return np.stack([response.value_and_grad(row)[0] for row in np.atleast_2d(x)])
+
+
+def spend_bounds(channels: List[str], current: np.ndarray, config: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-channel (lo, hi) from relative constraints, absolute overrides and locked channels"""
+    lower = float(config.get('spend_constraint_lower', DEFAULT_SPEND_CONSTRAINT))
+    upper = float(config.get('spend_constraint_upper', DEFAULT_SPEND_CONSTRAINT))
+    lo = current * max(0.0, 1 - lower)
+    hi = current * (1 + upper)
+
+    for channel, bounds in (config.get('channel_constraints') or {}).items():
+        if channel not in channels:
+            raise ValueError(f"Unknown channel in constraints: {channel}")
+        i = channels.index(channel)
+        if bounds.get('min') is not None:
+            lo[i] = float(bounds['min'])
+        if bounds.get('max') is not None:
+            hi[i] = float(bounds['max'])
+
+    for channel in config.get('locked_channels') or []:
+        if channel not in channels:
+            raise ValueError(f"Unknown locked channel: {channel}")
+        i = channels.index(channel)
+        lo[i] = hi[i] = current[i]
+
+    if np.any(lo > hi):
+        bad = [channels[i] for i in np.flatnonzero(lo > hi)]
+        raise ValueError(f"Minimum spend exceeds maximum for: {bad}")
+    return lo, hi
+
+
+def project(y: np.ndarray, budget: float, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Euclidean projection of y onto {sum x = budget, lo <= x <= hi}"""
+    low, high = float(np.min(y - hi)), float(np.max(y - lo))
+    for _ in range(100):
+        shift = 0.5 * (low + high)
+        if np.clip(y - shift, lo, hi).sum() > budget:
+            low = shift
+        else:
+            high = shift
+        if high - low <= 1e-12 * max(1.0, abs(budget)):
+            break
+    return np.clip(y - 0.5 * (low + high), lo, hi)
+
+
+def greedy_fill(response, budget: float, lo: np.ndarray, hi: np.ndarray,
+                steps: int = GREEDY_STEPS) -> np.ndarray:
+    """Fill from the lower bounds in equal increments, each to the channel with the largest gain"""
+    x = lo.copy()
+    increment = (budget - lo.sum()) / steps
+    if increment <= 0:
+        return x
+    value = response.value_and_grad(x)[0]
+    for _ in range(steps):
+        room = hi - x
+        step = np.minimum(increment, room)
+        if not np.any(step > 0):
+            break
+        trial = response.value_and_grad(x + step)[0]
+        # Gain per unit spend, so channels near their cap are compared fairly
+        gain = np.where(step > 0, (trial - value) / np.where(step > 0, step, 1.0), -np.inf)
+        best = int(np.argmax(gain))
+        x[best] += step[best]
+        value[best] = trial[best]
+    return project(x, budget, lo, hi)
+
+
+def projected_gradient(response, x: np.ndarray, budget: float, lo: np.ndarray, hi: np.ndarray,
+                       max_iterations: int = MAX_ITERATIONS, tolerance: float = TOLERANCE,
+                       projector=None):
+    """Projected gradient ascent with Armijo backtracking; returns (x, total, iterations, converged)
+
+    x may have any shape; projector(y) replaces the default projection onto
+    {sum x = budget, lo <= x <= hi} for feasible sets with extra structure.
+    """
+    if projector is None:
+        projector = lambda y: project(y, budget, lo, hi)  # noqa: E731
+    value, grad = response.value_and_grad(x)
+    total = value.sum()
+    step = 0.1 * max(budget, 1.0) / (np.abs(grad).max() + 1e-12)
+    for iteration in range(1, max_iterations + 1):
+        while True:
+            candidate = projector(x + step * grad)
+            new_value, new_grad = response.value_and_grad(candidate)
+            new_total = new_value.sum()
+            if new_total >= total + 1e-4 * np.vdot(grad, candidate - x) or step < 1e-12:
+                break
+            step *= 0.5
+        moved = np.abs(candidate - x).max()
+        improved = new_total - total
+        x, total, grad = candidate, new_total, new_grad
+        if moved <= tolerance * max(budget, 1.0) or 0 <= improved <= tolerance * max(abs(total), 1.0):
+            return x, total, iteration, True
+        step *= 2.0
+    return x, total, max_iterations, False
+
+
+def optimize(response, channels: List[str], current: np.ndarray, budget: float,
+             lo: np.ndarray, hi: np.ndarray, surrogate=None,
+             warm_start: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Best allocation of `budget` under the bounds, from two starting points
+
+    With a cheap surrogate (posterior-mean response for a per-draw one), the
+    greedy start and a first solve run on the surrogate, and only the final
+    ascent from its optimum and from the current allocation uses `response`.
+    A warm_start (e.g. a solution for nearby constraints) replaces that start.
+    """
+    start = time.perf_counter()
+    if lo.sum() > budget * (1 + 1e-9) or hi.sum() < budget * (1 - 1e-9):
+        raise ValueError(f"Budget {budget:.2f} is outside the feasible range "
+                         f"[{lo.sum():.2f}, {hi.sum():.2f}] for the channel bounds")
+
+    surrogate_iterations = 0
+    if warm_start is not None:
+        warm = warm_start
+    else:
+        warm = greedy_fill(surrogate or response, budget, lo, hi)
+        if surrogate is not None:
+            warm, _, surrogate_iterations, _ = projected_gradient(surrogate, warm, budget, lo, hi)
+    runs = [projected_gradient(response, project(x0, budget, lo, hi), budget, lo, hi)
+            for x0 in (current, warm)]
+    x, total, iterations, converged = max(runs, key=lambda run: run[1])
+
+    current_value = response.value_and_grad(current)[0]
+    optimal_value, marginal = response.value_and_grad(x)
+    return {
+        "allocation": dict(zip(channels, x.tolist())),
+        "current_outcome": float(current_value.sum()),
+        "optimal_outcome": float(optimal_value.sum()),
+        "channel_outcome": dict(zip(channels, optimal_value.tolist())),
+        "marginal_roi": dict(zip(channels, marginal.tolist())),
+        "iterations": int(sum(run[2] for run in runs)),
+        "surrogate_iterations": int(surrogate_iterations),
+        "warm_started": warm_start is not None,
+        "converged": bool(converged),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def grid_reference(response, budget: float, lo: np.ndarray, hi: np.ndarray,
+                   points: int = 41, max_free: int = 4) -> Tuple[np.ndarray, float]:
+    """Brute-force optimum on a grid, for checking optimize() on small problems
+
+    Every free channel but the last takes `points` values in its bounds and
+    the last takes whatever budget remains.
+    """
+    free = np.flatnonzero(hi > lo)
+    if len(free) > max_free:
+        raise ValueError(f"Grid reference supports at most {max_free} free channels")
+    if len(free) == 0:
+        return lo.copy(), float(response.value_and_grad(lo)[0].sum())
+
+    grids = [np.linspace(lo[i], hi[i], points) for i in free[:-1]]
+    combos = np.stack(np.meshgrid(*grids, indexing='ij'), axis=-1).reshape(-1, len(grids)) \
+        if grids else np.zeros((1, 0))
+    x = np.tile(lo, (len(combos), 1))
+    x[:, free[:-1]] = combos
+    last = free[-1]
+    x[:, last] = budget - (x.sum(axis=1) - x[:, last])
+    feasible = (x[:, last] >= lo[last] - 1e-9) & (x[:, last] <= hi[last] + 1e-9)
+    x = x[feasible]
+    totals = channel_values(response, x).sum(axis=1)
+    best = int(np.argmax(totals))
+    return x[best], float(totals[best])
+
+
+def response_from_results(model_results: Dict[str, Any], model_dir: Optional[str] = None,
+                           config: Optional[Dict[str, Any]] = None):
+    """(response, channels, current spend, response model) from a stored posterior, or results.json
+
+    config['mode'] == 'posterior' evaluates every (or config['draws']
+    subsampled) posterior draw instead of the posterior-mean parameters.
+    """
+    config = config or {}
+    store = open_store(model_dir) if model_dir else None
+    if store is not None:
+        if config.get('mode') == 'posterior':
+            draws = int(config.get('draws') if config.get('draws') is not None else OPTIMIZER_DRAWS)
+            model = ResponseModel(store, max_draws=draws or None, seed=int(config.get('seed', 0)))
+            response = StoreResponse(model, per_draw=True)
+        else:
+            model = ResponseModel(store)
+            response = StoreResponse(model)
+        return response, response.channels, response.spend.copy(), model
+    if config.get('mode') == 'posterior':
+        raise ValueError("Posterior optimization needs the model's stored posterior")
+
+    channel_analysis = model_results['channel_analysis']
+    curves = model_results.get('response_curves') or {}
+    channels = list(channel_analysis)
+    spend = np.array([channel_analysis[c].get('total_spend', 0.0) for c in channels], dtype=np.float64)
+    contribution = np.array([channel_analysis[c].get('contribution', 0.0) for c in channels], dtype=np.float64)
+    saturation = [(curves.get(c) or {}).get('saturation') or {} for c in channels]
+    ec = np.array([s.get('ec', 1.0) for s in saturation], dtype=np.float64)
+    slope = np.array([s.get('slope', 1.0) for s in saturation], dtype=np.float64)
+    return HillResponse(spend, contribution, ec, slope), channels, spend, None
+
+
+def optimize_from_results(model_results: Dict[str, Any], config: Dict[str, Any],
+                          model_dir: Optional[str] = None, warm_start=None) -> Dict[str, Any]:
+    """Optimal allocation for a trained model under the constraints in config
+
+    warm_start(channels, budget, lo, hi) may return an allocation {channel:
+    spend} to start from, e.g. the cached solution of the nearest constraints.
+    """
+    response, channels, current, model = response_from_results(model_results, model_dir, config)
+    budget = float(config.get('total_budget') or current.sum())
+    lo, hi = spend_bounds(channels, current, config)
+    x0 = None
+    if warm_start is not None:
+        allocation = warm_start(channels, budget, lo, hi)
+        if allocation is not None and all(c in allocation for c in channels):
+            x0 = np.array([allocation[c] for c in channels], dtype=np.float64)
+            # Rescale to the new budget before projecting onto the new bounds
+            x0 = project(x0 * budget / max(x0.sum(), 1e-12), budget, lo, hi)
+
+    objective = response
+    if config.get('risk_quantile') is not None:
+        if not isinstance(response, StoreResponse) or response.n_draws < 2:
+            raise ValueError("risk_quantile needs posterior mode")
+        objective = ShortfallObjective(response, float(config['risk_quantile']))
+    surrogate = None
+    if isinstance(response, StoreResponse) and response.n_draws > 1:
+        surrogate = StoreResponse(model)
+    result = optimize(objective, channels, current, budget, lo, hi, surrogate, warm_start=x0)
+    result['objective_value'] = {"current": result['current_outcome'], "optimal": result['optimal_outcome']}
+    result.update({
+        "current_allocation": dict(zip(channels, current.tolist())),
+        "total_budget": budget,
+        "response": "posterior_store" if isinstance(response, StoreResponse) else "hill_curves",
+        "mode": config.get('mode', 'mean'),
+        "objective": "expected_shortfall" if objective is not response else "expected_outcome",
+        "bounds": {c: {"min": float(l), "max": float(h)} for c, l, h in zip(channels, lo, hi)},
+    })
+    if isinstance(response, StoreResponse) and response.n_draws > 1:
+        x = np.array([result['allocation'][c] for c in channels])
+        result['distribution'] = outcome_distribution(response, x, current)
+        # Report the expectation even when a risk-adjusted objective was optimized
+        result['current_outcome'] = result['distribution']['outcome']['mean'] - result['distribution']['lift']['mean']
+        result['optimal_outcome'] = result['distribution']['outcome']['mean']
+    return result
+
+
+def frontier_levels(config: Dict[str, Any]) -> np.ndarray:
+    """Budget levels as fractions of current total spend (default 50% to 200% in 10% steps)"""
+    if config.get('budget_levels'):
+        return np.array(sorted(float(level) for level in config['budget_levels']))
+    low = float(config.get('min_budget_level', 0.5))
+    high = float(config.get('max_budget_level', 2.0))
+    step = float(config.get('budget_level_step', 0.1))
+    return np.round(np.arange(low, high + step / 2, step), 6)
+
+
+def frontier_processes(config: Dict[str, Any], n_levels: int) -> int:
+    """Solver processes for a frontier, from config or MERIDIAN_OPTIMIZER_PROCESSES
+
+    By default one process, fanning out only for long frontiers: up to the core
+    count, with at least FRONTIER_MIN_SEGMENT_LEVELS levels per process.
+    """
+    value = config.get('processes') or os.getenv('MERIDIAN_OPTIMIZER_PROCESSES')
+    if value is None:
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        value = min(cores, n_levels // FRONTIER_MIN_SEGMENT_LEVELS)
+    return max(1, min(int(value), n_levels))
+
+
+def frontier_config(config: Dict[str, Any], levels: np.ndarray) -> Dict[str, Any]:
+    """Frontier defaults: any channel may go to zero or grow enough to absorb the largest budget"""
+    return {
+        'spend_constraint_lower': 1.0,
+        'spend_constraint_upper': max(float(levels.max()), DEFAULT_SPEND_CONSTRAINT),
+        **config,
+    }
+
+
+def _frontier_point(response, channels: List[str], x: np.ndarray, budget: float, level: float,
+                    lo: np.ndarray, hi: np.ndarray, iterations: int, converged: bool) -> Dict[str, Any]:
+    value, grad = response.value_and_grad(x)
+    # KKT multiplier: the common marginal ROI of channels strictly inside their bounds
+    free = (x > lo + 1e-9 * max(budget, 1.0)) & (x < hi - 1e-9 * max(budget, 1.0))
+    return {
+        "level": level,
+        "budget": budget,
+        "feasible": True,
+        "outcome": float(value.sum()),
+        "roi": float(value.sum() / budget) if budget > 0 else 0.0,
+        "marginal_roi": float(grad[free].mean()) if free.any() else None,
+        "allocation": dict(zip(channels, x.tolist())),
+        "iterations": iterations,
+        "converged": converged,
+    }
+
+
+def solve_frontier_segment(model_results: Dict[str, Any], config: Dict[str, Any],
+                           model_dir: Optional[str], levels: List[float]) -> List[Dict[str, Any]]:
+    """Solve consecutive budget levels, each warm-started from the previous solution"""
+    response, channels, current, _ = response_from_results(model_results, model_dir, config)
+    lo, hi = spend_bounds(channels, current, config)
+    points, previous = [], None
+    for level in levels:
+        budget = float(level * current.sum())
+        if lo.sum() > budget * (1 + 1e-9) or hi.sum() < budget * (1 - 1e-9):
+            points.append({"level": level, "budget": budget, "feasible": False})
+            continue
+        if previous is None:
+            solved = optimize(response, channels, current, budget, lo, hi)
+            x = np.array([solved['allocation'][c] for c in channels])
+            iterations, converged = solved['iterations'], solved['converged']
+        else:
+            # The neighbouring optimum scaled to this budget is usually already close; the
+            # current mix scaled to it guards against a channel left stranded at zero spend
+            # where its S-shaped curve is flat
+            runs = [projected_gradient(response, project(x0 * budget / x0.sum(), budget, lo, hi), budget, lo, hi)
+                    for x0 in (previous, current)]
+            x, _, iterations, converged = max(runs, key=lambda run: run[1])
+            iterations = sum(run[2] for run in runs)
+        points.append(_frontier_point(response, channels, x, budget, level, lo, hi, iterations, converged))
+        previous = x
+    return points
+
+
+def budget_frontier(model_results: Dict[str, Any], config: Dict[str, Any],
+                    model_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Optimal outcome and allocation at each budget level, solved in contiguous segments across processes"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    start = time.perf_counter()
+    levels = frontier_levels(config)
+    config = frontier_config(config, levels)
+    n_processes = frontier_processes(config, len(levels))
+    segments = [list(segment) for segment in np.array_split(levels.tolist(), n_processes)]
+
+    if n_processes == 1:
+        points = solve_frontier_segment(model_results, config, model_dir, segments[0])
+    else:
+        # Each process rebuilds the response and warm-starts within its own segment
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=n_processes, mp_context=context) as pool:
+            futures = [pool.submit(solve_frontier_segment, model_results, config, model_dir, segment)
+                       for segment in segments]
+            points = [point for future in futures for point in future.result()]
+
+    # Slope of the frontier between neighbouring feasible levels
+    feasible = [point for point in points if point['feasible']]
+    for before, after in zip(feasible, feasible[1:]):
+        after['incremental_roi'] = (after['outcome'] - before['outcome']) / (after['budget'] - before['budget'])
+
+    return {
+        "levels": levels.tolist(),
+        "points": points,
+        "processes": n_processes,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+On-disk checkpoints for segmented posterior sampling
+
+Each finished segment's draws are written to model_outputs/model_N/checkpoints/
+as their own NetCDF file, and manifest.json lists the segments together with
+the run fingerprint and the sampler's last step size. A restarted job with the
+same fingerprint reloads the segments and continues from the last draw of each
+chain; any other fingerprint discards them. Checkpoints are removed once the
+fit succeeds, and ones left behind by abandoned runs are collected by age.
+
+Checkpointing is opt-in (checkpoint_draws). Without it an interrupted run has
+nothing to resume from and the server restarts it cold.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+CHECKPOINT_DIR = 'checkpoints'
+MANIFEST = 'manifest.json'
+# Off by default: every segment re-warms the sampler, so checkpointing is opt-in
+DEFAULT_CHECKPOINT_DRAWS = 0
+CHECKPOINT_MAX_AGE_HOURS = float(os.getenv('MERIDIAN_CHECKPOINT_MAX_AGE_HOURS', '72'))
+
+
+def checkpoint_draws(config: Dict[str, Any]) -> int:
+    """Kept draws per checkpointed segment, from config.sampling or MERIDIAN_CHECKPOINT_DRAWS
+
+    0, the default, disables checkpointing.
+    """
+    value = (config.get('sampling') or {}).get('checkpoint_draws')
+    if value is None:
+        value = os.getenv('MERIDIAN_CHECKPOINT_DRAWS', str(DEFAULT_CHECKPOINT_DRAWS))
+    return max(0, int(value))
+
+
+def load_inference_data(path: str):
+    """Read an InferenceData file fully into memory, so the file can be removed"""
+    import arviz as az
+
+    with az.rc_context({'data.load': 'eager'}):
+        return az.from_netcdf(path)
+
+
+class SamplingCheckpoint:
+    """Segments of one model's sampling run, valid only for the same fingerprint"""
+
+    def __init__(self, model_dir: str, fingerprint: str):
+        self.directory = os.path.join(model_dir, CHECKPOINT_DIR)
+        self.fingerprint = fingerprint
+
+    def _manifest(self) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def load(self):
+        """(segments, step_size) saved by an earlier run of this fingerprint"""
+        manifest = self._manifest()
+        if manifest is None:
+            return [], None
+        if manifest.get('fingerprint') != self.fingerprint:
+            print(json.dumps({"status": "checkpoint_discarded", "reason": "fingerprint_mismatch"}))
+            self.clear()
+            return [], None
+
+        try:
+            segments = [load_inference_data(os.path.join(self.directory, segment['file']))
+                        for segment in manifest['segments']]
+        except (OSError, ValueError) as e:
+            print(json.dumps({"status": "checkpoint_discarded", "reason": str(e)}))
+            self.clear()
+            return [], None
+        return segments, manifest.get('step_size')
+
+    def warm_started(self) -> bool:
+        """Whether the saved segments continue a warm-started first segment"""
+        manifest = self._manifest()
+        return bool(manifest and manifest.get('fingerprint') == self.fingerprint
+                    and manifest.get('warm_started'))
+
+    def save(self, index: int, segment, n_keep: int, step_size: Optional[float],
+             warm_started: bool = False):
+        """Add one finished segment; the manifest is replaced only after its file is complete"""
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f'segment_{index:04d}.nc'
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.nc.tmp')
+        os.close(fd)
+        segment.to_netcdf(tmp_path)
+        os.replace(tmp_path, os.path.join(self.directory, file_name))
+
+        manifest = self._manifest() or {"fingerprint": self.fingerprint, "segments": []}
+        manifest['segments'] = manifest['segments'][:index] + [{"file": file_name, "n_keep": n_keep}]
+        manifest['step_size'] = step_size
+        manifest['warm_started'] = warm_started
+        manifest['updated_at'] = time.time()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.json.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST))
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def collect_stale_checkpoints(outputs_root: str, max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS,
+                              keep: Optional[str] = None) -> List[str]:
+    """Remove checkpoint directories under outputs_root untouched for max_age_hours"""
+    removed = []
+    if not os.path.isdir(outputs_root):
+        return removed
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(outputs_root):
+        directory = os.path.join(outputs_root, name, CHECKPOINT_DIR)
+        if not os.path.isdir(directory) or (keep and os.path.abspath(directory) == os.path.abspath(keep)):
+            continue
+        if os.path.getmtime(directory) < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed.append(name)
+    return removed
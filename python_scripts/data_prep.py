@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Shared data preparation for the Meridian trainer scripts
+
+Builds the kpi / media / media_spend / controls / population arrays from the
+uploaded DataFrame in one columnar pass per block, then wraps them in the
+xarray DataArrays that Meridian's InputData expects.
+"""
+
+import json
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+DEFAULT_POPULATION = 1000000
+# First week of the sequential dates used when the date column cannot be parsed
+FALLBACK_START_DATE = np.datetime64('2023-01-01', 'ns')
+
+
+def parse_dates(values: pd.Series) -> np.ndarray:
+    """Parse the date column (DD/MM/YYYY first) into datetime64 values
+
+    If no format parses, each distinct value becomes one week of a sequence
+    starting at FALLBACK_START_DATE, in order of first appearance, so rows of
+    the same period (e.g. in different geos) keep sharing a date.
+    """
+    try:
+        parsed = pd.to_datetime(values, dayfirst=True)
+    except (ValueError, TypeError):
+        try:
+            # Fallback to mixed format parsing
+            parsed = pd.to_datetime(values, format='mixed', dayfirst=True)
+        except (ValueError, TypeError):
+            print(json.dumps({"warning": "could not parse dates; using sequential weekly dates"}))
+            codes, _ = pd.factorize(values)
+            return FALLBACK_START_DATE + codes * np.timedelta64(7, 'D')
+    return parsed.to_numpy(dtype='datetime64[ns]')
+
+
+def media_columns(df: pd.DataFrame, channels: List[str]) -> List[str]:
+    """Impression column for each channel, falling back to spend as a proxy"""
+    columns = []
+    for channel in channels:
+        impression_col = channel.replace('_spend', '_impressions')
+        columns.append(impression_col if impression_col in df.columns else channel)
+    return columns
+
+
+def population_column(config: Dict[str, Any]) -> str:
+    """Column holding population, used for Meridian's per-geo scaling"""
+    return config.get('population_scaling_column') or 'population'
+
+
+def control_columns(df: pd.DataFrame, config: Dict[str, Any]) -> List[str]:
+    """Control columns present in the data, excluding population (handled separately)"""
+    pop_col = population_column(config)
+    return [col for col in config.get('control_columns') or []
+            if col not in ('population', pop_col) and col in df.columns]
+
+
+def geo_column(df: pd.DataFrame, config: Dict[str, Any]) -> Optional[str]:
+    """Geo column to pivot on, or None for a national model"""
+    column = config.get('geo_column')
+    if column and config.get('use_geo', True) and column in df.columns:
+        return column
+    return None
+
+
+def panel_index(geo_values: np.ndarray, dates: np.ndarray):
+    """Sort order mapping long-format rows onto a dense (geo, time) grid
+
+    Rows are keyed by geo_code * n_times + time_code and sorted once; every
+    block is then gathered with that single order and reshaped, so the cost
+    is O(rows log rows) no matter how many geos there are. Returns
+    (order or None if already sorted, geo labels, time values).
+    """
+    geo_codes, geos = pd.factorize(geo_values, sort=True)
+    time_codes, times = pd.factorize(dates, sort=True)
+    n_geos, n_times = len(geos), len(times)
+
+    keys = geo_codes.astype(np.int64) * n_times + time_codes
+    if len(keys) == n_geos * n_times and np.all(keys[1:] > keys[:-1]):
+        # Uploads are usually already ordered by geo then date
+        return None, geos, times
+
+    order = np.argsort(keys, kind='stable')
+    if len(keys) != n_geos * n_times or np.any(keys[order] != np.arange(n_geos * n_times)):
+        counts = np.bincount(keys, minlength=n_geos * n_times)
+        duplicated = int(np.count_nonzero(counts > 1))
+        missing = int(np.count_nonzero(counts == 0))
+        raise ValueError(
+            f"Geo panel is not one row per geo and date: "
+            f"{duplicated} duplicated and {missing} missing (geo, date) pairs"
+        )
+    return order, geos, times
+
+
+def _block(df: pd.DataFrame, columns: List[str], dtype, order: Optional[np.ndarray],
+           n_geos: int, zero_fill: bool = False) -> np.ndarray:
+    """One (geo, time, n_columns) block from a single to_numpy call
+
+    Missing columns raise, unless zero_fill is set: then they are filled with
+    zeros and reported as a warning, as the trainers did for media channels.
+    """
+    missing = [col for col in columns if col not in df.columns]
+    if missing and not zero_fill:
+        raise ValueError(f"Columns not found in dataset: {missing}")
+    if missing:
+        print(json.dumps({"warning": "columns not found in dataset; using zeros", "columns": missing}))
+        values = np.zeros((len(df), len(columns)), dtype=dtype)
+        present = [i for i, col in enumerate(columns) if col in df.columns]
+        if present:
+            values[:, present] = df[[columns[i] for i in present]].to_numpy(dtype=dtype)
+    else:
+        values = df[columns].to_numpy(dtype=dtype)
+    if order is not None:
+        values = values[order]
+    # Rows are geo-major, so the geo axis is a reshape (a view, no copy)
+    return values.reshape(n_geos, -1, len(columns))
+
+
+def prepare_arrays(df: pd.DataFrame, config: Dict[str, Any], dtype=np.float64,
+                   dates: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Build every InputData block as plain NumPy arrays plus their coordinates
+
+    With a geo_column, long-format rows (one per geo and date) are pivoted
+    into (geo, time, channel) arrays; otherwise the data is one national geo.
+    """
+    channels = list(config['channel_columns'])
+    controls = control_columns(df, config)
+
+    if dates is None:
+        dates = parse_dates(df[config['date_column']])
+
+    geo_col = geo_column(df, config)
+    if geo_col:
+        order, geo_labels, times = panel_index(df[geo_col].to_numpy(), dates)
+        geos = [str(geo) for geo in geo_labels]
+    else:
+        order, geos, times = None, [0], dates
+    n_geos = len(geos)
+    time_coords = pd.DatetimeIndex(times).strftime('%Y-%m-%d').tolist()
+
+    kpi = _block(df, [config['target_column']], dtype, order, n_geos)[:, :, 0]
+    media = _block(df, media_columns(df, channels), dtype, order, n_geos, zero_fill=True)
+    media_spend = _block(df, channels, dtype, order, n_geos, zero_fill=True)
+    controls_vals = _block(df, controls, dtype, order, n_geos) if controls else None
+
+    # Population - handle GQV population scaling
+    population = np.full(n_geos, DEFAULT_POPULATION, dtype=dtype)
+    pop_col = population_column(config)
+    use_population = pop_col in df.columns and (
+        geo_col is not None
+        or pop_col in (config.get('control_columns') or [])
+        or config.get('population_scaling_column')
+    )
+    if use_population:
+        # Use each geo's average population if it varies over time
+        population[:] = _block(df, [pop_col], np.float64, order, n_geos)[:, :, 0].mean(axis=1)
+
+    return {
+        'geos': geos,
+        'times': time_coords,
+        'channels': channels,
+        'controls': controls,
+        'kpi': kpi,
+        'media': media,
+        'media_spend': media_spend,
+        'controls_values': controls_vals,
+        'population': population,
+    }
+
+
+def to_data_arrays(arrays: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap the prepared NumPy blocks in the xarray DataArrays InputData expects"""
+    import xarray as xr
+
+    geos, times, channels = arrays['geos'], arrays['times'], arrays['channels']
+
+    data_arrays = {
+        'kpi': xr.DataArray(
+            arrays['kpi'],
+            dims=['geo', 'time'],
+            coords={'geo': geos, 'time': times},
+            name='kpi'
+        ),
+        'media': xr.DataArray(
+            arrays['media'],
+            dims=['geo', 'media_time', 'media_channel'],
+            coords={'geo': geos, 'media_time': times, 'media_channel': channels},
+            name='media'
+        ),
+        'media_spend': xr.DataArray(
+            arrays['media_spend'],
+            dims=['geo', 'time', 'media_channel'],
+            coords={'geo': geos, 'time': times, 'media_channel': channels},
+            name='media_spend'
+        ),
+        'population': xr.DataArray(
+            arrays['population'],
+            dims=['geo'],
+            coords={'geo': geos},
+            name='population'
+        ),
+    }
+
+    if arrays['controls_values'] is not None:
+        data_arrays['controls'] = xr.DataArray(
+            arrays['controls_values'],
+            dims=['geo', 'time', 'control_variable'],
+            coords={'geo': geos, 'time': times, 'control_variable': arrays['controls']},
+            name='controls'
+        )
+
+    return data_arrays
+
+
+def input_data_from_arrays(arrays: Dict[str, Any]):
+    """Build a Meridian InputData from prepared (possibly cached) arrays"""
+    from meridian.data.input_data import InputData
+
+    # Log GQV detection
+    gqv_cols = [col for col in arrays['controls'] if 'gqv' in col.lower()]
+    if gqv_cols:
+        print(json.dumps({"status": "gqv_detected", "columns": gqv_cols}))
+
+    return InputData(kpi_type='revenue', **to_data_arrays(arrays))
+
+
+def build_input_data(df: pd.DataFrame, config: Dict[str, Any], dtype=np.float64,
+                     dates: Optional[np.ndarray] = None):
+    """Build a Meridian InputData from the uploaded DataFrame"""
+    arrays = prepare_arrays(df, config, dtype=dtype, dates=dates)
+    return input_data_from_arrays(arrays), arrays
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Incremental refresh of a model when an upload only appends new periods
+
+A refreshed upload is a strict time-extension of its base upload when every
+base row reappears unchanged and all other rows are dated after the base's
+last period. In that case the prepared arrays are built from the base
+upload's cached arrays plus only the appended rows, and stored in the new
+upload's cache, so the trainer's usual prepared_arrays() call is a cache hit.
+The refit then warm-starts from the parent model's posterior (see sampling.py)
+and the model records its lineage.
+"""
+
+import json
+import os
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+from data_prep import control_columns, geo_column, media_columns, population_column, prepare_arrays
+from dataset_cache import CachedDataset
+
+LINEAGE_FILE = 'lineage.json'
+# Blocks with a time axis (axis 1), concatenated when periods are appended
+TIME_BLOCKS = ('kpi', 'media', 'media_spend', 'controls_values')
+
+
+def used_columns(dataset: CachedDataset, config: Dict[str, Any]) -> List[str]:
+    """Columns the prepared arrays are built from"""
+    frame = dataset.frame
+    columns = [config['date_column'], config['target_column']] + list(config['channel_columns'])
+    columns += media_columns(frame, config['channel_columns']) + control_columns(frame, config)
+    geo = geo_column(frame, config)
+    if geo:
+        columns.append(geo)
+    if population_column(config) in frame.columns:
+        columns.append(population_column(config))
+    return list(dict.fromkeys(columns))
+
+
+def _row_order(dataset: CachedDataset, rows: np.ndarray, dates: np.ndarray, geo: Optional[str]) -> np.ndarray:
+    """Positions of rows sorted by (geo, date)"""
+    if geo is None:
+        return rows[np.argsort(dates[rows], kind='stable')]
+    geos = np.asarray(dataset.frame[geo].to_numpy()).astype(str)[rows]
+    return rows[np.lexsort((dates[rows], geos))]
+
+
+def _same_values(a: np.ndarray, b: np.ndarray) -> bool:
+    if np.issubdtype(a.dtype, np.number) and np.issubdtype(b.dtype, np.number):
+        return np.array_equal(a.astype(np.float64), b.astype(np.float64), equal_nan=True)
+    return np.array_equal(a.astype(str), b.astype(str))
+
+
+def time_extension(base: CachedDataset, new: CachedDataset, config: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Mask of the appended rows if new strictly extends base in time, else None"""
+    columns = used_columns(new, config)
+    if any(column not in base.columns for column in columns):
+        return None
+
+    date_column = config['date_column']
+    base_dates, new_dates = np.asarray(base.dates(date_column)), np.asarray(new.dates(date_column))
+    appended = new_dates > base_dates.max()
+    if not appended.any() or np.count_nonzero(~appended) != len(base_dates):
+        return None
+
+    geo = geo_column(new.frame, config)
+    base_order = _row_order(base, np.arange(len(base_dates)), base_dates, geo)
+    new_order = _row_order(new, np.flatnonzero(~appended), new_dates, geo)
+    if not np.array_equal(base_dates[base_order], new_dates[new_order]):
+        return None
+    for column in columns:
+        if column == date_column:
+            continue
+        base_values = np.asarray(base.frame[column].to_numpy())[base_order]
+        new_values = np.asarray(new.frame[column].to_numpy())[new_order]
+        if not _same_values(base_values, new_values):
+            return None
+    return appended
+
+
+def extended_arrays(base: CachedDataset, new: CachedDataset, config: Dict[str, Any],
+                    appended: np.ndarray) -> Optional[Dict[str, Any]]:
+    """Base upload's prepared arrays with the appended periods added along time"""
+    base_arrays = base.prepared_arrays(config)
+    dates = np.asarray(new.dates(config['date_column']))
+    rows = np.flatnonzero(appended)
+    tail = prepare_arrays(new.frame.iloc[rows].reset_index(drop=True), config, dates=dates[rows])
+    if list(tail['geos']) != list(base_arrays['geos']) or list(tail['controls']) != list(base_arrays['controls']):
+        return None
+
+    arrays = {
+        'geos': list(base_arrays['geos']),
+        'times': list(base_arrays['times']) + list(tail['times']),
+        'channels': list(base_arrays['channels']),
+        'controls': list(base_arrays['controls']),
+    }
+    for name in TIME_BLOCKS:
+        if base_arrays[name] is None:
+            arrays[name] = None
+        else:
+            arrays[name] = np.concatenate([np.asarray(base_arrays[name]), tail[name]], axis=1)
+    # Population is each geo's mean over time, so combine the two means by period count
+    n_base, n_tail = len(base_arrays['times']), len(tail['times'])
+    arrays['population'] = (np.asarray(base_arrays['population']) * n_base + tail['population'] * n_tail) / (n_base + n_tail)
+    return arrays
+
+
+def prepare_refresh(base: CachedDataset, new: CachedDataset, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the new upload's prepared arrays incrementally when it extends base; returns the lineage"""
+    lineage = {"base_dataset_key": base.key, "dataset_key": new.key, "incremental": False}
+    if new.has_prepared(config):
+        # Already prepared by an earlier run of this upload and config
+        lineage["prepared_cache_hit"] = True
+        return lineage
+
+    appended = time_extension(base, new, config)
+    if appended is None:
+        print(json.dumps({"status": "refresh_not_time_extension", "base": base.key}))
+        return lineage
+    arrays = extended_arrays(base, new, config, appended)
+    if arrays is None:
+        print(json.dumps({"status": "refresh_panel_changed", "base": base.key}))
+        return lineage
+
+    new.save_prepared(config, arrays)
+    n_base = len(arrays['times']) - len(np.unique(np.asarray(new.dates(config['date_column']))[appended]))
+    lineage.update({
+        "incremental": True,
+        "appended_rows": int(appended.sum()),
+        "base_periods": n_base,
+        "appended_periods": arrays['times'][n_base:],
+    })
+    print(json.dumps({"status": "refresh_arrays_extended", "appended_periods": len(arrays['times']) - n_base,
+                      "appended_rows": int(appended.sum())}))
+    return lineage
+
+
+def write_lineage(model_dir: str, lineage: Dict[str, Any]):
+    with open(os.path.join(model_dir, LINEAGE_FILE), 'w') as f:
+        json.dump(lineage, f, indent=2)
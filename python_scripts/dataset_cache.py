@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Columnar cache for uploaded datasets, keyed by content hash
+
+Each CSV is parsed once and stored as one .npy file per column under
+dataset_cache/<sha256>/columns/. Later loads memory-map those files and wrap
+them in a DataFrame without copying, so repeated fits on the same upload skip
+CSV parsing and date parsing entirely. Other artifacts derived from the same
+content (validation report, prepared InputData arrays) live next to it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+from data_prep import parse_dates, prepare_arrays
+
+CACHE_ROOT = os.getenv(
+    'MERIDIAN_DATASET_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset_cache')
+)
+MANIFEST = 'manifest.json'
+
+# Config keys that affect prepare_arrays, and the array blocks it returns
+PREPARED_CONFIG_KEYS = (
+    'date_column', 'target_column', 'channel_columns', 'control_columns',
+    'geo_column', 'use_geo', 'population_scaling_column',
+)
+PREPARED_BLOCKS = ('kpi', 'media', 'media_spend', 'controls_values', 'population')
+# Bump when the on-disk layout changes so old entries are rebuilt
+CACHE_FORMAT = 1
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of the file contents
+
+    Deduplicated uploads are stored as uploads/blobs/<sha256>.csv, so their
+    name already is the hash and the file does not need to be read again.
+    """
+    name, ext = os.path.splitext(os.path.basename(path))
+    if ext == '.csv' and len(name) == 64 and all(c in '0123456789abcdef' for c in name):
+        return name
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CachedDataset:
+    """Memory-mapped columns of one converted upload"""
+
+    def __init__(self, key: str, root: str, manifest: Dict[str, Any]):
+        self.key = key
+        self.root = root
+        self.directory = os.path.join(root, 'columns')
+        self.manifest = manifest
+        self._frame: Optional[pd.DataFrame] = None
+
+    @property
+    def columns(self):
+        return [col['name'] for col in self.manifest['columns']]
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """DataFrame backed by the memory-mapped column files (no copy)"""
+        if self._frame is None:
+            data = {
+                col['name']: np.load(os.path.join(self.directory, col['file']), mmap_mode='r')
+                for col in self.manifest['columns']
+            }
+            self._frame = pd.DataFrame(data, copy=False)
+        return self._frame
+
+    def dates(self, column: str) -> np.ndarray:
+        """Parsed datetime64 values of a date column, parsed once and cached"""
+        if column not in self.columns:
+            raise ValueError(f"Columns not found in dataset: {[column]}")
+        index = self.columns.index(column)
+        path = os.path.join(self.directory, f'dates_{index:04d}.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r')
+
+        dates = parse_dates(pd.Series(self.frame[column]))
+        _atomic_save(path, dates)
+        return dates
+
+    def prepared_directory(self, config: Dict[str, Any], dtype=np.float64) -> str:
+        """Directory of the prepared arrays for a config, keyed by the config keys that affect them"""
+        spec = {key: config.get(key) for key in PREPARED_CONFIG_KEYS}
+        spec['dtype'] = np.dtype(dtype).name
+        spec_key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+        return os.path.join(self.root, 'prepared', spec_key)
+
+    def has_prepared(self, config: Dict[str, Any], dtype=np.float64) -> bool:
+        return os.path.exists(os.path.join(self.prepared_directory(config, dtype), 'meta.json'))
+
+    def prepared_arrays(self, config: Dict[str, Any], dtype=np.float64) -> Dict[str, Any]:
+        """InputData arrays for this upload and config, prepared once and memory-mapped after"""
+        directory = self.prepared_directory(config, dtype)
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            arrays = dict(meta)
+            for name in PREPARED_BLOCKS:
+                path = os.path.join(directory, f'{name}.npy')
+                arrays[name] = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+            print(json.dumps({"status": "prepared_arrays_cache_hit", "key": os.path.basename(directory)}))
+            return arrays
+
+        arrays = prepare_arrays(self.frame, config, dtype=dtype, dates=self.dates(config['date_column']))
+        self.save_prepared(config, arrays, dtype)
+        return arrays
+
+    def save_prepared(self, config: Dict[str, Any], arrays: Dict[str, Any], dtype=np.float64):
+        """Store prepared arrays for a config, e.g. ones built incrementally from another upload"""
+        directory = self.prepared_directory(config, dtype)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix=f'.{os.path.basename(directory)}-')
+        for name in PREPARED_BLOCKS:
+            if arrays[name] is not None:
+                np.save(os.path.join(tmp_dir, f'{name}.npy'), arrays[name])
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({k: v for k, v in arrays.items() if k not in PREPARED_BLOCKS}, f)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _atomic_save(path: str, values: np.ndarray):
+    """Write an .npy file so concurrent readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp_path, path)
+
+
+def _column_values(series: pd.Series) -> np.ndarray:
+    """Typed NumPy values for a column; text becomes fixed-width unicode so it can be mapped"""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series.to_numpy()
+    return series.fillna('').astype(str).to_numpy(dtype=str)
+
+
+def _convert(data_file: str, key: str, directory: str) -> Dict[str, Any]:
+    """Parse the CSV once and write every column to its own .npy file"""
+    df = pd.read_csv(data_file)
+
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix=f'.{key[:12]}-')
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = _column_values(df[name])
+        file_name = f'col_{i:04d}.npy'
+        np.save(os.path.join(tmp_dir, file_name), values)
+        columns.append({"name": str(name), "file": file_name, "dtype": str(values.dtype)})
+
+    manifest = {
+        "format": CACHE_FORMAT,
+        "key": key,
+        "source": os.path.basename(data_file),
+        "n_rows": len(df),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Another process converted the same upload first; use its copy
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    return manifest
+
+
+def load_dataset(data_file: str, cache_root: str = CACHE_ROOT) -> CachedDataset:
+    """Load an upload from the columnar cache, converting it on first use"""
+    key = file_hash(data_file)
+    root = os.path.join(cache_root, key)
+    directory = os.path.join(root, 'columns')
+    manifest_path = os.path.join(directory, MANIFEST)
+
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != CACHE_FORMAT:
+            shutil.rmtree(directory, ignore_errors=True)
+            manifest = None
+
+    if manifest is None:
+        manifest = _convert(data_file, key, directory)
+        print(json.dumps({"status": "dataset_cached", "key": key, "rows": manifest['n_rows']}))
+    else:
+        print(json.dumps({"status": "dataset_cache_hit", "key": key}))
+
+    return CachedDataset(key, root, manifest)
+
+
+def main(data_file: str):
+    """Convert an upload ahead of its first training run"""
+    dataset = load_dataset(data_file)
+    return {"key": dataset.key, "columns": dataset.columns}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(json.dumps({
+            "error": "Usage: python dataset_cache.py <data_file>"
+        }))
+        sys.exit(1)
+
+    print(json.dumps(main(sys.argv[1])))
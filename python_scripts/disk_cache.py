@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Small on-disk cache of keyed directories with LRU / size-based eviction
+
+Each entry is a directory under the cache root named by its key. An entry
+only counts once its .complete marker exists; the marker's mtime is
+refreshed on every hit and is what least-recently-used eviction sorts on.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Optional
+
+COMPLETE_MARKER = '.complete'
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 of JSON-serialisable parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class DiskCache:
+    """Keyed directories under root, evicted least-recently-used first"""
+
+    def __init__(self, root: str, max_bytes: int, max_entries: Optional[int] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Entry directory for key, or None; a hit marks the entry as recently used"""
+        marker = os.path.join(self.path(key), COMPLETE_MARKER)
+        if not os.path.exists(marker):
+            return None
+        now = time.time()
+        os.utime(marker, (now, now))
+        return self.path(key)
+
+    def put(self, key: str, populate: Callable[[str], None]) -> str:
+        """Create an entry by letting populate() fill a fresh directory, then evict"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.root, prefix=f'.{key[:12]}-')
+        try:
+            populate(tmp_dir)
+            open(os.path.join(tmp_dir, COMPLETE_MARKER), 'w').close()
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            os.rename(tmp_dir, self.path(key))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.evict()
+        return self.path(key)
+
+    def remove(self, key: str):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def keys(self, prefix: str = ''):
+        """Keys of the complete entries starting with prefix, without sizing them"""
+        if not os.path.isdir(self.root):
+            return []
+        return [key for key in os.listdir(self.root)
+                if key.startswith(prefix) and not key.startswith('.')
+                and os.path.exists(os.path.join(self.root, key, COMPLETE_MARKER))]
+
+    def entries(self):
+        """(last_used, size_bytes, key) for every complete entry"""
+        if not os.path.isdir(self.root):
+            return []
+        result = []
+        for key in os.listdir(self.root):
+            marker = os.path.join(self.root, key, COMPLETE_MARKER)
+            if key.startswith('.') or not os.path.exists(marker):
+                continue
+            result.append((os.path.getmtime(marker), _dir_size(self.path(key)), key))
+        return result
+
+    def evict(self):
+        """Drop least-recently-used entries until under the size and count limits"""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or
+                           (self.max_entries is not None and len(entries) > self.max_entries)):
+            _, size, key = entries.pop(0)
+            self.remove(key)
+            total -= size
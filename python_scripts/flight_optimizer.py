@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Weekly flighting: allocate a budget across channels x future weeks
+
+The decision is a (weeks, channels) spend matrix. Spend maps to scaled media
+per geo through each channel's historical media-per-spend and geo mix, is
+carried forward with the channel's normalized geometric adstock kernel, then
+saturated by its Hill curve (posterior-mean parameters of the stored model).
+Adstock is a causal convolution along the week axis, done for every channel at
+once with a zero-padded FFT; its gradient is the matching correlation. The
+last max_lag historical weeks carry into the plan, and the outcome is counted
+for max_lag weeks past the horizon so late spend is not undervalued.
+
+The feasible set is {total = budget, lo <= x <= hi per cell, weekly total <=
+cap}. Its projection is a bisection on one global shift, with each capped
+week's own shift found by a vectorized bisection over all weeks together.
+
+Config:
+  weeks                  plan length (default 13)
+  flight_budget          total over the plan (default weeks x current weekly spend)
+  week_caps              one cap for every week, or a list with null for uncapped weeks
+  max_week_multiplier    per-cell cap as a multiple of average weekly spend (default 3)
+  channel_week_min/max   {channel: spend per week}
+  locked_channels        held at their average weekly spend
+"""
+
+import time
+import numpy as np
+from typing import Dict, Any, List, Tuple
+
+from budget_optimizer import StoreResponse, optimize, projected_gradient
+from posterior_store import open_store
+from response_model import ResponseModel, geometric_adstock
+
+DEFAULT_WEEKS = 13
+# Default per-cell cap as a multiple of the channel's average weekly spend
+DEFAULT_MAX_WEEK_MULTIPLIER = 3.0
+BISECTION_STEPS = 100
+MIN_MEDIA = 1e-12
+
+
+class FlightResponse:
+    """Outcome of a (weeks, channels) spend plan and its gradient, vectorized over weeks, geos and channels"""
+
+    def __init__(self, model: ResponseModel, weeks: int):
+        self.weeks = weeks
+        self.max_lag = model.max_lag
+        self.hill_before_adstock = model.hill_before_adstock
+        self.channels = list(model.channels)
+        self.alpha = model.alpha.mean(axis=0).astype(np.float64)
+        self.ec = model.ec.mean(axis=0).astype(np.float64)
+        self.slope = model.slope.mean(axis=0).astype(np.float64)
+        beta = model.beta.mean(axis=0).astype(np.float64)
+        # Outcome per unit of Hill output, per geo and channel
+        self.geo_weights = beta * model.outcome_scale[:, None]
+
+        # Scaled media per unit of channel spend in each geo: media-per-spend times the geo's spend share
+        spend = model.spend
+        media = model.media_scaled.astype(np.float64)
+        channel_spend = spend.sum(axis=(0, 1))
+        geo_spend = spend.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_spend = np.where(geo_spend > 0, media.sum(axis=1) / geo_spend, 0.0)
+            share = np.where(channel_spend > 0, geo_spend / channel_spend, 0.0)
+        self.media_per_spend = per_spend * share
+        self.weekly_spend = channel_spend / spend.shape[1]
+
+        lags = np.arange(self.max_lag + 1)
+        kernel = self.alpha[None, :] ** lags[:, None]
+        kernel /= kernel.sum(axis=0, keepdims=True)
+        # Effects are counted max_lag weeks past the plan
+        self.horizon = weeks + self.max_lag
+        self.n_fft = 1 << int(np.ceil(np.log2(self.horizon + self.max_lag + 1)))
+        self.kernel_fft = np.fft.rfft(kernel, self.n_fft, axis=0)
+
+        # Carry-over of the last max_lag historical weeks into the horizon (no new spend)
+        history = media[:, -self.max_lag:] if self.max_lag else media[:, :0]
+        padded = np.concatenate([history, np.zeros((media.shape[0], self.horizon, media.shape[2]))], axis=1)
+        if self.hill_before_adstock:
+            self.carry = None
+        else:
+            self.carry = geometric_adstock(padded[None], self.alpha[None], self.max_lag)[0][:, history.shape[1]:]
+            self.carry = self.carry.transpose(1, 0, 2)
+
+    def convolve(self, x: np.ndarray) -> np.ndarray:
+        """Adstock of x (weeks, ...) along weeks, over the full horizon"""
+        spectrum = np.fft.rfft(x, self.n_fft, axis=0)
+        kernel = self.kernel_fft.reshape(self.kernel_fft.shape[:1] + (1,) * (x.ndim - 2) + self.kernel_fft.shape[1:])
+        return np.fft.irfft(spectrum * kernel, self.n_fft, axis=0)[:self.horizon]
+
+    def correlate(self, g: np.ndarray) -> np.ndarray:
+        """Adjoint of convolve: maps a gradient over the horizon back to the plan weeks"""
+        spectrum = np.fft.rfft(g, self.n_fft, axis=0)
+        return np.fft.irfft(spectrum * np.conj(self.kernel_fft), self.n_fft, axis=0)[:self.weeks]
+
+    def _hill(self, media: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Hill output and its derivative with respect to media, elementwise"""
+        media = np.maximum(media, MIN_MEDIA)
+        h = 1.0 / (1.0 + (self.ec / media) ** self.slope)
+        return h, self.slope * h * (1 - h) / media
+
+    def value_and_grad(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Outcome per channel of plan x (weeks, M) over the horizon, and its gradient (weeks, M)"""
+        if self.hill_before_adstock:
+            # The normalized kernel only moves Hill output in time, and the horizon keeps all of it
+            media = x[:, None, :] * self.media_per_spend[None]
+            h, dh = self._hill(media)
+            value = np.einsum('gm,wgm->m', self.geo_weights, h)
+            grad = np.einsum('gm,wgm->wm', self.geo_weights * self.media_per_spend, dh)
+            return value, grad
+
+        adstocked = self.convolve(x)
+        media = adstocked[:, None, :] * self.media_per_spend[None] + self.carry
+        h, dh = self._hill(media)
+        value = np.einsum('gm,wgm->m', self.geo_weights, h)
+        grad = self.correlate(np.einsum('gm,wgm->wm', self.geo_weights * self.media_per_spend, dh))
+        return value, grad
+
+
+def project_plan(y: np.ndarray, budget: float, lo: np.ndarray, hi: np.ndarray,
+                 week_caps: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto {sum = budget, lo <= x <= hi, row sums <= week_caps}
+
+    x = clip(y - max(shift, week_shift), lo, hi), where week_shift makes a
+    week's total equal its cap; only weeks whose cap binds use their own shift.
+    """
+    tolerance = 1e-12 * max(1.0, abs(budget))
+    capped = np.isfinite(week_caps)
+    week_shift = np.full(len(y), -np.inf)
+    if capped.any():
+        low = np.min(y - hi, axis=1)
+        high = np.max(y - lo, axis=1)
+        for _ in range(BISECTION_STEPS):
+            mid = 0.5 * (low + high)
+            over = np.clip(y - mid[:, None], lo, hi).sum(axis=1) > week_caps
+            low = np.where(over, mid, low)
+            high = np.where(over, high, mid)
+            if np.max(high - low) <= tolerance:
+                break
+        week_shift = np.where(capped, high, -np.inf)
+
+    low, high = float(np.min(y - hi)), float(np.max(y - lo))
+    for _ in range(BISECTION_STEPS):
+        shift = 0.5 * (low + high)
+        total = np.clip(y - np.maximum(shift, week_shift)[:, None], lo, hi).sum()
+        if total > budget:
+            low = shift
+        else:
+            high = shift
+        if high - low <= tolerance:
+            break
+    return np.clip(y - np.maximum(0.5 * (low + high), week_shift)[:, None], lo, hi)
+
+
+def plan_bounds(channels: List[str], weekly: np.ndarray, weeks: int,
+                config: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-cell (lo, hi) and per-week caps from config"""
+    multiplier = float(config.get('max_week_multiplier', DEFAULT_MAX_WEEK_MULTIPLIER))
+    lo = np.zeros((weeks, len(channels)))
+    hi = np.tile(weekly * multiplier, (weeks, 1))
+
+    for key, bound in (('channel_week_min', lo), ('channel_week_max', hi)):
+        for channel, value in (config.get(key) or {}).items():
+            if channel not in channels:
+                raise ValueError(f"Unknown channel in {key}: {channel}")
+            bound[:, channels.index(channel)] = float(value)
+    for channel in config.get('locked_channels') or []:
+        if channel not in channels:
+            raise ValueError(f"Unknown locked channel: {channel}")
+        i = channels.index(channel)
+        lo[:, i] = hi[:, i] = weekly[i]
+
+    caps = config.get('week_caps')
+    if caps is None:
+        week_caps = np.full(weeks, np.inf)
+    elif np.isscalar(caps):
+        week_caps = np.full(weeks, float(caps))
+    else:
+        if len(caps) != weeks:
+            raise ValueError(f"week_caps has {len(caps)} entries for a {weeks}-week plan")
+        week_caps = np.array([np.inf if c is None else float(c) for c in caps])
+
+    if np.any(lo > hi):
+        raise ValueError("Minimum weekly spend exceeds the maximum for some channels")
+    if np.any(lo.sum(axis=1) > week_caps):
+        raise ValueError("Locked or minimum spend exceeds a weekly cap")
+    return lo, hi, week_caps
+
+
+def optimize_flighting(model: ResponseModel, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Weekly spend plan maximizing outcome over the horizon under the plan constraints"""
+    start = time.perf_counter()
+    weeks = int(config.get('weeks', DEFAULT_WEEKS))
+    response = FlightResponse(model, weeks)
+    channels = response.channels
+    weekly = response.weekly_spend
+    # total_budget elsewhere is over the whole history, so the plan has its own budget key
+    budget = float(config.get('flight_budget') or weekly.sum() * weeks)
+    lo, hi, week_caps = plan_bounds(channels, weekly, weeks, config)
+
+    capacity = np.minimum(hi.sum(axis=1), week_caps).sum()
+    if lo.sum() > budget * (1 + 1e-9) or capacity < budget * (1 - 1e-9):
+        raise ValueError(f"Budget {budget:.2f} is outside the feasible range [{lo.sum():.2f}, {capacity:.2f}]")
+
+    def projector(y: np.ndarray) -> np.ndarray:
+        return project_plan(y, budget, lo, hi, week_caps)
+
+    # Starts: today's mix flat over the plan, and the single-period optimum spread evenly.
+    # The aggregate response covers the last n periods, so its budget and bounds are
+    # the plan's scaled to n periods
+    flat = projector(np.tile(weekly, (weeks, 1)) * budget / (weekly.sum() * weeks))
+    n = min(weeks, len(model.times))
+    mask = np.zeros(len(model.times), dtype=bool)
+    mask[-n:] = True
+    aggregate = StoreResponse(model, mask)
+    window_budget = budget * n / weeks
+    totals = optimize(aggregate, channels, aggregate.spend, window_budget, lo.sum(axis=0) * n / weeks,
+                      np.minimum(hi.sum(axis=0) * n / weeks, window_budget))['allocation']
+    spread = projector(np.tile([totals[c] / n for c in channels], (weeks, 1)))
+
+    runs = [projected_gradient(response, x0, budget, lo, hi, projector=projector) for x0 in (flat, spread)]
+    plan, total, iterations, converged = max(runs, key=lambda run: run[1])
+
+    baseline = response.value_and_grad(np.zeros_like(plan))[0].sum()
+    flat_total = response.value_and_grad(flat)[0].sum()
+    return {
+        "weeks": weeks,
+        "total_budget": budget,
+        "plan": {channel: plan[:, i].tolist() for i, channel in enumerate(channels)},
+        "weekly_totals": plan.sum(axis=1).tolist(),
+        "channel_totals": dict(zip(channels, plan.sum(axis=0).tolist())),
+        "outcome": float(total),
+        "incremental_outcome": float(total - baseline),
+        "flat_plan_incremental_outcome": float(flat_total - baseline),
+        "lift_over_flat": float(total - flat_total),
+        "iterations": int(sum(run[2] for run in runs)),
+        "converged": bool(converged),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def flighting_from_dir(model_dir: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Weekly plan for the stored posterior in model_dir"""
+    store = open_store(model_dir) if model_dir else None
+    if store is None:
+        raise ValueError("Flighting needs the model's stored posterior")
+    return optimize_flighting(ResponseModel(store), config)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Long-lived Python worker that preloads Meridian once and runs jobs sent over stdin
+
+Protocol (one JSON object per line):
+  -> {"id": "1", "type": "job", "module": "train_meridian_corrected", "args": [...], "env": {...}}
+  -> {"id": "2", "type": "ping"}
+  <- job output lines exactly as the script would print them
+  <- {"worker_event": "job_done", "id": "1", "code": 0}
+  <- {"worker_event": "pong", "id": "2", ...}
+"""
+
+import importlib
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+from typing import Dict, Any
+
+# Modules the worker is allowed to run jobs from
+JOB_MODULES = {
+    'train_meridian_corrected',
+    'optimize_budget',
+    'dataset_cache',
+    'analysis_service',
+    'scenario_batch',
+    'train_sweep',
+    'backtest',
+}
+# Short read-only queries that should not use up the recycle budget
+UNCOUNTED_MODULES = {'analysis_service', 'scenario_batch'}
+
+# Recycle the worker after this many jobs to bound memory growth
+DEFAULT_MAX_JOBS = int(os.getenv('MERIDIAN_WORKER_MAX_JOBS', '20'))
+# Recycle early if resident memory grows past this (0 disables)
+DEFAULT_MAX_RSS_MB = int(os.getenv('MERIDIAN_WORKER_MAX_RSS_MB', '0'))
+
+
+def emit(event: str, **fields):
+    """Write a worker control message to stdout"""
+    print(json.dumps({"worker_event": event, **fields}, default=str), flush=True)
+
+
+def rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def preload() -> Dict[str, Any]:
+    """Import the job modules and the heavy Meridian stack once"""
+    start = time.time()
+    modules = {}
+
+    # Job modules first: the trainer sets the TF threading env vars at import
+    for name in sorted(JOB_MODULES):
+        modules[name] = importlib.import_module(name)
+
+    import pandas  # noqa: F401
+    import xarray  # noqa: F401
+    try:
+        from meridian.model.model import Meridian  # noqa: F401
+        from meridian.model.spec import ModelSpec  # noqa: F401
+        from meridian.data.input_data import InputData  # noqa: F401
+        from meridian.analysis.analyzer import Analyzer  # noqa: F401
+        meridian_loaded = True
+    except ImportError:
+        # Optimization jobs still work without Meridian installed
+        meridian_loaded = False
+
+    return {
+        "modules": modules,
+        "meridian_loaded": meridian_loaded,
+        "preload_seconds": round(time.time() - start, 3),
+    }
+
+
+def run_job(modules: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one job in-process, returning its exit code and optional result"""
+    module_name = request.get('module')
+    if module_name not in modules:
+        return {"code": 2, "error": f"Unknown job module: {module_name}"}
+
+    func = getattr(modules[module_name], request.get('function', 'main'), None)
+    if func is None:
+        return {"code": 2, "error": f"{module_name} has no function {request.get('function', 'main')}"}
+
+    # Apply per-job environment overrides and restore them afterwards
+    job_env = {k: str(v) for k, v in (request.get('env') or {}).items() if v is not None}
+    saved_env = {k: os.environ.get(k) for k in job_env}
+    os.environ.update(job_env)
+
+    try:
+        result = func(*request.get('args', []))
+        return {"code": 0, "result": result}
+    except SystemExit as e:
+        # Scripts signal failure with sys.exit(1)
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        return {"code": code}
+    except Exception as e:
+        traceback.print_exc(file=sys.stderr)
+        return {"code": 1, "error": str(e)}
+    finally:
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def serve(max_jobs: int = DEFAULT_MAX_JOBS, max_rss_mb: int = DEFAULT_MAX_RSS_MB):
+    """Read job requests from stdin until EOF or until the worker should recycle"""
+    # Progress lines must reach the server as they are printed
+    sys.stdout.reconfigure(line_buffering=True)
+
+    loaded = preload()
+    modules = loaded["modules"]
+    emit("ready", pid=os.getpid(), preload_seconds=loaded["preload_seconds"],
+         meridian_loaded=loaded["meridian_loaded"])
+
+    jobs_run = 0
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            emit("bad_request", message="Request is not valid JSON")
+            continue
+
+        request_id = request.get('id')
+
+        if request.get('type') == 'ping':
+            emit("pong", id=request_id, pid=os.getpid(), jobs_run=jobs_run, rss_mb=round(rss_mb(), 1))
+            continue
+
+        if request.get('type') == 'shutdown':
+            break
+
+        started = time.time()
+        outcome = run_job(modules, request)
+        if request.get('module') not in UNCOUNTED_MODULES:
+            jobs_run += 1
+
+        # Announce the recycle with the result so no new job is sent to this worker
+        recycle = jobs_run >= max_jobs or bool(max_rss_mb and rss_mb() > max_rss_mb)
+        emit("job_done", id=request_id, seconds=round(time.time() - started, 3), recycle=recycle, **outcome)
+
+        if recycle:
+            emit("recycle", pid=os.getpid(), jobs_run=jobs_run, rss_mb=round(rss_mb(), 1))
+            break
+
+
+if __name__ == "__main__":
+    serve()
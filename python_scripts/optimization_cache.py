@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of budget optimization results
+
+Entries are keyed by the model directory, the model they were solved against
+and the normalized optimization config. The model part hashes the model
+results and the stored posterior's manifest, so retraining a model changes
+every key; entries of the previous fit share the directory prefix but not the
+model hash, and are dropped the next time that model is optimized. The rest
+age out by LRU within a bounded size. Lookups list keys by prefix and never
+size entries; only eviction does.
+
+Each entry holds the results file plus a small meta.json (budget, bounds and
+allocation) that lets a changed constraint set warm-start from the cached
+solution with the nearest budget and bounds.
+"""
+
+import json
+import os
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from disk_cache import DiskCache, fingerprint
+from posterior_store import MANIFEST, STORE_DIR
+
+OPTIMIZATION_CACHE_DIR = os.getenv(
+    'MERIDIAN_OPTIMIZATION_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'optimization_cache')
+)
+OPTIMIZATION_CACHE_MAX_MB = int(os.getenv('MERIDIAN_OPTIMIZATION_CACHE_MAX_MB', '256'))
+OPTIMIZATION_CACHE_MAX_ENTRIES = 2000
+# Bump when the optimizer or its results layout changes so cached results are not reused
+OPTIMIZER_VERSION = 1
+# Config keys that do not change the result
+IGNORED_KEYS = ('model_dir', 'bypass_cache')
+RESULTS = 'results.json'
+META = 'meta.json'
+
+
+def optimization_cache() -> DiskCache:
+    return DiskCache(OPTIMIZATION_CACHE_DIR, OPTIMIZATION_CACHE_MAX_MB * 2**20, OPTIMIZATION_CACHE_MAX_ENTRIES)
+
+
+def bypass_optimization_cache(config: Dict[str, Any]) -> bool:
+    return bool(config.get('bypass_cache')) or os.getenv('MERIDIAN_BYPASS_CACHE', 'false') == 'true'
+
+
+def model_key(model_results: Dict[str, Any], model_dir: Optional[str]) -> str:
+    """Hash of the model results and, when present, the stored posterior's manifest"""
+    manifest = None
+    if model_dir:
+        path = os.path.join(model_dir, STORE_DIR, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                manifest = f.read()
+    return fingerprint(model_results, manifest)
+
+
+def normalize_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Config without empty values or keys that do not affect the solution"""
+    return {
+        key: value for key, value in config.items()
+        if value not in (None, '', [], {}) and key not in IGNORED_KEYS
+    }
+
+
+def _directory_prefix(model_dir: Optional[str]) -> str:
+    return fingerprint(os.path.abspath(model_dir) if model_dir else None)[:12]
+
+
+def model_prefix(model: str, model_dir: Optional[str]) -> str:
+    """Key prefix shared by every entry solved against this fit of the model in model_dir"""
+    return f"{_directory_prefix(model_dir)}-{model[:24]}"
+
+
+def cache_key(model: str, config: Dict[str, Any], model_dir: Optional[str] = None) -> str:
+    """Entry name; its prefixes let a directory's or a fit's entries be listed without reading them"""
+    return f"{model_prefix(model, model_dir)}-{fingerprint(normalize_config(config), OPTIMIZER_VERSION)[:40]}"
+
+
+def cached_results(cache: DiskCache, key: str) -> Optional[Dict[str, Any]]:
+    path = cache.get(key)
+    if path is None:
+        return None
+    with open(os.path.join(path, RESULTS)) as f:
+        return json.load(f)
+
+
+def store_results(cache: DiskCache, key: str, results: Dict[str, Any], meta: Dict[str, Any]):
+    def populate(path: str):
+        with open(os.path.join(path, RESULTS), 'w') as f:
+            json.dump(results, f)
+        with open(os.path.join(path, META), 'w') as f:
+            json.dump(meta, f)
+
+    cache.put(key, populate)
+
+
+def allocation_meta(model_dir: Optional[str], results: Dict[str, Any]) -> Dict[str, Any]:
+    """What a later solve needs to judge this entry as a warm start"""
+    return {
+        "model_dir": os.path.abspath(model_dir) if model_dir else None,
+        "type": results.get('type', 'allocation'),
+        "total_budget": results.get('total_budget'),
+        "bounds": results.get('bounds'),
+        "allocation": results.get('optimal_allocation'),
+    }
+
+
+def _entry_meta(cache: DiskCache, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(cache.path(key), META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def invalidate_stale(cache: DiskCache, model: str, model_dir: Optional[str]) -> int:
+    """Remove entries solved against an earlier fit of the model in model_dir"""
+    if not model_dir:
+        return 0
+    current = model_prefix(model, model_dir)
+    removed = 0
+    for key in cache.keys(_directory_prefix(model_dir) + '-'):
+        if not key.startswith(current):
+            cache.remove(key)
+            removed += 1
+    return removed
+
+
+def nearest_allocation(cache: DiskCache, model: str, channels: List[str], budget: float,
+                       lo: np.ndarray, hi: np.ndarray, model_dir: Optional[str] = None) -> Optional[Dict[str, float]]:
+    """Cached allocation for this model whose budget and bounds are closest to the new ones
+
+    Distance is the L1 difference of budget and every channel's bounds,
+    relative to the new budget.
+    """
+    best, best_distance = None, np.inf
+    for key in cache.keys(model_prefix(model, model_dir)):
+        meta = _entry_meta(cache, key)
+        if not meta or meta.get('type') != 'allocation' or not meta.get('allocation') or not meta.get('bounds'):
+            continue
+        bounds = meta['bounds']
+        if any(c not in bounds for c in channels):
+            continue
+        cached_lo = np.array([bounds[c]['min'] for c in channels])
+        cached_hi = np.array([bounds[c]['max'] for c in channels])
+        distance = (abs(float(meta['total_budget']) - budget) + np.abs(cached_lo - lo).sum() +
+                    np.abs(cached_hi - hi).sum()) / max(budget, 1.0)
+        if distance < best_distance:
+            best, best_distance = meta['allocation'], distance
+    return best
@@ -1,14 +1,112 @@
 #!/usr/bin/env python3
 """
-Optimize media budget allocation using Meridian's optimization function
+Optimize media budget allocation over the trained model's response curves
 """
 
 import json
+import os
 import sys
-import pandas as pd
-import numpy as np
 from typing import Dict, Any
 
+from budget_optimizer import budget_frontier, optimize_from_results
+from flight_optimizer import flighting_from_dir
+from optimization_cache import (allocation_meta, bypass_optimization_cache, cache_key, cached_results,
+                                invalidate_stale, model_key, nearest_allocation, optimization_cache,
+                                store_results)
+
+def frontier_results(model_results: Dict[str, Any], config: Dict[str, Any], model_dir) -> Dict[str, Any]:
+    """Efficient frontier over a sweep of total budget levels, as one results file"""
+    frontier = budget_frontier(model_results, config, model_dir)
+    print(json.dumps({
+        "status": "frontier_solved",
+        "levels": len(frontier['levels']),
+        "processes": frontier['processes'],
+        "seconds": frontier['seconds']
+    }))
+    
+    feasible = [point for point in frontier['points'] if point['feasible']]
+    # The level closest to the current budget fills the single-allocation fields the UI reads
+    closest = min(feasible, key=lambda point: abs(point['level'] - 1.0)) if feasible else None
+    results = {
+        "type": "frontier",
+        "frontier": frontier['points'],
+        "total_budget": closest['budget'] if closest else None,
+        "optimal_allocation": closest['allocation'] if closest else {},
+        "optimized_allocation": closest['allocation'] if closest else {},
+        "optimizer": {"processes": frontier['processes'], "seconds": frontier['seconds']}
+    }
+    return results
+
+def flighting_results(config: Dict[str, Any], model_dir) -> Dict[str, Any]:
+    """Weekly spend plan with adstock carry-over, as one results file"""
+    flighting = flighting_from_dir(model_dir, config)
+    print(json.dumps({
+        "status": "optimizer_converged" if flighting['converged'] else "optimizer_max_iterations",
+        "iterations": flighting['iterations'],
+        "seconds": flighting['seconds']
+    }))
+    
+    results = {
+        "type": "flighting",
+        "flighting": flighting,
+        "total_budget": flighting['total_budget'],
+        "optimal_allocation": flighting['channel_totals'],
+        "optimized_allocation": flighting['channel_totals'],
+        "expected_lift": flighting['lift_over_flat'],
+        "optimizer": {"iterations": flighting['iterations'], "converged": flighting['converged'],
+                      "seconds": flighting['seconds']}
+    }
+    return results
+
+def allocation_results(model_results: Dict[str, Any], config: Dict[str, Any], model_dir,
+                       warm_start=None) -> Dict[str, Any]:
+    """Single optimal allocation at one total budget"""
+    optimization = optimize_from_results(model_results, config, model_dir, warm_start)
+    
+    current_allocation = optimization['current_allocation']
+    optimal_allocation = optimization['allocation']
+    expected_lift = optimization['optimal_outcome'] - optimization['current_outcome']
+    expected_lift_percentage = (expected_lift / optimization['current_outcome'] * 100
+                                if optimization['current_outcome'] else 0.0)
+    
+    print(json.dumps({
+        "status": "optimizer_converged" if optimization['converged'] else "optimizer_max_iterations",
+        "iterations": optimization['iterations'],
+        "seconds": optimization['seconds']
+    }))
+    
+    # Format results
+    results = {
+        "current_allocation": current_allocation,
+        "optimal_allocation": optimal_allocation,
+        # Name read by the optimization details page
+        "optimized_allocation": optimal_allocation,
+        "changes": {
+            channel: float((optimal_allocation[channel] - value) / value * 100) if value else 0.0
+            for channel, value in current_allocation.items()
+        },
+        "total_budget": optimization['total_budget'],
+        "expected_outcome": optimization['optimal_outcome'],
+        "current_outcome": optimization['current_outcome'],
+        "expected_lift": float(expected_lift),
+        "expected_lift_percentage": float(expected_lift_percentage),
+        "marginal_roi": optimization['marginal_roi'],
+        "bounds": optimization['bounds'],
+        # Posterior distribution of the chosen allocation's outcome and lift (posterior mode)
+        "distribution": optimization.get('distribution'),
+        "optimizer": {
+            "response": optimization['response'],
+            "warm_started": optimization['warm_started'],
+            "mode": optimization['mode'],
+            "objective": optimization['objective'],
+            "objective_value": optimization['objective_value'],
+            "iterations": optimization['iterations'],
+            "converged": optimization['converged'],
+            "seconds": optimization['seconds']
+        }
+    }
+    return results
+
 def main(model_results_file: str, config_file: str, output_file: str):
     """Main optimization function"""
     
@@ -21,81 +119,50 @@ def main(model_results_file: str, config_file: str, output_file: str):
     with open(config_file, 'r') as f:
         config = json.load(f)
     
-    print(json.dumps({"status": "optimizing_budget", "progress": 50}))
+    # Constrained optimization over the fitted adstock + Hill response; uses the
+    # model's stored posterior when the server passes its directory. With
+    # mode "posterior" every (or `draws` subsampled) posterior draw is evaluated
+    # per iterate, optionally maximizing the lower-tail mean below risk_quantile
+    model_dir = config.get('model_dir')
+    if model_dir and not os.path.isdir(model_dir):
+        model_dir = None
+    
+    # Same model and constraints give the same result; a retrained model changes the key
+    cache = optimization_cache()
+    model = model_key(model_results, model_dir)
+    key = cache_key(model, config, model_dir)
+    use_cache = not bypass_optimization_cache(config)
+    if use_cache:
+        results = cached_results(cache, key)
+        if results is not None:
+            results.setdefault('optimizer', {})['cache'] = {"hit": True, "key": key}
+            with open(output_file, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(json.dumps({"status": "optimization_cache_hit", "key": key, "progress": 100}))
+            print(json.dumps({"status": "completed", "progress": 100}))
+            return
+        removed = invalidate_stale(cache, model, model_dir)
+        if removed:
+            print(json.dumps({"status": "optimization_cache_invalidated", "entries": removed}))
     
-    # Get current allocation from model results
-    current_allocation = {
-        channel: model_results["channel_analysis"][channel]["contribution"]
-        for channel in model_results["channel_analysis"]
-    }
-    
-    total_budget = sum(current_allocation.values())
-    
-    # Calculate optimal allocation using the response curves
-    # In a real implementation, this would use Meridian's optimization function
-    # but for now we'll generate a plausible optimization
-    
-    # Get ROIs for each channel
-    channel_rois = {
-        channel: data["roi"]
-        for channel, data in model_results["channel_analysis"].items()
-    }
+    print(json.dumps({"status": "optimizing_budget", "progress": 50}))
     
-    # Sort channels by ROI
-    sorted_channels = sorted(
-        channel_rois.keys(),
-        key=lambda ch: channel_rois[ch],
-        reverse=True
-    )
-    
-    # Rebalance budget based on ROI (simplified)
-    # In real implementation, this would use Meridian's optimize_media_mix function
-    optimal_allocation = {}
-    remaining_budget = total_budget
-    
-    # Allocate more to high ROI channels
-    for i, channel in enumerate(sorted_channels):
-        if i == 0:
-            # Highest ROI channel gets a boost
-            optimal_allocation[channel] = current_allocation[channel] * 1.3
-        elif i == len(sorted_channels) - 1:
-            # Lowest ROI channel gets the remainder
-            optimal_allocation[channel] = remaining_budget
-        else:
-            # Middle channels get proportional allocation
-            weight = (len(sorted_channels) - i) / len(sorted_channels)
-            optimal_allocation[channel] = current_allocation[channel] * weight
+    if config.get('frontier') or config.get('budget_levels'):
+        # Frontier: one warm-started solve per budget level, segments run in parallel
+        results = frontier_results(model_results, config, model_dir)
+    elif config.get('flighting'):
+        # Flighting: a weeks x channels plan where adstock carries spend between weeks
+        results = flighting_results(config, model_dir)
+    else:
+        # Changed constraints start from the cached solution of the nearest ones
+        def warm_start(channels, budget, lo, hi):
+            return nearest_allocation(cache, model, channels, budget, lo, hi, model_dir) if use_cache else None
         
-        remaining_budget -= optimal_allocation[channel]
-    
-    # Expected lift calculation
-    # This would be more sophisticated in a real implementation
-    expected_lift = 0.0
-    for channel in sorted_channels:
-        roi = channel_rois[channel]
-        budget_change = optimal_allocation[channel] - current_allocation[channel]
-        expected_lift += budget_change * roi
+        results = allocation_results(model_results, config, model_dir, warm_start)
     
-    expected_lift_percentage = expected_lift / sum(current_allocation.values()) * 100
-    
-    # Format results
-    results = {
-        "current_allocation": {
-            channel: float(value)
-            for channel, value in current_allocation.items()
-        },
-        "optimal_allocation": {
-            channel: float(value)
-            for channel, value in optimal_allocation.items()
-        },
-        "changes": {
-            channel: float((optimal_allocation[channel] - current_allocation[channel]) / current_allocation[channel] * 100)
-            for channel in current_allocation
-        },
-        "total_budget": float(total_budget),
-        "expected_lift": float(expected_lift),
-        "expected_lift_percentage": float(expected_lift_percentage),
-    }
+    if use_cache:
+        store_results(cache, key, results, allocation_meta(model_dir, results))
+        results.setdefault('optimizer', {})['cache'] = {"hit": False, "key": key}
     
     # Save results
     with open(output_file, 'w') as f:
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Posterior metrics for a fitted Meridian model, computed from shared per-draw tensors
+
+Each Analyzer method re-evaluates the model over every posterior draw, so the
+trainer used to pay for that seven times per fit. Here the per-draw
+incremental outcome per channel is evaluated once (plus one scaled pass for
+marginal ROI and one expected-outcome pass for fit metrics), and ROI,
+contribution, mROI and fit metrics are derived from those arrays in batch.
+All per-draw arrays are flattened to (chain * draw, ...).
+"""
+
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+# Spend increase used for marginal ROI, as in Meridian's Analyzer.marginal_roi
+MROI_INCREMENT = 0.01
+# Candidate posterior variable names for adstock decay
+DECAY_VARIABLES = ('alpha_m', 'decay_m', 'lambda_m')
+DEFAULT_CREDIBLE_MASS = 0.95
+
+
+def to_numpy(value) -> np.ndarray:
+    """NumPy view of a TensorFlow tensor, xarray object or array"""
+    if hasattr(value, 'numpy'):
+        return value.numpy()
+    if hasattr(value, 'values'):
+        return np.asarray(value.values)
+    return np.asarray(value)
+
+
+def flatten_draws(values: np.ndarray) -> np.ndarray:
+    """(chain, draw, ...) -> (chain * draw, ...)"""
+    values = np.asarray(values)
+    return values.reshape(-1, *values.shape[2:])
+
+
+def hdi_bounds(sorted_draws: np.ndarray, mass: float):
+    """Narrowest interval holding `mass` of the draws, for every column at once"""
+    n_draws = sorted_draws.shape[0]
+    n_in = min(n_draws, max(1, int(np.ceil(mass * n_draws))))
+    widths = sorted_draws[n_in - 1:] - sorted_draws[:n_draws - n_in + 1]
+    start = np.argmin(widths, axis=0)
+    columns = np.arange(sorted_draws.shape[1])
+    return sorted_draws[start, columns], sorted_draws[start + n_in - 1, columns]
+
+
+def summarize_draws(draws: Dict[str, np.ndarray], mass: float = DEFAULT_CREDIBLE_MASS,
+                    interval: str = 'eti') -> Dict[str, Dict[str, np.ndarray]]:
+    """Mean, median, credible bounds, sd and P(> 0) for every column of every metric
+
+    All metrics' (draws, k) arrays are stacked side by side, so the quantiles
+    (or, for an HDI, the sort) run once over the whole matrix instead of once
+    per channel and statistic. NaN columns (zero-spend channels) become 0.
+    """
+    names = list(draws)
+    widths = [draws[name].shape[1] for name in names]
+    matrix = np.nan_to_num(np.concatenate([np.asarray(draws[name], dtype=np.float64)
+                                           for name in names], axis=1))
+
+    if interval == 'hdi':
+        ordered = np.sort(matrix, axis=0)
+        median = np.quantile(ordered, 0.5, axis=0)
+        lower, upper = hdi_bounds(ordered, mass)
+    else:
+        tail = (1 - mass) / 2
+        lower, median, upper = np.quantile(matrix, [tail, 0.5, 1 - tail], axis=0)
+
+    stats = {
+        "mean": matrix.mean(axis=0),
+        "median": median,
+        "lower": lower,
+        "upper": upper,
+        "sd": matrix.std(axis=0),
+        "prob_positive": (matrix > 0).mean(axis=0),
+    }
+    summaries = {}
+    offsets = np.cumsum([0] + widths)
+    for name, start, end in zip(names, offsets[:-1], offsets[1:]):
+        summaries[name] = {stat: values[start:end] for stat, values in stats.items()}
+    return summaries
+
+
+def column_summary(summary: Dict[str, np.ndarray], index: int) -> Dict[str, float]:
+    """One column of a summarize_draws() entry as plain floats"""
+    return {stat: float(values[index]) for stat, values in summary.items()}
+
+
+class PosteriorMetrics:
+    """Lazily computed, cached per-draw metric arrays for one fitted model"""
+
+    def __init__(self, analyzer, model, arrays: Dict[str, Any]):
+        self.analyzer = analyzer
+        self.model = model
+        self.arrays = arrays
+        self.channels = list(arrays['channels'])
+        self.timings: Dict[str, float] = {}
+        self._cache: Dict[str, Any] = {}
+
+    @contextmanager
+    def _timed(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.timings[name] = round(self.timings.get(name, 0.0) + time.perf_counter() - start, 4)
+
+    def _cached(self, name: str, compute):
+        if name not in self._cache:
+            with self._timed(name):
+                self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def posterior(self):
+        return self.model.inference_data.posterior
+
+    def parameter(self, name: str) -> Optional[np.ndarray]:
+        """Posterior draws of one model parameter, or None if the model has no such variable"""
+        if name not in self.posterior.data_vars:
+            return None
+        return self._cached(f'param_{name}', lambda: flatten_draws(self.posterior[name].values))
+
+    @property
+    def spend(self) -> np.ndarray:
+        """Total historical spend per channel, straight from the prepared arrays"""
+        return self._cached('spend', lambda: np.asarray(self.arrays['media_spend'], dtype=np.float64)
+                            .sum(axis=(0, 1)))
+
+    @property
+    def incremental(self) -> np.ndarray:
+        """Incremental outcome per draw and channel over all geos and times (the one full pass)"""
+        return self._cached('incremental_outcome', lambda: flatten_draws(
+            to_numpy(self.analyzer.incremental_outcome())
+        )[:, :len(self.channels)])
+
+    @property
+    def marginal_incremental(self) -> np.ndarray:
+        """Extra outcome per draw and channel from scaling all spend by 1 + MROI_INCREMENT"""
+        return self._cached('marginal_incremental_outcome', lambda: flatten_draws(
+            to_numpy(self.analyzer.incremental_outcome(
+                scaling_factor0=1.0, scaling_factor1=1.0 + MROI_INCREMENT))
+        )[:, :len(self.channels)])
+
+    # Inputs are resolved before the derived metric's timer starts, so each
+    # timing covers only its own work
+
+    @property
+    def roi(self) -> np.ndarray:
+        incremental, spend = self.incremental, self.spend
+        return self._cached('roi', lambda: incremental / np.where(spend > 0, spend, np.nan))
+
+    @property
+    def mroi(self) -> np.ndarray:
+        marginal, spend = self.marginal_incremental, self.spend
+        return self._cached('mroi', lambda: marginal / np.where(spend > 0, spend * MROI_INCREMENT, np.nan))
+
+    @property
+    def contribution_share(self) -> np.ndarray:
+        """Each channel's share of total media incremental outcome, per draw"""
+        incremental = self.incremental
+
+        def compute():
+            total = incremental.sum(axis=1, keepdims=True)
+            return incremental / np.where(total != 0, total, np.nan)
+        return self._cached('contribution', compute)
+
+    @property
+    def expected_outcome(self) -> np.ndarray:
+        """Posterior mean expected outcome per geo and time"""
+        return self._cached('expected_outcome', lambda: flatten_draws(to_numpy(
+            self.analyzer.expected_outcome(aggregate_geos=False, aggregate_times=False)
+        )).mean(axis=0))
+
+    def fit_metrics(self) -> Dict[str, float]:
+        """R-squared, MAPE and wMAPE of the posterior mean fit against the KPI"""
+        expected = self.expected_outcome
+        with self._timed('fit_metrics'):
+            actual = np.asarray(self.arrays['kpi'], dtype=np.float64).reshape(expected.shape)
+            residual = actual - expected
+            ss_tot = np.sum((actual - actual.mean()) ** 2)
+            nonzero = actual != 0
+            return {
+                "r_squared": float(1 - np.sum(residual ** 2) / ss_tot) if ss_tot > 0 else 0.0,
+                "mape": float(np.mean(np.abs(residual[nonzero] / actual[nonzero]))) if nonzero.any() else 0.0,
+                "wmape": float(np.sum(np.abs(residual)) / np.sum(np.abs(actual))) if np.any(actual) else 0.0,
+            }
+
+    def channel_parameters(self) -> Dict[str, Optional[np.ndarray]]:
+        """Posterior draws of the Hill and adstock parameters per channel"""
+        decay = next((self.parameter(name) for name in DECAY_VARIABLES
+                      if name in self.posterior.data_vars), None)
+        return {"ec": self.parameter('ec_m'), "slope": self.parameter('slope_m'), "decay": decay}
+
+    def summaries(self, mass: float = DEFAULT_CREDIBLE_MASS, interval: str = 'eti'):
+        """Batched summaries of ROI, mROI, contribution and control coefficients"""
+        draws = {
+            "roi": self.roi,
+            "mroi": self.mroi,
+            "contribution": self.incremental,
+            "contribution_share": self.contribution_share,
+        }
+        controls = self.parameter('gamma_c')
+        if controls is not None:
+            draws["controls"] = controls.reshape(controls.shape[0], -1)
+        with self._timed('summaries'):
+            return summarize_draws(draws, mass, interval)
+
+    def report_timings(self):
+        print(json.dumps({"status": "posterior_metrics_timings", "timings": self.timings}))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Compact on-disk store of a trained model's posterior, prior and inputs
+
+Every variable is one float32 .npy file under model_outputs/model_N/posterior/
+(optionally thinned along the draw axis), described by manifest.json with its
+group, dims and shape. Opening a store reads only the manifest; variables are
+memory-mapped on first access, so analysis and optimization jobs can reopen a
+model in milliseconds without TensorFlow or re-sampling.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+STORE_DIR = 'posterior'
+MANIFEST = 'manifest.json'
+# Bump when the on-disk layout changes
+STORE_FORMAT = 1
+GROUPS = ('posterior', 'prior')
+# Prepared input blocks kept alongside the draws
+INPUT_BLOCKS = {
+    'kpi': ('geo', 'time'),
+    'media': ('geo', 'time', 'media_channel'),
+    'media_spend': ('geo', 'time', 'media_channel'),
+    'controls_values': ('geo', 'time', 'control_variable'),
+    'population': ('geo',),
+}
+
+
+def posterior_thin(config: Dict[str, Any]) -> int:
+    """Keep every n-th draw in the store, from config or MERIDIAN_POSTERIOR_THIN"""
+    value = config.get('posterior_thin')
+    if value is None:
+        value = os.getenv('MERIDIAN_POSTERIOR_THIN', '1')
+    return max(1, int(value))
+
+
+def _write_group(directory: str, group: str, dataset, thin: int, dtype) -> Dict[str, Any]:
+    """Write each variable of an xarray Dataset as <group>__<name>.npy"""
+    variables = {}
+    for name in dataset.data_vars:
+        data = dataset[name]
+        if 'draw' in data.dims and thin > 1:
+            data = data.isel(draw=slice(None, None, thin))
+        values = data.values
+        if np.issubdtype(values.dtype, np.floating):
+            values = values.astype(dtype, copy=False)
+        file_name = f'{group}__{name}.npy'
+        np.save(os.path.join(directory, file_name), values)
+        variables[name] = {"file": file_name, "dims": list(data.dims), "shape": list(values.shape)}
+    return variables
+
+
+def _coords(dataset) -> Dict[str, List[Any]]:
+    """Non-draw coordinates, as JSON lists"""
+    return {
+        name: [v.item() if hasattr(v, 'item') else v for v in dataset.coords[name].values]
+        for name in dataset.coords if name not in ('chain', 'draw')
+    }
+
+
+def save_posterior(model, arrays: Dict[str, Any], model_dir: str, thin: int = 1,
+                   dtype=np.float32) -> Dict[str, Any]:
+    """Persist posterior, prior and prepared inputs of a fitted model; returns the manifest"""
+    directory = os.path.join(model_dir, STORE_DIR)
+    tmp_dir = tempfile.mkdtemp(dir=model_dir, prefix=f'.{STORE_DIR}-')
+    try:
+        idata = model.inference_data
+        groups, coords = {}, {}
+        for group in GROUPS:
+            if group in idata.groups():
+                dataset = getattr(idata, group)
+                groups[group] = _write_group(tmp_dir, group, dataset, thin, dtype)
+                coords.update(_coords(dataset))
+
+        inputs = {}
+        for name, dims in INPUT_BLOCKS.items():
+            if arrays.get(name) is None:
+                continue
+            values = np.asarray(arrays[name], dtype=dtype)
+            file_name = f'inputs__{name}.npy'
+            np.save(os.path.join(tmp_dir, file_name), values)
+            inputs[name] = {"file": file_name, "dims": list(dims), "shape": list(values.shape)}
+        groups['inputs'] = inputs
+        coords.update({
+            'geo': list(arrays['geos']),
+            'time': list(arrays['times']),
+            'media_channel': list(arrays['channels']),
+            'control_variable': list(arrays['controls']),
+        })
+
+        posterior = idata.posterior
+        spec = getattr(model, 'model_spec', None)
+        manifest = {
+            "format": STORE_FORMAT,
+            "dtype": np.dtype(dtype).name,
+            "thin": thin,
+            "n_chains": int(posterior.sizes['chain']),
+            "n_draws": int(posterior.sizes['draw']),
+            "groups": groups,
+            "coords": coords,
+            # Transform settings the NumPy response model needs to mirror Meridian
+            "spec": {
+                "max_lag": getattr(spec, 'max_lag', None),
+                "hill_before_adstock": bool(getattr(spec, 'hill_before_adstock', False)),
+            },
+        }
+        # Final adapted step size, so a later refit can warm-start from this fit
+        if 'sample_stats' in idata.groups() and 'step_size' in idata.sample_stats:
+            step_size = idata.sample_stats['step_size'].isel(draw=-1).values
+            manifest["sampler"] = {"step_size": float(np.mean(step_size))}
+        with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp_dir, directory)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return manifest
+
+
+def save_group(model_dir: str, group: str, arrays: Dict[str, Any],
+               coords: Optional[Dict[str, List[Any]]] = None) -> Dict[str, Any]:
+    """Add (or replace) a group of derived arrays, given as name -> (values, dims), in an existing store"""
+    directory = os.path.join(model_dir, STORE_DIR)
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    variables = {}
+    for name, (values, dims) in arrays.items():
+        values = np.asarray(values)
+        file_name = f'{group}__{name}.npy'
+        # Replace rather than overwrite: the old file may be hard-linked into a cache entry
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, values)
+        os.replace(tmp_path, os.path.join(directory, file_name))
+        variables[name] = {"file": file_name, "dims": list(dims), "shape": list(values.shape)}
+    manifest['groups'][group] = variables
+    manifest['coords'].update(coords or {})
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST))
+    return manifest
+
+
+def store_size(model_dir: str) -> int:
+    directory = os.path.join(model_dir, STORE_DIR)
+    if not os.path.isdir(directory):
+        return 0
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def copy_store(src_dir: str, dst_dir: str) -> bool:
+    """Copy the store from one model (or cache entry) directory to another, hard-linking files"""
+    src = os.path.join(src_dir, STORE_DIR)
+    if not os.path.isdir(src):
+        return False
+    dst = os.path.join(dst_dir, STORE_DIR)
+    shutil.rmtree(dst, ignore_errors=True)
+    shutil.copytree(src, dst, copy_function=_link_or_copy)
+    return True
+
+
+class PosteriorStore:
+    """Read-only, lazily memory-mapped view of a saved store"""
+
+    def __init__(self, model_dir: str):
+        self.directory = os.path.join(model_dir, STORE_DIR)
+        with open(os.path.join(self.directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported posterior store format: {self.manifest.get('format')}")
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    @property
+    def coords(self) -> Dict[str, List[Any]]:
+        return self.manifest['coords']
+
+    @property
+    def channels(self) -> List[str]:
+        return self.coords['media_channel']
+
+    def variables(self, group: str = 'posterior') -> List[str]:
+        return list(self.manifest['groups'].get(group, {}))
+
+    def has(self, name: str, group: str = 'posterior') -> bool:
+        return name in self.manifest['groups'].get(group, {})
+
+    def get(self, name: str, group: str = 'posterior') -> np.ndarray:
+        """Memory-mapped array of one variable, shaped as in the manifest"""
+        key = f'{group}__{name}'
+        if key not in self._arrays:
+            entry = self.manifest['groups'][group][name]
+            self._arrays[key] = np.load(os.path.join(self.directory, entry['file']), mmap_mode='r')
+        return self._arrays[key]
+
+    def dims(self, name: str, group: str = 'posterior') -> List[str]:
+        return self.manifest['groups'][group][name]['dims']
+
+    def draws(self, name: str, group: str = 'posterior') -> np.ndarray:
+        """Variable with chain and draw merged into one leading axis (still memory-mapped)"""
+        values = self.get(name, group)
+        return values.reshape(-1, *values.shape[2:])
+
+    def inputs(self, name: str) -> Optional[np.ndarray]:
+        return self.get(name, 'inputs') if self.has(name, 'inputs') else None
+
+    def to_dataset(self, group: str = 'posterior'):
+        """xarray Dataset of one group, for tools that want labelled arrays"""
+        import xarray as xr
+
+        data_vars = {}
+        for name in self.variables(group):
+            dims = self.dims(name, group)
+            coords = {dim: self.coords[dim] for dim in dims if dim in self.coords}
+            data_vars[name] = xr.DataArray(self.get(name, group), dims=dims, coords=coords)
+        return xr.Dataset(data_vars)
+
+
+def open_store(model_dir: str) -> Optional[PosteriorStore]:
+    """PosteriorStore for a model directory, or None if it has none"""
+    if not os.path.exists(os.path.join(model_dir, STORE_DIR, MANIFEST)):
+        return None
+    return PosteriorStore(model_dir)
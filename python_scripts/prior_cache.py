@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of Meridian prior samples
+
+Prior draws depend only on the model spec, the data's shape and the scaling
+constants Meridian derives from it (population, KPI and control moments,
+channel media medians and spend totals), plus the seed. Those are hashed into
+the key, so refits of the same spec on data that scales the same way load the
+cached prior instead of sampling it again.
+
+On a miss the prior is sampled on a background thread with its own Meridian
+instance, so it overlaps building the training model and posterior sampling;
+the draws are attached to the training model afterwards and cached.
+"""
+
+import dataclasses
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+from checkpoints import load_inference_data
+from disk_cache import DiskCache, fingerprint
+
+PRIOR_CACHE_DIR = os.getenv(
+    'MERIDIAN_PRIOR_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prior_cache')
+)
+PRIOR_CACHE_MAX_MB = int(os.getenv('MERIDIAN_PRIOR_CACHE_MAX_MB', '1024'))
+PRIOR_CACHE_MAX_ENTRIES = 50
+PRIOR_DRAWS = 1000
+PRIOR_FILE = 'prior.nc'
+
+
+def prior_cache() -> DiskCache:
+    return DiskCache(PRIOR_CACHE_DIR, PRIOR_CACHE_MAX_MB * 2**20, PRIOR_CACHE_MAX_ENTRIES)
+
+
+def describe_spec(value: Any) -> Any:
+    """JSON-serialisable description of a ModelSpec, including prior distribution parameters"""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: describe_spec(getattr(value, field.name)) for field in dataclasses.fields(value)}
+    if hasattr(value, 'parameters') and hasattr(value, 'batch_shape'):
+        # A TensorFlow Probability distribution: its repr omits the parameter values
+        return {"distribution": type(value).__name__,
+                "parameters": {k: describe_spec(v) for k, v in sorted(value.parameters.items())}}
+    if isinstance(value, dict):
+        return {str(k): describe_spec(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [describe_spec(v) for v in value]
+    if hasattr(value, 'numpy') or isinstance(value, np.ndarray):
+        return np.round(np.asarray(value, dtype=np.float64), 10).tolist()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def scaling_constants(arrays: Dict[str, Any]) -> Dict[str, Any]:
+    """Data shape and the constants Meridian scales inputs by, rounded for a stable hash"""
+    population = np.asarray(arrays['population'], dtype=np.float64)
+    kpi = np.asarray(arrays['kpi'], dtype=np.float64) / population[:, None]
+    media = np.asarray(arrays['media'], dtype=np.float64) / population[:, None, None]
+    medians = [float(np.median(m[m > 0])) if np.any(m > 0) else 1.0 for m in np.moveaxis(media, -1, 0)]
+    constants = {
+        "shape": {"geos": len(arrays['geos']), "times": len(arrays['times']),
+                  "channels": list(arrays['channels']), "controls": list(arrays['controls'])},
+        "population": population,
+        "kpi_mean": kpi.mean(),
+        "kpi_std": kpi.std(),
+        "media_medians": medians,
+        "spend_totals": np.asarray(arrays['media_spend'], dtype=np.float64).sum(axis=(0, 1)),
+    }
+    if arrays.get('controls_values') is not None:
+        controls = np.asarray(arrays['controls_values'], dtype=np.float64)
+        constants["controls_mean"] = controls.mean(axis=(0, 1))
+        constants["controls_std"] = controls.std(axis=(0, 1))
+    return {key: np.round(np.asarray(value), 8).tolist() if not isinstance(value, dict) else value
+            for key, value in constants.items()}
+
+
+def prior_cache_key(arrays: Dict[str, Any], model_spec, n_draws: int, seed: Optional[int], version: str) -> str:
+    return fingerprint(describe_spec(model_spec), scaling_constants(arrays), n_draws, seed, version)
+
+
+def _sample_prior(input_data, model_spec, n_draws: int, seed: Optional[int]):
+    """Prior group sampled on a separate Meridian instance, so the training model is untouched"""
+    from meridian.model.model import Meridian
+
+    model = Meridian(input_data=input_data, model_spec=model_spec)
+    model.sample_prior(n_draws=n_draws, seed=seed)
+    idata = model.inference_data
+    return type(idata)(prior=idata.prior)
+
+
+class PriorSamples:
+    """Prior draws for one fit: loaded from the cache, or sampled in the background"""
+
+    def __init__(self, cache: DiskCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.hit = False
+        self.use_cache = True
+        self._prior = None
+        self._future: Optional[Future] = None
+
+    def start(self, input_data, model_spec, n_draws: int = PRIOR_DRAWS,
+              seed: Optional[int] = None, use_cache: bool = True) -> bool:
+        """Load the cached prior, or start sampling it; returns whether the cache hit
+
+        With use_cache=False the cache is neither read nor written.
+        """
+        self.use_cache = use_cache
+        path = self.cache.get(self.key) if use_cache else None
+        if path is not None:
+            try:
+                self._prior = load_inference_data(os.path.join(path, PRIOR_FILE))
+                self.hit = True
+                return True
+            except (OSError, ValueError) as e:
+                print(json.dumps({"status": "prior_cache_error", "message": str(e)}))
+                self.cache.remove(self.key)
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prior')
+        self._future = executor.submit(_sample_prior, input_data, model_spec, n_draws, seed)
+        executor.shutdown(wait=False)
+        return False
+
+    def samples(self):
+        """The prior InferenceData, waiting for the background sampler on a miss"""
+        if self._prior is None:
+            self._prior = self._future.result()
+        return self._prior
+
+    def attach(self, model):
+        """Add the prior group to model and cache its draws on a miss"""
+        prior = self.samples()
+        model.inference_data.extend(prior, join='right')
+        if not self.hit and self.use_cache:
+            try:
+                self.cache.put(self.key, lambda path: prior.to_netcdf(os.path.join(path, PRIOR_FILE)))
+            except OSError as e:
+                print(json.dumps({"status": "prior_cache_error", "message": str(e)}))
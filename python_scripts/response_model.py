@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+NumPy re-implementation of Meridian's media response, evaluated from a stored posterior
+
+Mirrors what Meridian does on the paid-media path:
+  * media is scaled per channel by population and by the median of the
+    non-zero population-scaled values,
+  * geometric adstock with normalized weights alpha^l over max_lag periods,
+  * Hill saturation x^slope / (x^slope + ec^slope), applied after adstock
+    unless the model spec says hill_before_adstock,
+  * times beta_gm, mapped back to KPI units by the population-scaled KPI's
+    standard deviation and each geo's population.
+
+With zero media the Hill term is zero, so the media effect is the incremental
+outcome. Everything is vectorized across posterior draws, chunked so the
+(draws, geo, time, channel) intermediates stay within a fixed memory budget.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_MAX_LAG = 8
+# Elements per (draws, geo, time, channel) intermediate, ~32MB in float32
+CHUNK_ELEMENTS = 1 << 23
+# Spend-multiplier grid precomputed for every channel at training time
+CURVE_MAX_MULTIPLIER = 3.0
+CURVE_STEPS = 100
+# Draws used for the precomputed grid (0 = every stored draw)
+CURVE_DRAWS = int(os.getenv('MERIDIAN_CURVE_DRAWS', '0'))
+ANALYSIS_THREADS = max(1, int(os.getenv('MERIDIAN_ANALYSIS_THREADS', str(os.cpu_count() or 1))))
+
+
+def geometric_adstock(x: np.ndarray, alpha: np.ndarray, max_lag: int) -> np.ndarray:
+    """Adstock along the time axis of x (S or 1, G, T, M) with per-draw decay alpha (S, M)"""
+    n_times = x.shape[2]
+    lags = np.arange(max_lag + 1)
+    weights = alpha[:, None, :] ** lags[None, :, None]
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    weights = weights.astype(x.dtype, copy=False)
+    out = np.zeros((alpha.shape[0],) + x.shape[1:], dtype=x.dtype)
+    term = np.empty_like(out)
+    for lag in range(min(max_lag + 1, n_times)):
+        np.multiply(weights[:, None, lag, None, :], x[:, :, :n_times - lag, :], out=term[:, :, lag:, :])
+        out[:, :, lag:, :] += term[:, :, lag:, :]
+    return out
+
+
+def hill(x: np.ndarray, ec: np.ndarray, slope: np.ndarray) -> np.ndarray:
+    """Hill saturation of x (S, G, T, M) with per-draw ec and slope (S, M)"""
+    ec = ec[:, None, None, :]
+    slope = slope[:, None, None, :]
+    powered = np.power(x, slope)
+    return powered / (powered + np.power(ec, slope))
+
+
+class ResponseModel:
+    """Media response of one stored model, for arbitrary windows, channels and spend multipliers"""
+
+    def __init__(self, store, max_draws: Optional[int] = None, seed: int = 0):
+        self.store = store
+        self.channels: List[str] = list(store.channels)
+        self.times: List[str] = list(store.coords['time'])
+        spec = store.manifest.get('spec') or {}
+        self.max_lag = int(spec.get('max_lag') or DEFAULT_MAX_LAG)
+        self.hill_before_adstock = bool(spec.get('hill_before_adstock', False))
+
+        media = np.asarray(store.inputs('media'), dtype=np.float64)
+        population = np.asarray(store.inputs('population'), dtype=np.float64)
+        kpi = np.asarray(store.inputs('kpi'), dtype=np.float64)
+        self.spend = np.asarray(store.inputs('media_spend'), dtype=np.float64)
+
+        population_scaled = media / population[:, None, None]
+        medians = np.ones(len(self.channels))
+        for m in range(len(self.channels)):
+            values = population_scaled[..., m]
+            if np.any(values > 0):
+                medians[m] = np.median(values[values > 0])
+        self.media_scaled = (population_scaled / medians).astype(np.float32)
+        # KPI units per unit of scaled outcome, per geo
+        self.outcome_scale = (kpi / population[:, None]).std() * population
+
+        n_draws = store.draws('ec_m').shape[0]
+        index = np.arange(n_draws)
+        if max_draws and max_draws < n_draws:
+            index = np.sort(np.random.default_rng(seed).choice(n_draws, max_draws, replace=False))
+        self.draw_index = index
+
+        def draws(name: str) -> np.ndarray:
+            return np.asarray(store.draws(name)[index], dtype=np.float32)
+
+        self.alpha = draws('alpha_m')
+        self.ec = draws('ec_m')
+        self.slope = draws('slope_m')
+        if store.has('beta_gm'):
+            self.beta = draws('beta_gm')
+        else:
+            self.beta = np.repeat(draws('beta_m')[:, None, :], self.media_scaled.shape[0], axis=1)
+
+    @property
+    def n_draws(self) -> int:
+        return len(self.draw_index)
+
+    def channel_index(self, channels: Optional[Sequence[str]] = None) -> List[int]:
+        if not channels:
+            return list(range(len(self.channels)))
+        unknown = [c for c in channels if c not in self.channels]
+        if unknown:
+            raise ValueError(f"Unknown channels: {unknown}")
+        return [self.channels.index(c) for c in channels]
+
+    def time_mask(self, start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Boolean mask of the model's time coordinates within [start, end] (ISO dates)"""
+        times = np.array(self.times)
+        mask = np.ones(len(times), dtype=bool)
+        if start:
+            mask &= times >= start
+        if end:
+            mask &= times <= end
+        if not mask.any():
+            raise ValueError(f"No model time periods between {start} and {end}")
+        return mask
+
+    def window_spend(self, channels: List[int], mask: np.ndarray) -> np.ndarray:
+        """Historical spend per selected channel within the window"""
+        return self.spend[:, mask][..., channels].sum(axis=(0, 1))
+
+    def _draw_chunks(self, n_channels: int):
+        """Draw slices bounded by CHUNK_ELEMENTS, and at least one per thread"""
+        n_geos, n_times = self.media_scaled.shape[:2]
+        size = max(1, CHUNK_ELEMENTS // max(1, n_geos * n_times * n_channels))
+        size = min(size, -(-self.n_draws // ANALYSIS_THREADS))
+        return [slice(start, min(start + size, self.n_draws)) for start in range(0, self.n_draws, size)]
+
+    def incremental(self, channels: List[int], mask: np.ndarray,
+                    multipliers: Sequence[float] = (1.0,)) -> np.ndarray:
+        """Incremental outcome (draws, multipliers, channels) within the window
+
+        Each multiplier scales every selected channel's media over the whole
+        history, so carry-over into the window scales with it. Draw chunks run
+        on a thread pool; NumPy releases the GIL in the elementwise kernels.
+        """
+        multipliers = np.asarray(multipliers, dtype=np.float32)
+        x = self.media_scaled[None][..., channels]
+        weights = (self.outcome_scale[:, None] * mask[None, :]).astype(np.float32)
+        out = np.zeros((self.n_draws, len(multipliers), len(channels)))
+
+        def run(chunk: slice):
+            out[chunk] = self._incremental_chunk(chunk, channels, x, weights, multipliers)
+
+        chunks = self._draw_chunks(len(channels))
+        if len(chunks) > 1 and ANALYSIS_THREADS > 1:
+            with ThreadPoolExecutor(max_workers=min(ANALYSIS_THREADS, len(chunks))) as pool:
+                list(pool.map(run, chunks))
+        else:
+            for chunk in chunks:
+                run(chunk)
+        return out
+
+    def _incremental_chunk(self, chunk: slice, channels: List[int], x: np.ndarray,
+                           weights: np.ndarray, multipliers: np.ndarray) -> np.ndarray:
+        alpha = self.alpha[chunk][:, channels]
+        ec = self.ec[chunk][:, channels]
+        slope = self.slope[chunk][:, channels]
+        beta = self.beta[chunk][:, :, channels]
+        n = alpha.shape[0]
+        out = np.empty((n, len(multipliers), len(channels)))
+
+        if self.hill_before_adstock:
+            for k, multiplier in enumerate(multipliers):
+                effect = geometric_adstock(hill(x * multiplier, ec, slope), alpha, self.max_lag)
+                out[:, k] = np.einsum('sgtm,sgm,gt->sm', effect, beta, weights, optimize=True)
+            return out
+
+        # Adstock is linear and hill(k * a) = 1 / (1 + k^-slope * (ec / a)^slope),
+        # so adstock and the elementwise power run once per chunk, not per multiplier
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            ratio = np.power(ec[:, None, None, :] / geometric_adstock(x, alpha, self.max_lag),
+                             slope[:, None, None, :])
+            scale = np.power(multipliers[:, None, None], -slope[None]).astype(np.float32)
+        # (draws, channel, geo * time) so each multiplier is a contiguous reduction
+        ratio = np.ascontiguousarray(ratio.transpose(0, 3, 1, 2).reshape(n, len(channels), -1))
+        weighted = (beta.transpose(0, 2, 1)[:, :, :, None] * weights[None, None]).reshape(ratio.shape)
+        effect = np.empty_like(ratio)
+        with np.errstate(over='ignore', invalid='ignore'):
+            for k in range(len(multipliers)):
+                np.multiply(ratio, scale[k][:, :, None], out=effect)
+                effect += 1.0
+                np.reciprocal(effect, out=effect)
+                out[:, k] = np.einsum('smn,smn->sm', effect, weighted)
+        return out
+
+
+def curve_grid(model: ResponseModel, multipliers: Sequence[float],
+               quantiles: Sequence[float]) -> Dict[str, np.ndarray]:
+    """Mean and quantiles of every channel's incremental outcome over the whole history per multiplier"""
+    channels = list(range(len(model.channels)))
+    incremental = model.incremental(channels, model.time_mask(), multipliers)
+    return {
+        "multipliers": np.asarray(multipliers, dtype=np.float32),
+        "spend": model.window_spend(channels, model.time_mask()).astype(np.float32),
+        "quantiles": np.asarray(quantiles, dtype=np.float32),
+        "mean": incremental.mean(axis=0).astype(np.float32),
+        "bands": np.quantile(incremental, quantiles, axis=0).astype(np.float32),
+    }
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+Posterior sampling for the Meridian trainer
+
+By default all chains run inside the trainer's TensorFlow process. With
+chain_processes > 1 the chains are split into groups, and each group is
+sampled in its own spawned process pinned to a disjoint set of cores with its
+own seed. The groups' posteriors are then concatenated along the chain
+dimension and attached to the parent model, so Analyzer sees one posterior.
+
+With sampling.adaptive the kept draws are collected in segments. After each
+segment R-hat and bulk/tail ESS are computed over everything kept so far, and
+sampling stops once the targets are met or continues from the last state of
+each chain until max_draws. The same segments are checkpointed to disk (see
+checkpoints.py) so an interrupted run resumes instead of starting over.
+
+A refit can warm-start from an earlier fit's stored posterior: chains start
+at that fit's last draws (aligned by coordinate labels, with anything new
+taken from the new model's prior), the earlier step size seeds adaptation and
+warmup is cut to a fraction. The result is kept only if it meets the
+convergence targets; otherwise the model is sampled again from scratch.
+"""
+
+import inspect
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+from checkpoints import checkpoint_draws, load_inference_data
+from posterior_store import open_store
+
+# InferenceData groups written by Meridian's posterior sampler
+POSTERIOR_GROUPS = ('posterior', 'sample_stats', 'trace')
+
+# Convergence targets (Vehtari et al. 2021 recommendations)
+DEFAULT_TARGET_RHAT = 1.01
+DEFAULT_MIN_ESS = 400
+DEFAULT_SEGMENT_DRAWS = 250
+# Warmup for continuation segments, which restart the sampler from the last draws
+CONTINUATION_WARMUP = 100
+# Share of the usual warmup kept when starting from an earlier fit's posterior
+DEFAULT_WARM_START_FRACTION = 0.25
+
+
+def chain_processes(config: Dict[str, Any]) -> int:
+    """Number of sampling processes, from config.sampling or MERIDIAN_CHAIN_PROCESSES"""
+    value = (config.get('sampling') or {}).get('chain_processes')
+    if value is None:
+        value = os.getenv('MERIDIAN_CHAIN_PROCESSES', '1')
+    return max(1, int(value))
+
+
+def convergence_targets(config: Dict[str, Any], sampling_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Adaptive sampling settings from config.sampling, with defaults"""
+    sampling = config.get('sampling') or {}
+    adaptive = sampling.get('adaptive')
+    if adaptive is None:
+        adaptive = os.getenv('MERIDIAN_ADAPTIVE_SAMPLING', 'false') == 'true'
+    return {
+        'adaptive': bool(adaptive),
+        'target_rhat': float(sampling.get('target_rhat', DEFAULT_TARGET_RHAT)),
+        'min_ess_bulk': float(sampling.get('min_ess_bulk', DEFAULT_MIN_ESS)),
+        'min_ess_tail': float(sampling.get('min_ess_tail', DEFAULT_MIN_ESS)),
+        'segment_draws': int(sampling.get('segment_draws', DEFAULT_SEGMENT_DRAWS)),
+        'max_draws': int(sampling.get('max_draws', 2 * int(sampling_config['n_keep']))),
+    }
+
+
+def warm_start_fraction(config: Dict[str, Any]) -> float:
+    """Warmup fraction for warm-started fits, from config.sampling or MERIDIAN_WARM_START_FRACTION"""
+    value = (config.get('sampling') or {}).get('warm_start_fraction')
+    if value is None:
+        value = os.getenv('MERIDIAN_WARM_START_FRACTION', str(DEFAULT_WARM_START_FRACTION))
+    return min(1.0, max(0.0, float(value)))
+
+
+def _labels(values) -> List[str]:
+    return [str(v.item() if hasattr(v, 'item') else v) for v in values]
+
+
+def _aligned_index(dims, new_coords: Dict[str, List[str]], old_coords: Dict[str, List[str]],
+                   new_shape, old_shape):
+    """(new positions, old positions) per dim for the labels both fits share, or None"""
+    new_index, old_index = [], []
+    for dim, new_size, old_size in zip(dims, new_shape, old_shape):
+        new_labels = new_coords.get(dim) or [str(i) for i in range(new_size)]
+        old_labels = old_coords.get(dim) or [str(i) for i in range(old_size)]
+        positions = {label: i for i, label in enumerate(old_labels)}
+        shared = [(i, positions[label]) for i, label in enumerate(new_labels) if label in positions]
+        if not shared:
+            return None
+        new_index.append([i for i, _ in shared])
+        old_index.append([j for _, j in shared])
+    return new_index, old_index
+
+
+def model_coords(model, arrays: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Coordinate labels per posterior dim of a model built from arrays"""
+    coords = {
+        'geo': _labels(arrays['geos']),
+        'time': _labels(arrays['times']),
+        'media_channel': _labels(arrays['channels']),
+        'control_variable': _labels(arrays['controls']),
+    }
+    n_knots = getattr(getattr(model, 'knot_info', None), 'n_knots', None)
+    if n_knots is not None:
+        coords['knots'] = [str(i) for i in range(int(n_knots))]
+    return coords
+
+
+def _stored_last_draws(store, name: str, coords: Dict[str, List[str]],
+                       old_coords: Dict[str, List[str]], n_chains: int) -> Optional[np.ndarray]:
+    """Last draw per chain of a stored variable over the new labels, or None if any label is new"""
+    old = store.get(name)
+    index = []
+    for dim, size in zip(store.dims(name)[2:], old.shape[2:]):
+        if dim not in coords:
+            return None
+        positions = {label: i for i, label in enumerate(old_coords.get(dim) or [str(i) for i in range(size)])}
+        if any(label not in positions for label in coords[dim]):
+            return None
+        index.append([positions[label] for label in coords[dim]])
+    last = np.asarray(old[:, -1])[np.arange(n_chains) % old.shape[0]]
+    return last[(slice(None),) + np.ix_(*index)] if index else last
+
+
+def warm_start_state(source_dir: str, prior, n_chains: int, config: Dict[str, Any],
+                     coords: Optional[Dict[str, List[str]]] = None,
+                     variables: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Initial chain states and step size from the stored posterior of an earlier fit
+
+    Every chain starts at the earlier fit's last draw of a chain. Variables
+    whose labels (channels, geos, controls, weeks, knots) the earlier fit all
+    has are read straight from its store. Only variables with new labels, or
+    that the earlier fit lacks, wait for the new model's prior (prior.samples())
+    and start from a prior draw, overwritten wherever the labels are shared.
+    coords are the new model's labels (see model_coords) and variables the ones
+    its sampler draws; without both, every variable goes through the prior.
+    Returns None if source_dir has no stored posterior.
+    """
+    store = open_store(source_dir) if source_dir else None
+    if store is None:
+        return None
+    old_coords = {dim: _labels(labels) for dim, labels in store.coords.items()}
+
+    state, reused, gaps = {}, [], None
+    if coords is not None and variables is not None:
+        gaps = []
+        for name in variables:
+            values = _stored_last_draws(store, name, coords, old_coords, n_chains) if store.has(name) else None
+            if values is None:
+                gaps.append(name)
+            else:
+                state[name] = values
+                reused.append(name)
+
+    from_prior = []
+    if gaps is None or gaps:
+        for name in prior.samples().prior.data_vars:
+            if (gaps is not None and name not in gaps) or (variables is not None and name not in variables):
+                continue
+            variable = prior.samples().prior[name]
+            dims = variable.dims[2:]
+            draws = variable.values.reshape(-1, *variable.shape[2:])
+            values = np.array(draws[np.arange(n_chains) % len(draws)])
+            if store.has(name) and list(store.dims(name)[2:]) == list(dims):
+                old = store.get(name)
+                new_coords = {dim: _labels(variable.coords[dim].values) for dim in dims if dim in variable.coords}
+                index = _aligned_index(dims, new_coords, old_coords, values.shape[1:], old.shape[2:])
+                if index is not None:
+                    last = np.asarray(old[:, -1])[np.arange(n_chains) % old.shape[0]]
+                    new_index, old_index = index
+                    values[(slice(None),) + np.ix_(*new_index)] = last[(slice(None),) + np.ix_(*old_index)]
+                    reused.append(name)
+            state[name] = values
+            from_prior.append(name)
+
+    return {
+        "source": source_dir,
+        "state": state,
+        "reused": reused,
+        "from_prior": from_prior,
+        "step_size": (store.manifest.get('sampler') or {}).get('step_size'),
+        "fraction": warm_start_fraction(config),
+    }
+
+
+def _warm_config(model, sampling_config: Dict[str, Any], warm_start: Dict[str, Any],
+                 n_keep: Optional[int] = None) -> Dict[str, Any]:
+    """Sampling settings with shortened warmup, starting from the warm-start state"""
+    segment = dict(sampling_config)
+    for key in ('n_draws', 'n_adapt'):
+        if key in segment:
+            segment[key] = max(CONTINUATION_WARMUP, int(round(int(segment[key]) * warm_start['fraction'])))
+    if 'n_burnin' in segment:
+        segment['n_burnin'] = int(round(int(segment['n_burnin']) * warm_start['fraction']))
+    if n_keep is not None:
+        segment['n_keep'] = n_keep
+    if warm_start.get('step_size') and 'init_step_size' in inspect.signature(model.sample_posterior).parameters:
+        segment['init_step_size'] = warm_start['step_size']
+    return {**segment, 'current_state': warm_start['state']}
+
+
+def _warm_start_report(warm_start: Dict[str, Any], accepted: bool) -> Dict[str, Any]:
+    return {"source": warm_start['source'], "fraction": warm_start['fraction'],
+            "reused": len(warm_start['reused']), "accepted": accepted}
+
+
+def _worst(dataset, pick) -> tuple:
+    """(value, variable) of the worst finite value across a diagnostics Dataset"""
+    best = (None, None)
+    for name in dataset.data_vars:
+        values = np.asarray(dataset[name].values, dtype=float)
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            continue
+        value = float(pick(values))
+        if best[0] is None or (value != best[0] and pick([best[0], value]) == value):
+            best = (value, name)
+    return best
+
+
+def posterior_diagnostics(idata, targets: Dict[str, Any]) -> Dict[str, Any]:
+    """Worst R-hat and bulk/tail ESS over all posterior variables, against the targets"""
+    import arviz as az
+
+    posterior = idata.posterior
+    n_chains, n_draws = posterior.sizes['chain'], posterior.sizes['draw']
+    rhat, rhat_param = _worst(az.rhat(posterior), np.max) if n_chains > 1 else (None, None)
+    ess_bulk, bulk_param = _worst(az.ess(posterior, method='bulk'), np.min)
+    ess_tail, tail_param = _worst(az.ess(posterior, method='tail'), np.min)
+
+    converged = (
+        (rhat is None or rhat <= targets['target_rhat'])
+        and (ess_bulk is None or ess_bulk >= targets['min_ess_bulk'])
+        and (ess_tail is None or ess_tail >= targets['min_ess_tail'])
+    )
+    return {
+        "rhat_max": rhat,
+        "rhat_max_param": rhat_param,
+        "ess_bulk_min": ess_bulk,
+        "ess_bulk_min_param": bulk_param,
+        "ess_tail_min": ess_tail,
+        "ess_tail_min_param": tail_param,
+        "n_chains": int(n_chains),
+        "n_draws_kept": int(n_draws),
+        "converged": bool(converged),
+        "targets": {k: targets[k] for k in ('target_rhat', 'min_ess_bulk', 'min_ess_tail')},
+    }
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def chain_groups(n_chains: int, n_processes: int) -> List[int]:
+    """Chains per process, as even as possible (4 chains on 3 processes -> [2, 1, 1])"""
+    n_processes = min(n_processes, n_chains)
+    base, extra = divmod(n_chains, n_processes)
+    return [base + (1 if i < extra else 0) for i in range(n_processes)]
+
+
+def core_groups(cores: List[int], weights: List[int]) -> List[List[int]]:
+    """Split cores into contiguous blocks proportional to each process's chain count"""
+    if len(cores) < len(weights):
+        # Fewer cores than processes: share them round-robin
+        return [[cores[i % len(cores)]] for i in range(len(weights))]
+    bounds = np.round(np.cumsum([0] + weights) / sum(weights) * len(cores)).astype(int)
+    return [cores[bounds[i]:bounds[i + 1]] for i in range(len(weights))]
+
+
+def pin_to_cores(cores: List[int]):
+    """Pin this process to cores and size TensorFlow's thread pools to match
+
+    Thread pools are sized when TensorFlow is imported, so call this first.
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    threads = str(len(cores))
+    os.environ['TF_NUM_INTRAOP_THREADS'] = threads
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.environ['OMP_NUM_THREADS'] = threads
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+
+def group_seeds(seed: int, n_groups: int) -> List[int]:
+    """Independent per-process seeds derived from the run's seed"""
+    states = np.random.SeedSequence(seed).generate_state(n_groups)
+    return [int(state % 2**31) for state in states]
+
+
+def _sample_chain_group(data_file: str, config: Dict[str, Any], sampling_config: Dict[str, Any],
+                        cores: List[int], output_path: str) -> str:
+    """Child process: pin to cores, rebuild the model and sample this group's chains"""
+    pin_to_cores(cores)
+
+    from data_prep import input_data_from_arrays
+    from dataset_cache import load_dataset
+    from meridian.model.model import Meridian
+    from meridian.model.spec import ModelSpec
+
+    arrays = load_dataset(data_file).prepared_arrays(config)
+    model = Meridian(input_data=input_data_from_arrays(arrays), model_spec=ModelSpec())
+    model.sample_posterior(**sampling_config)
+
+    _posterior_groups(model.inference_data).to_netcdf(output_path)
+    return output_path
+
+
+def merge_chain_groups(paths: List[str]):
+    """Concatenate per-process posteriors along the chain dimension"""
+    import arviz as az
+
+    parts = [load_inference_data(path) for path in paths]
+    return parts[0] if len(parts) == 1 else az.concat(*parts, dim='chain')
+
+
+def _posterior_groups(idata):
+    """The sampler's groups of an InferenceData, detached from later extend() calls"""
+    return type(idata)(**{name: getattr(idata, name) for name in POSTERIOR_GROUPS
+                          if name in idata.groups()})
+
+
+def sampler_variables(model) -> Optional[List[str]]:
+    """Variables the posterior sampler draws, leaving out deterministic transforms of them
+
+    Read from the model's joint distribution; None if it cannot be inspected.
+    """
+    owner = getattr(model, 'posterior_sampler_callable', None)
+    get_joint_dist = getattr(owner, '_get_joint_dist', None) or getattr(model, '_get_joint_dist', None)
+    if get_joint_dist is None:
+        return None
+    try:
+        import tensorflow_probability as tfp
+
+        distributions, _ = get_joint_dist().sample_distributions(seed=0)
+        items = distributions._asdict().items() if hasattr(distributions, '_asdict') else distributions.items()
+        return [name for name, distribution in items
+                if not isinstance(distribution, tfp.distributions.Deterministic)]
+    except Exception:
+        return None
+
+
+def _last_state(idata, variables: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """Final draw of every chain for the sampler's variables, to continue sampling from"""
+    posterior = idata.posterior
+    names = [name for name in posterior.data_vars if variables is None or name in variables]
+    return {name: posterior[name].isel(draw=-1).values for name in names}
+
+
+def _continuation_config(sampling_config: Dict[str, Any], n_keep: int, seed: int) -> Dict[str, Any]:
+    """Sampling settings for a segment that resumes from the previous segment's state"""
+    segment = {**sampling_config, 'n_keep': n_keep, 'seed': seed}
+    for key in ('n_draws', 'n_adapt'):
+        if key in segment:
+            segment[key] = CONTINUATION_WARMUP
+    if 'n_burnin' in segment:
+        segment['n_burnin'] = 0
+    return segment
+
+
+def _step_size(segment) -> Optional[float]:
+    """Mean final step size of a segment, to seed the next segment's adaptation"""
+    if 'sample_stats' not in segment.groups() or 'step_size' not in segment.sample_stats:
+        return None
+    return float(np.mean(segment.sample_stats['step_size'].isel(draw=-1).values))
+
+
+def _sample_segmented(model, sampling_config: Dict[str, Any], targets: Dict[str, Any],
+                      segment_draws: int, checkpoint=None,
+                      warm_start: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Sample in segments, checkpointing each one and stopping early once converged
+
+    Without adaptive targets the run keeps exactly n_keep draws; with them it
+    stops as soon as the targets are met, or at max_draws. A warm-started run
+    that ends unconverged, including one resumed from its checkpoints, is
+    discarded and restarts cold, and if a segment cannot be continued the
+    whole run is sampled in one pass.
+    """
+    import arviz as az
+
+    adaptive = targets['adaptive']
+    goal = targets['max_draws'] if adaptive else int(sampling_config['n_keep'])
+    segment_draws = max(1, min(segment_draws, goal))
+    seed = int(sampling_config.get('seed') or 0)
+    parameters = inspect.signature(model.sample_posterior).parameters
+    if 'current_state' not in parameters:
+        print(json.dumps({"warning": "sample_posterior has no current_state; sampling in one pass"}))
+        model.sample_posterior(**sampling_config)
+        return {**posterior_diagnostics(model.inference_data, targets), "adaptive": False}
+
+    parts, step_size = checkpoint.load() if checkpoint else ([], None)
+    kept = sum(part.posterior.sizes['draw'] for part in parts)
+    if parts:
+        print(json.dumps({"status": "resuming_from_checkpoint", "segments": len(parts), "draws_kept": kept}))
+    merged = az.concat(*parts, dim='draw') if len(parts) > 1 else (parts[0] if parts else None)
+    diagnostics = posterior_diagnostics(merged, targets) if merged is not None else None
+
+    variables = sampler_variables(model)
+    # Resumed segments keep the warm-start flag, so they face the same convergence check
+    warm_started = bool(parts) and checkpoint.warm_started()
+    while kept < goal and not (adaptive and diagnostics and diagnostics['converged']):
+        n_keep = min(segment_draws, goal - kept)
+        if not parts and warm_start:
+            # Started from an earlier fit, so the first segment needs only part of the warmup
+            model.sample_posterior(**_warm_config(model, sampling_config, warm_start, n_keep))
+            warm_started = True
+        elif not parts:
+            # The first segment carries the full warmup
+            model.sample_posterior(**{**sampling_config, 'n_keep': n_keep})
+        else:
+            segment = _continuation_config(sampling_config, n_keep, seed + len(parts))
+            if step_size and 'init_step_size' in parameters:
+                segment['init_step_size'] = step_size
+            try:
+                model.sample_posterior(**segment, current_state=_last_state(parts[-1], variables))
+            except (TypeError, ValueError) as e:
+                # Never keep a partial run: sample everything again in one uninterrupted pass
+                print(json.dumps({"warning": "could not continue sampling; sampling in one pass",
+                                  "message": str(e)}))
+                if checkpoint:
+                    checkpoint.clear()
+                model.sample_posterior(**sampling_config)
+                result = {**posterior_diagnostics(model.inference_data, targets), "adaptive": False,
+                          "segmented_fallback": True}
+                if warm_start:
+                    result["warm_start"] = _warm_start_report(warm_start, False)
+                return result
+
+        part = _posterior_groups(model.inference_data)
+        parts.append(part)
+        kept += n_keep
+        step_size = _step_size(part) or step_size
+        if checkpoint:
+            checkpoint.save(len(parts) - 1, part, n_keep, step_size, warm_started)
+        merged = az.concat(*parts, dim='draw') if len(parts) > 1 else part
+        if adaptive:
+            diagnostics = posterior_diagnostics(merged, targets)
+        print(json.dumps({"status": "sampling_segment", "segment": len(parts), "draws_kept": kept,
+                          "goal": goal,
+                          "rhat_max": diagnostics['rhat_max'] if diagnostics else None,
+                          "ess_bulk_min": diagnostics['ess_bulk_min'] if diagnostics else None}))
+
+    n_kept = merged.posterior.sizes['draw']
+    if n_kept != kept or (not adaptive and kept != goal):
+        raise RuntimeError(f"Segmented sampling kept {n_kept} draws per chain, expected {goal}")
+    if not adaptive:
+        diagnostics = posterior_diagnostics(merged, targets)
+    if warm_started and not diagnostics['converged']:
+        print(json.dumps({"status": "warm_start_rejected", "rhat_max": diagnostics['rhat_max'],
+                          "ess_bulk_min": diagnostics['ess_bulk_min']}))
+        if checkpoint:
+            checkpoint.clear()
+        result = _sample_segmented(model, sampling_config, targets, segment_draws, checkpoint)
+        return {**result, "warm_start": _warm_start_report(warm_start, False)} if warm_start else result
+
+    model.inference_data.extend(merged, join='right')
+    print(json.dumps({"status": "segmented_sampling_done", "segments": len(parts), "draws_kept": kept,
+                      "converged": diagnostics['converged']}))
+    result = {**diagnostics, "adaptive": adaptive, "n_segments": len(parts), "max_draws": goal}
+    if warm_started and warm_start:
+        result["warm_start"] = _warm_start_report(warm_start, True)
+    return result
+
+
+def sample_posterior(model, sampling_config: Dict[str, Any], n_processes: int = 1,
+                     data_file: str = None, config: Dict[str, Any] = None,
+                     checkpoint=None, warm_start: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Sample model's posterior and return its convergence diagnostics
+
+    Runs in-process, in segments when adaptive targets or a checkpoint are
+    configured, or chain-parallel across n_processes. Segments need
+    cross-chain R-hat and every chain's last state after each segment, so they
+    only apply to in-process sampling; so does a warm start.
+    """
+    config = config or {}
+    targets = convergence_targets(config, sampling_config)
+    n_chains = int(sampling_config['n_chains'])
+    interval = checkpoint_draws(config) if checkpoint else 0
+    if warm_start and 'current_state' not in inspect.signature(model.sample_posterior).parameters:
+        print(json.dumps({"warning": "sample_posterior has no current_state; warm start skipped"}))
+        warm_start = None
+    if warm_start and n_processes > 1 and n_chains > 1:
+        print(json.dumps({"status": "warm_start_skipped", "reason": "chain_parallel_sampling"}))
+        warm_start = None
+
+    if n_processes > 1 and n_chains > 1:
+        _sample_chain_parallel(model, sampling_config, n_processes, data_file, config)
+    elif targets['adaptive'] or interval:
+        segment_draws = targets['segment_draws'] if targets['adaptive'] else interval
+        return _sample_segmented(model, sampling_config, targets, segment_draws,
+                                 checkpoint if interval else None, warm_start)
+    elif warm_start:
+        model.sample_posterior(**_warm_config(model, sampling_config, warm_start))
+        diagnostics = posterior_diagnostics(model.inference_data, targets)
+        if diagnostics['converged']:
+            return {**diagnostics, "adaptive": False, "warm_start": _warm_start_report(warm_start, True)}
+        print(json.dumps({"status": "warm_start_rejected", "rhat_max": diagnostics['rhat_max'],
+                          "ess_bulk_min": diagnostics['ess_bulk_min']}))
+        model.sample_posterior(**sampling_config)
+        return {**posterior_diagnostics(model.inference_data, targets), "adaptive": False,
+                "warm_start": _warm_start_report(warm_start, False)}
+    else:
+        model.sample_posterior(**sampling_config)
+    return {**posterior_diagnostics(model.inference_data, targets), "adaptive": False}
+
+
+def _sample_chain_parallel(model, sampling_config: Dict[str, Any], n_processes: int,
+                           data_file: str, config: Dict[str, Any]):
+    """Sample chain groups in separate core-pinned processes and merge them into model"""
+    import multiprocessing
+
+    n_chains = int(sampling_config['n_chains'])
+    groups = chain_groups(n_chains, n_processes)
+    cores = core_groups(available_cores(), groups)
+    seeds = group_seeds(int(sampling_config.get('seed') or 0), len(groups))
+    print(json.dumps({
+        "status": "chain_parallel_sampling",
+        "processes": len(groups),
+        "chains_per_process": groups,
+        "cores_per_process": [len(c) for c in cores],
+    }))
+
+    tmp_dir = tempfile.mkdtemp(prefix='meridian_chains_')
+    try:
+        # spawn gives each child a fresh interpreter, so TensorFlow starts
+        # with that child's affinity and thread settings
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=len(groups), mp_context=context) as pool:
+            futures = {}
+            for i, (n, group_cores, seed) in enumerate(zip(groups, cores, seeds)):
+                group_config = {**sampling_config, 'n_chains': n, 'seed': seed}
+                path = os.path.join(tmp_dir, f'chains_{i}.nc')
+                futures[pool.submit(_sample_chain_group, data_file, config, group_config,
+                                    group_cores, path)] = i
+
+            paths = [None] * len(groups)
+            for done, future in enumerate(as_completed(futures), start=1):
+                paths[futures[future]] = future.result()
+                print(json.dumps({"status": "chain_group_done", "group": futures[future],
+                                  "completed": done, "total": len(groups)}))
+
+        merged = merge_chain_groups(paths)
+        model.inference_data.extend(merged, join='right')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
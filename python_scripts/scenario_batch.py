@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Score many budget plans at once against a trained model's response
+
+Input (JSON file):
+  {"scenarios": [[...], ...],          scenarios x channels
+   "channels": [...],                  column order; other channels stay at current spend
+   "units": "spend" | "multiplier",    absolute spend (default) or multiples of current
+   "names": [...],                     optional scenario names
+   "include_channels": true}           per-channel outcome in each result
+
+Scenarios are evaluated in memory-bounded chunks, each one vectorized pass
+over (scenarios, channels, geo, time), and every chunk is printed as a JSON
+line as soon as it is ready so the server can stream it. The response of each
+model stays open in the warm worker between batches.
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from budget_optimizer import response_from_results
+from posterior_store import MANIFEST, STORE_DIR
+from response_model import ANALYSIS_THREADS, CHUNK_ELEMENTS
+
+RESPONSE_CACHE_SIZE = int(os.getenv('MERIDIAN_ANALYSIS_MODELS', '8'))
+
+_responses: 'OrderedDict[tuple, tuple]' = OrderedDict()
+
+
+def _model_version(model_dir: str) -> float:
+    """Newest of results.json and the store manifest, so a re-trained model is reloaded"""
+    paths = [os.path.join(model_dir, 'results.json'), os.path.join(model_dir, STORE_DIR, MANIFEST)]
+    return max(os.path.getmtime(p) for p in paths if os.path.exists(p))
+
+
+def model_response(model_dir: str):
+    """(response, channels, current spend) for a model directory, reused across batches"""
+    key = (os.path.abspath(model_dir), _model_version(model_dir))
+    if key in _responses:
+        _responses.move_to_end(key)
+        return _responses[key]
+
+    with open(os.path.join(model_dir, 'results.json')) as f:
+        model_results = json.load(f)
+    response, channels, current, _ = response_from_results(model_results, model_dir)
+    _responses[key] = (response, channels, current)
+    while len(_responses) > RESPONSE_CACHE_SIZE:
+        _responses.popitem(last=False)
+    return _responses[key]
+
+
+def scenario_matrix(request: Dict[str, Any], channels: List[str], current: np.ndarray) -> np.ndarray:
+    """Full (scenarios, model channels) spend matrix from the request"""
+    values = np.asarray(request.get('scenarios') or [], dtype=np.float64)
+    if values.ndim != 2 or len(values) == 0:
+        raise ValueError("scenarios must be a non-empty scenarios x channels matrix")
+    columns = request.get('channels') or channels
+    if values.shape[1] != len(columns):
+        raise ValueError(f"scenarios have {values.shape[1]} columns but {len(columns)} channels were given")
+    unknown = [c for c in columns if c not in channels]
+    if unknown:
+        raise ValueError(f"Unknown channels: {unknown}")
+
+    index = [channels.index(c) for c in columns]
+    if request.get('units', 'spend') == 'multiplier':
+        values = values * current[index]
+    if np.any(values < 0) or not np.all(np.isfinite(values)):
+        raise ValueError("Scenario spend must be finite and non-negative")
+    spend = np.tile(current, (len(values), 1))
+    spend[:, index] = values
+    return spend
+
+
+def score_chunk(response, spend: np.ndarray, current_outcome: float) -> Dict[str, np.ndarray]:
+    outcome = response.batch_values(spend)
+    total_spend = spend.sum(axis=1)
+    total = outcome.sum(axis=1)
+    return {
+        "outcome": outcome,
+        "total_spend": total_spend,
+        "total_outcome": total,
+        "roi": np.divide(total, total_spend, out=np.zeros_like(total), where=total_spend > 0),
+        "lift": total - current_outcome,
+    }
+
+
+def chunk_lines(offset: int, scores: Dict[str, np.ndarray], channels: List[str],
+                names: Optional[List[str]], include_channels: bool) -> Dict[str, Any]:
+    results = []
+    for i in range(len(scores['total_outcome'])):
+        result = {
+            "index": offset + i,
+            "total_spend": float(scores['total_spend'][i]),
+            "total_outcome": float(scores['total_outcome'][i]),
+            "roi": float(scores['roi'][i]),
+            "lift": float(scores['lift'][i]),
+        }
+        if names:
+            result["name"] = names[offset + i]
+        if include_channels:
+            result["channel_outcome"] = dict(zip(channels, scores['outcome'][i].round(2).tolist()))
+        results.append(result)
+    return {"status": "scenario_results", "offset": offset, "results": results}
+
+
+def run_batch(model_dir: str, request: Dict[str, Any], emit=None) -> Dict[str, Any]:
+    """Score every scenario, passing each finished chunk to emit; returns a summary"""
+    start = time.perf_counter()
+    response, channels, current = model_response(model_dir)
+    spend = scenario_matrix(request, channels, current)
+    names = request.get('names')
+    if names is not None and len(names) != len(spend):
+        raise ValueError("names must have one entry per scenario")
+    include_channels = bool(request.get('include_channels', True))
+    current_outcome = float(response.batch_values(current[None])[0].sum())
+
+    rows = max(1, CHUNK_ELEMENTS // response.row_elements)
+    offsets = list(range(0, len(spend), rows))
+    best, best_outcome = -1, -np.inf
+
+    # Chunks run on a thread pool but are emitted in order
+    with ThreadPoolExecutor(max_workers=max(1, min(ANALYSIS_THREADS, len(offsets)))) as pool:
+        chunks = pool.map(lambda offset: score_chunk(response, spend[offset:offset + rows], current_outcome),
+                          offsets)
+        for offset, scores in zip(offsets, chunks):
+            i = int(np.argmax(scores['total_outcome']))
+            if scores['total_outcome'][i] > best_outcome:
+                best, best_outcome = offset + i, float(scores['total_outcome'][i])
+            if emit:
+                emit(chunk_lines(offset, scores, channels, names, include_channels))
+
+    return {
+        "status": "scenario_batch_completed",
+        "n_scenarios": len(spend),
+        "channels": channels,
+        "current_allocation": dict(zip(channels, current.tolist())),
+        "current_outcome": current_outcome,
+        "best_index": best,
+        "best_outcome": best_outcome,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def main(model_dir: str, scenarios_file: str):
+    """Score the scenarios in a JSON file, printing results as JSON lines"""
+    with open(scenarios_file) as f:
+        request = json.load(f)
+
+    def emit(line: Dict[str, Any]):
+        print(json.dumps(line), flush=True)
+
+    try:
+        return run_batch(model_dir, request, emit)
+    except (ValueError, OSError) as e:
+        return {"status": "error", "error": str(e)}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(json.dumps({
+            "error": "Usage: python scenario_batch.py <model_dir> <scenarios_file>"
+        }))
+        sys.exit(1)
+
+    print(json.dumps(main(sys.argv[1], sys.argv[2])))
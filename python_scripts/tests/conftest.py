@@ -0,0 +1,61 @@
+"""Shared fixtures: a small synthetic stored posterior and uploads on disk"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from posterior_store import open_store, save_posterior
+
+N_GEOS, N_TIMES, N_CHANNELS, N_DRAWS = 4, 30, 3, 40
+
+
+class _Posterior:
+    """Stand-in for a fitted Meridian model: just the posterior save_posterior reads"""
+
+    def __init__(self, posterior: xr.Dataset):
+        class InferenceData:
+            def groups(self):
+                return ['posterior']
+        self.inference_data = InferenceData()
+        self.inference_data.posterior = posterior
+
+
+def synthetic_arrays(rng, n_geos: int = N_GEOS, n_times: int = N_TIMES, n_channels: int = N_CHANNELS):
+    return {
+        'geos': [f'g{i}' for i in range(n_geos)],
+        'times': pd.date_range('2022-01-02', periods=n_times, freq='W').strftime('%Y-%m-%d').tolist(),
+        'channels': [f'c{i}' for i in range(n_channels)],
+        'controls': [],
+        'kpi': rng.gamma(5.0, 1000.0, (n_geos, n_times)),
+        'media': rng.gamma(2.0, 1000.0, (n_geos, n_times, n_channels)),
+        'media_spend': rng.gamma(2.0, 100.0, (n_geos, n_times, n_channels)),
+        'controls_values': None,
+        'population': rng.integers(10_000, 1_000_000, n_geos).astype(float),
+    }
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """Directory holding a stored posterior of a synthetic geo model"""
+    rng = np.random.default_rng(0)
+    arrays = synthetic_arrays(rng)
+    chains, draws = 2, N_DRAWS // 2
+    channel_dims = ('chain', 'draw', 'media_channel')
+    posterior = xr.Dataset(
+        {
+            'ec_m': (channel_dims, rng.uniform(0.5, 2.0, (chains, draws, N_CHANNELS))),
+            'slope_m': (channel_dims, rng.uniform(1.0, 3.0, (chains, draws, N_CHANNELS))),
+            'alpha_m': (channel_dims, rng.uniform(0.1, 0.7, (chains, draws, N_CHANNELS))),
+            'beta_gm': (('chain', 'draw', 'geo', 'media_channel'),
+                        rng.uniform(0.1, 0.5, (chains, draws, N_GEOS, N_CHANNELS))),
+        },
+        coords={'media_channel': arrays['channels'], 'geo': arrays['geos']},
+    )
+    save_posterior(_Posterior(posterior), arrays, str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def store(model_dir):
+    return open_store(model_dir)
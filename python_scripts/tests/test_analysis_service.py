@@ -0,0 +1,104 @@
+import json
+
+import numpy as np
+import pytest
+
+from analysis_service import curve_query, main, metrics_query, run_query, stored_curve_query
+from posterior_store import save_group
+from response_model import ResponseModel, curve_grid
+
+
+def test_group_metrics_sum_their_channels(store):
+    model = ResponseModel(store)
+    single = metrics_query(model, {'quantiles': [0.5]})['groups']
+    grouped = metrics_query(model, {'groups': {'paid': ['c0', 'c1'], 'other': ['c2']}, 'quantiles': [0.5]})['groups']
+
+    assert grouped['paid']['spend'] == pytest.approx(single['c0']['spend'] + single['c1']['spend'])
+    assert grouped['paid']['incremental_outcome']['mean'] == pytest.approx(
+        single['c0']['incremental_outcome']['mean'] + single['c1']['incremental_outcome']['mean'])
+    shares = [grouped[name]['contribution_share']['mean'] for name in grouped]
+    assert sum(shares) == pytest.approx(1.0)
+
+
+def test_window_metrics_cover_only_the_window(store):
+    model = ResponseModel(store)
+    times = model.times
+    result = metrics_query(model, {'start': times[10], 'end': times[19], 'channels': ['c1']})
+    assert result['n_periods'] == 10
+    assert list(result['groups']) == ['c1']
+
+    incremental = model.incremental([1], model.time_mask(times[10], times[19]))[:, 0, 0]
+    assert result['groups']['c1']['incremental_outcome']['mean'] == pytest.approx(incremental.mean())
+
+
+def test_curve_is_the_incremental_outcome_per_multiplier(store):
+    model = ResponseModel(store)
+    curve = curve_query(model, {'multipliers': [0.0, 1.0, 2.0], 'channels': ['c0']})['curves']['c0']
+    incremental = model.incremental([0], model.time_mask(), [0.0, 1.0, 2.0])[:, :, 0]
+
+    np.testing.assert_allclose(curve['mean'], incremental.mean(axis=0))
+    assert curve['spend'][1] == pytest.approx(model.window_spend([0], model.time_mask())[0])
+    assert curve['mean'][0] == 0.0
+
+
+def test_repeated_queries_hit_the_result_cache(model_dir):
+    query = {'type': 'metrics', 'draws': 20}
+    first = run_query(model_dir, query)
+    second = run_query(model_dir, dict(query))
+    assert not first['cached'] and second['cached']
+    assert second['groups'] == first['groups']
+    assert first['n_draws'] == 20
+
+
+def test_bad_queries_return_an_error(model_dir):
+    assert 'Unknown query type' in main(model_dir, json.dumps({'type': 'forecast'}))['error']
+    assert 'Unknown channels' in main(model_dir, json.dumps({'channels': ['tv']}))['error']
+    assert main(model_dir, json.dumps({'type': 'metrics'}))['n_draws'] > 0
+
+
+@pytest.fixture
+def curves_dir(model_dir, store):
+    """model_dir with the response-curve grid saved as training does"""
+    grid = curve_grid(ResponseModel(store), np.linspace(0.0, 3.0, 7), [0.05, 0.5, 0.95])
+    save_group(model_dir, 'curves', {
+        'multipliers': (grid['multipliers'], ('multiplier',)),
+        'spend': (grid['spend'], ('media_channel',)),
+        'quantiles': (grid['quantiles'], ('quantile',)),
+        'mean': (grid['mean'], ('multiplier', 'media_channel')),
+        'bands': (grid['bands'], ('quantile', 'multiplier', 'media_channel')),
+    })
+    return model_dir
+
+
+def test_stored_curves_match_computed_curves(curves_dir, store):
+    query = {'max_multiplier': 3.0, 'steps': 7, 'channels': ['c2', 'c0'], 'quantiles': [0.05, 0.95]}
+    stored = stored_curve_query(curves_dir, query)
+    computed = curve_query(ResponseModel(store), query)
+
+    assert stored['precomputed']
+    np.testing.assert_allclose(stored['multipliers'], computed['multipliers'], rtol=1e-6)
+    for channel in ('c2', 'c0'):
+        np.testing.assert_allclose(stored['curves'][channel]['spend'], computed['curves'][channel]['spend'],
+                                   rtol=1e-5)
+        np.testing.assert_allclose(stored['curves'][channel]['mean'], computed['curves'][channel]['mean'],
+                                   rtol=1e-5)
+        for q in ('0.05', '0.95'):
+            np.testing.assert_allclose(stored['curves'][channel]['quantiles'][q],
+                                       computed['curves'][channel]['quantiles'][q], rtol=1e-5)
+
+
+@pytest.mark.parametrize('query', [
+    {'steps': 8},
+    {'max_multiplier': 2.0},
+    {'quantiles': [0.25]},
+    {'start': '2022-03-01'},
+    {'draws': 10},
+    {'channels': ['tv']},
+])
+def test_queries_off_the_stored_grid_are_computed(curves_dir, query):
+    assert stored_curve_query(curves_dir, query) is None
+
+
+def test_response_curve_queries_read_the_stored_grid(curves_dir):
+    result = run_query(curves_dir, {'type': 'response_curve', 'steps': 7, 'max_multiplier': 3})
+    assert result['precomputed'] and len(result['curves']) == 3
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+import backtest
+from backtest import (fold_arrays, fold_chains, fold_windows, forecast_metrics, holdout_id, run_backtest,
+                      summarize_folds, warm_start_source)
+
+
+def test_folds_expand_and_end_at_the_last_period():
+    windows = fold_windows(104, folds=4, horizon=4, min_train_periods=26)
+    assert [w['train_periods'] for w in windows] == [88, 92, 96, 100]
+    assert [w['end'] for w in windows] == [92, 96, 100, 104]
+    for previous, current in zip(windows, windows[1:]):
+        assert current['train_periods'] == previous['end']
+
+
+def test_folds_need_enough_training_periods():
+    with pytest.raises(ValueError, match='24 periods'):
+        fold_windows(40, folds=4, horizon=4, min_train_periods=26)
+
+
+def test_fold_arrays_are_cut_at_the_window_end():
+    arrays = {'times': list(range(10)), 'kpi': np.ones((2, 10)), 'media': np.ones((2, 10, 3)),
+              'media_spend': np.ones((2, 10, 3)), 'controls_values': None, 'population': np.ones(2)}
+    fold = fold_arrays(arrays, 6)
+    assert fold['times'] == list(range(6))
+    assert fold['kpi'].shape == (2, 6) and fold['media'].shape == (2, 6, 3)
+    assert fold['controls_values'] is None
+    assert holdout_id(2, 6, 4).sum() == 4 and holdout_id(1, 6, 4).shape == (6,)
+
+
+def test_forecast_metrics_on_known_errors():
+    actual = np.full((2, 6), 100.0)
+    # Every draw forecasts 110 in the holdout periods and exactly 100 before them
+    draws = np.full((50, 2, 6), 100.0)
+    draws[:, :, 4:] = 110.0
+    metrics = forecast_metrics(actual, draws, train_periods=4)
+
+    assert metrics['holdout']['mape'] == pytest.approx(0.1)
+    assert metrics['holdout']['wape'] == pytest.approx(0.1)
+    assert metrics['holdout']['bias'] == pytest.approx(0.1)
+    assert metrics['holdout']['coverage'] == 0.0
+    assert metrics['holdout_total']['wape'] == pytest.approx(0.1)
+    assert metrics['in_sample']['mape'] == pytest.approx(0.0)
+
+
+def test_forecast_interval_covers_well_calibrated_draws():
+    rng = np.random.default_rng(0)
+    actual = rng.normal(100.0, 5.0, (20, 30))
+    draws = rng.normal(100.0, 5.0, (2000, 20, 30))
+    coverage = forecast_metrics(actual, draws, train_periods=10)['holdout']['coverage']
+    assert coverage == pytest.approx(0.9, abs=0.05)
+
+
+def test_summary_skips_failed_folds():
+    fold = {'success': True, **forecast_metrics(np.full((1, 4), 10.0), np.full((5, 1, 4), 12.0), 2)}
+    summary = summarize_folds([fold, {'success': False}])
+    assert summary['succeeded'] == 1
+    assert summary['holdout_wape'] == pytest.approx(0.2)
+
+
+def test_warm_start_only_from_fits_that_end_before_the_holdout(model_dir, store):
+    times = store.coords['time']
+    assert warm_start_source(model_dir, times[-1]) == (model_dir, None)
+    source, reason = warm_start_source(model_dir, times[-2])
+    assert source is None and times[-1] in reason
+    assert warm_start_source(model_dir + '/missing', times[-1]) == (None, 'no stored posterior')
+
+
+def test_fold_chains_are_contiguous():
+    assert fold_chains(4, 1) == [[0, 1, 2, 3]]
+    assert fold_chains(5, 2) == [[0, 1, 2], [3, 4]]
+    assert fold_chains(2, 8) == [[0], [1]]
+
+
+def test_each_fold_starts_from_the_previous_fold(monkeypatch):
+    class Dataset:
+        def prepared_arrays(self, config):
+            return {'times': [f'2024-{week:02d}' for week in range(1, 41)]}
+
+    calls = []
+
+    def run_fold(data_file, config, window, sampling_config, warm_start_dir, save_dir=None):
+        calls.append((window['fold'], warm_start_dir, save_dir))
+        if window['fold'] == 2:
+            raise RuntimeError('sampler failed')
+        return {**window, **forecast_metrics(np.ones((1, 8)), np.ones((5, 1, 8)), 4)}
+
+    monkeypatch.setattr(backtest, 'load_dataset', lambda data_file: Dataset())
+    monkeypatch.setattr(backtest, 'run_fold', run_fold)
+    config = {'backtest': {'folds': 4, 'horizon': 2, 'min_train_periods': 26, 'processes': 1,
+                           'warm_start_dir': 'earlier_fit'}}
+    report = run_backtest('data.csv', config)
+
+    assert [fold for fold, _, _ in calls] == [0, 1, 2, 3]
+    assert calls[0][1] == 'earlier_fit'
+    assert calls[1][1] == calls[0][2] and calls[2][1] == calls[1][2]
+    # Fold 2 failed, so fold 3 starts where fold 2 would have
+    assert calls[3][1] == calls[1][2] and calls[3][2] is None
+    assert [fold.get('warm_start_fold') for fold in report['folds']] == [None, 0, None, 1]
+    assert report['summary']['succeeded'] == 3
+    assert not os.path.exists(os.path.dirname(calls[0][2]))
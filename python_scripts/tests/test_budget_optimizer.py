@@ -0,0 +1,167 @@
+import numpy as np
+import pytest
+
+from budget_optimizer import (FRONTIER_MIN_SEGMENT_LEVELS, HillResponse, ShortfallObjective, StoreResponse,
+                              budget_frontier, frontier_levels, frontier_processes, grid_reference, optimize,
+                              optimize_from_results, project, spend_bounds)
+from response_model import ResponseModel
+
+
+def hill_response():
+    spend = np.array([1000.0, 2500.0, 400.0, 1800.0])
+    contribution = np.array([3000.0, 4000.0, 1500.0, 2000.0])
+    return HillResponse(spend, contribution, ec=np.array([0.8, 1.5, 0.6, 1.1]),
+                        slope=np.array([1.5, 2.0, 1.2, 2.5])), spend
+
+
+def test_project_lands_on_budget_within_bounds():
+    rng = np.random.default_rng(0)
+    lo, hi = np.zeros(6), np.full(6, 10.0)
+    x = project(rng.normal(size=6) * 20, 25.0, lo, hi)
+    assert x.sum() == pytest.approx(25.0)
+    assert np.all(x >= lo) and np.all(x <= hi)
+
+
+@pytest.mark.parametrize('budget_scale', [0.8, 1.0, 1.3])
+def test_optimize_matches_grid_reference(budget_scale):
+    response, spend = hill_response()
+    channels = ['a', 'b', 'c', 'd']
+    budget = spend.sum() * budget_scale
+    lo, hi = spend * 0.5, spend * 1.6
+
+    result = optimize(response, channels, spend, budget, lo, hi)
+    _, reference = grid_reference(response, budget, lo, hi, points=61)
+
+    allocation = np.array([result['allocation'][c] for c in channels])
+    assert allocation.sum() == pytest.approx(budget)
+    assert np.all(allocation >= lo - 1e-6) and np.all(allocation <= hi + 1e-6)
+    # The grid only samples the optimum, so the solver must do at least as well
+    assert result['optimal_outcome'] >= reference - 1e-6 * abs(reference)
+    assert result['converged']
+
+
+def test_locked_channel_keeps_its_spend(store):
+    response = StoreResponse(ResponseModel(store))
+    channels = response.channels
+    lo, hi = response.spend * 0.7, response.spend * 1.3
+    lo[1] = hi[1] = response.spend[1]
+
+    result = optimize(response, channels, response.spend, response.spend.sum(), lo, hi)
+    _, reference = grid_reference(response, response.spend.sum(), lo, hi, points=81)
+
+    assert result['allocation'][channels[1]] == pytest.approx(response.spend[1])
+    assert result['optimal_outcome'] >= reference - 1e-6 * abs(reference)
+
+
+def test_store_response_gradient_matches_finite_differences(store):
+    response = StoreResponse(ResponseModel(store))
+    x = response.spend * np.array([0.6, 1.0, 1.7])
+    _, grad = response.value_and_grad(x)
+    for m in range(len(x)):
+        step = np.zeros_like(x)
+        step[m] = 1e-4 * x[m]
+        upper = response.value_and_grad(x + step)[0].sum()
+        lower = response.value_and_grad(x - step)[0].sum()
+        numeric = (upper - lower) / (2 * step[m])
+        assert grad[m] == pytest.approx(numeric, rel=1e-5)
+
+
+def test_spend_bounds_apply_overrides_and_locks():
+    current = np.array([100.0, 200.0, 300.0])
+    config = {'spend_constraint_lower': 0.5, 'spend_constraint_upper': 0.2,
+              'channel_constraints': {'b': {'max': 210.0}}, 'locked_channels': ['c']}
+    lo, hi = spend_bounds(['a', 'b', 'c'], current, config)
+    np.testing.assert_allclose(lo, [50.0, 100.0, 300.0])
+    np.testing.assert_allclose(hi, [120.0, 210.0, 300.0])
+    with pytest.raises(ValueError, match='Unknown locked channel'):
+        spend_bounds(['a'], current[:1], {'locked_channels': ['z']})
+    with pytest.raises(ValueError, match='exceeds maximum'):
+        spend_bounds(['a'], current[:1], {'channel_constraints': {'a': {'min': 500.0}}})
+
+
+def test_infeasible_budget_is_rejected():
+    response, spend = hill_response()
+    with pytest.raises(ValueError, match='outside the feasible range'):
+        optimize(response, list('abcd'), spend, spend.sum() * 3, spend * 0.9, spend * 1.1)
+
+
+def hill_results():
+    return {
+        'channel_analysis': {'tv': {'total_spend': 1000.0, 'contribution': 3000.0},
+                             'search': {'total_spend': 500.0, 'contribution': 2500.0}},
+        'response_curves': {'tv': {'saturation': {'ec': 1.2, 'slope': 2.0}},
+                            'search': {'saturation': {'ec': 0.8, 'slope': 1.5}}},
+    }
+
+
+def test_results_without_a_store_use_the_hill_curves():
+    result = optimize_from_results(hill_results(), {'total_budget': 1500.0})
+    assert result['response'] == 'hill_curves'
+    assert sum(result['allocation'].values()) == pytest.approx(1500.0)
+    assert result['current_outcome'] == pytest.approx(5500.0)
+    assert result['optimal_outcome'] >= result['current_outcome']
+
+
+def test_posterior_mode_reports_the_outcome_distribution(model_dir, store):
+    result = optimize_from_results({}, {'mode': 'posterior', 'draws': 20}, model_dir)
+    distribution = result['distribution']
+
+    assert result['mode'] == 'posterior' and distribution['n_draws'] == 20
+    assert result['optimal_outcome'] == pytest.approx(distribution['outcome']['mean'])
+    quantiles = list(distribution['outcome']['quantiles'].values())
+    assert quantiles == sorted(quantiles)
+    assert 0.0 <= distribution['lift']['prob_positive'] <= 1.0
+
+
+def test_per_draw_response_averages_to_the_draw_mean(store):
+    model = ResponseModel(store)
+    per_draw = StoreResponse(model, per_draw=True)
+    x = per_draw.spend * 1.2
+    values, _ = per_draw.draw_values_and_grads(x)
+
+    assert values.shape == (model.n_draws, len(model.channels))
+    np.testing.assert_allclose(per_draw.value_and_grad(x)[0], values.mean(axis=0))
+
+
+def test_shortfall_objective_averages_the_worst_draws(store):
+    response = StoreResponse(ResponseModel(store), per_draw=True)
+    objective = ShortfallObjective(response, 0.25)
+    values, _ = response.draw_values_and_grads(response.spend)
+    worst = np.sort(values.sum(axis=1))[:objective.n_tail]
+
+    assert objective.n_tail == 10
+    assert objective.value_and_grad(response.spend)[0].sum() == pytest.approx(worst.mean())
+    with pytest.raises(ValueError, match='between 0 and 1'):
+        ShortfallObjective(response, 1.0)
+
+
+def test_risk_quantile_needs_posterior_mode(model_dir):
+    with pytest.raises(ValueError, match='posterior mode'):
+        optimize_from_results({}, {'risk_quantile': 0.1}, model_dir)
+
+
+def test_frontier_runs_in_one_process_unless_it_is_long(monkeypatch):
+    monkeypatch.delenv('MERIDIAN_OPTIMIZER_PROCESSES', raising=False)
+    assert len(frontier_levels({})) == 16
+    assert frontier_processes({}, 16) == 1
+    assert frontier_processes({'processes': 4}, 16) == 4
+    assert frontier_processes({'processes': 4}, 2) == 2
+    monkeypatch.setattr('os.sched_getaffinity', lambda pid: set(range(64)), raising=False)
+    assert frontier_processes({}, 4 * FRONTIER_MIN_SEGMENT_LEVELS) == 4
+
+
+def test_frontier_matches_single_budget_optimizations(monkeypatch):
+    monkeypatch.delenv('MERIDIAN_OPTIMIZER_PROCESSES', raising=False)
+    config = {'spend_constraint_upper': 0.5}
+    frontier = budget_frontier(hill_results(), config)
+    assert frontier['processes'] == 1 and len(frontier['points']) == 16
+
+    feasible = [point for point in frontier['points'] if point['feasible']]
+    # Each channel may grow by at most 50%, so budgets above 1.5x current spend cannot be met
+    assert [point['level'] for point in feasible] == frontier['levels'][:11]
+    outcomes = [point['outcome'] for point in feasible]
+    assert outcomes == sorted(outcomes)
+    for point in feasible[1:]:
+        single = optimize_from_results(hill_results(), {**config, 'spend_constraint_lower': 1.0,
+                                                        'total_budget': point['budget']})
+        assert point['outcome'] == pytest.approx(single['optimal_outcome'], rel=1e-6)
@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+import checkpoints
+from checkpoints import SamplingCheckpoint, checkpoint_draws
+
+
+class Segment:
+    """Stand-in for a segment's InferenceData, written as JSON"""
+
+    def __init__(self, draws):
+        self.draws = draws
+
+    def to_netcdf(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.draws, f)
+
+
+@pytest.fixture(autouse=True)
+def json_segments(monkeypatch):
+    def load(path):
+        with open(path) as f:
+            return Segment(json.load(f))
+    monkeypatch.setattr(checkpoints, 'load_inference_data', load)
+
+
+def test_checkpointing_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('MERIDIAN_CHECKPOINT_DRAWS', raising=False)
+    assert checkpoint_draws({}) == 0
+    assert checkpoint_draws({'sampling': {'checkpoint_draws': 250}}) == 250
+
+
+def test_resume_returns_saved_segments_in_order(tmp_path):
+    checkpoint = SamplingCheckpoint(str(tmp_path), 'run-1')
+    checkpoint.save(0, Segment([1, 2]), 2, 0.5)
+    checkpoint.save(1, Segment([3, 4]), 2, 0.25)
+
+    segments, step_size = SamplingCheckpoint(str(tmp_path), 'run-1').load()
+    assert [s.draws for s in segments] == [[1, 2], [3, 4]]
+    assert step_size == 0.25
+
+
+def test_resaving_a_segment_drops_later_ones(tmp_path):
+    checkpoint = SamplingCheckpoint(str(tmp_path), 'run-1')
+    for i in range(3):
+        checkpoint.save(i, Segment([i]), 1, None)
+    checkpoint.save(1, Segment([9]), 1, None)
+
+    segments, _ = checkpoint.load()
+    assert [s.draws for s in segments] == [[0], [9]]
+
+
+def test_fingerprint_mismatch_discards_checkpoint(tmp_path):
+    SamplingCheckpoint(str(tmp_path), 'run-1').save(0, Segment([1]), 1, 0.5)
+
+    checkpoint = SamplingCheckpoint(str(tmp_path), 'run-2')
+    assert checkpoint.load() == ([], None)
+    assert not os.path.exists(checkpoint.directory)
+
+
+def test_warm_start_flag_survives_a_restart(tmp_path):
+    SamplingCheckpoint(str(tmp_path), 'run-1').save(0, Segment([1]), 1, None, warm_started=True)
+    assert SamplingCheckpoint(str(tmp_path), 'run-1').warm_started()
+    assert not SamplingCheckpoint(str(tmp_path), 'run-2').warm_started()
+
+    SamplingCheckpoint(str(tmp_path), 'run-1').save(0, Segment([1]), 1, None)
+    assert not SamplingCheckpoint(str(tmp_path), 'run-1').warm_started()
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_data_prep import legacy_prepare, synthetic_frame
+from data_prep import parse_dates, prepare_arrays
+
+CHANNELS = ['ch0_spend', 'ch1_spend', 'ch2_spend']
+CONTROLS = ['control_0', 'control_1']
+
+
+def config(**extra):
+    return {'date_column': 'date', 'target_column': 'revenue', 'channel_columns': CHANNELS,
+            'control_columns': CONTROLS, **extra}
+
+
+def test_national_arrays_match_legacy_loop():
+    df = synthetic_frame(1, 52, len(CHANNELS), len(CONTROLS))
+    arrays = prepare_arrays(df, config())
+    legacy = legacy_prepare(df, config())
+
+    assert arrays['times'] == legacy['times']
+    for name in ('kpi', 'media', 'media_spend', 'controls_values'):
+        np.testing.assert_array_equal(arrays[name], legacy[name])
+
+
+def test_float32_arrays_keep_the_values():
+    df = synthetic_frame(1, 20, len(CHANNELS), len(CONTROLS))
+    arrays = prepare_arrays(df, config(), dtype=np.float32)
+    assert arrays['kpi'].dtype == np.float32
+    np.testing.assert_allclose(arrays['kpi'][0], df['revenue'].to_numpy(), rtol=1e-6)
+
+
+def test_missing_columns_are_reported():
+    df = synthetic_frame(1, 10, len(CHANNELS), len(CONTROLS)).drop(columns=['revenue'])
+    with pytest.raises(ValueError, match='revenue'):
+        prepare_arrays(df, config())
+
+
+def test_geo_pivot_matches_pandas_pivot():
+    df = synthetic_frame(5, 20, len(CHANNELS), len(CONTROLS)).sample(frac=1.0, random_state=3)
+    arrays = prepare_arrays(df, config(geo_column='geo'))
+
+    dates = pd.to_datetime(df['date'], dayfirst=True)
+    frame = df.assign(date=dates)
+
+    def pivot(column):
+        return frame.pivot(index='geo', columns='date', values=column).to_numpy()
+
+    assert arrays['geos'] == sorted(df['geo'].unique())
+    assert arrays['times'] == sorted(dates.dt.strftime('%Y-%m-%d').unique())
+    np.testing.assert_array_equal(arrays['kpi'], pivot('revenue'))
+    for i, channel in enumerate(CHANNELS):
+        np.testing.assert_array_equal(arrays['media_spend'][:, :, i], pivot(channel))
+        np.testing.assert_array_equal(arrays['media'][:, :, i], pivot(channel.replace('_spend', '_impressions')))
+    for i, control in enumerate(CONTROLS):
+        np.testing.assert_array_equal(arrays['controls_values'][:, :, i], pivot(control))
+    np.testing.assert_allclose(arrays['population'], pivot('population').mean(axis=1))
+
+
+def test_geo_pivot_rejects_duplicated_rows():
+    df = synthetic_frame(3, 10, len(CHANNELS), len(CONTROLS))
+    df = pd.concat([df, df.iloc[[4]]], ignore_index=True)
+    with pytest.raises(ValueError, match='1 duplicated'):
+        prepare_arrays(df, config(geo_column='geo'))
+
+
+def test_unparseable_dates_become_sequential_weeks():
+    values = pd.Series(['week a', 'week b', 'week a', 'week c', 'week b'])
+    dates = parse_dates(values)
+    assert dates.dtype == np.dtype('datetime64[ns]')
+    expected = pd.date_range('2023-01-01', periods=3, freq='W').to_numpy()
+    np.testing.assert_array_equal(dates, expected[[0, 1, 0, 2, 1]])
+
+
+def test_missing_channel_columns_are_zero_filled(capsys):
+    df = synthetic_frame(1, 10, len(CHANNELS), len(CONTROLS)).drop(columns=[CHANNELS[1]])
+    arrays = prepare_arrays(df, config())
+    assert CHANNELS[1] in capsys.readouterr().out
+    np.testing.assert_array_equal(arrays['media_spend'][0, :, 1], 0.0)
+    np.testing.assert_array_equal(arrays['media_spend'][0, :, 0], df[CHANNELS[0]].to_numpy())
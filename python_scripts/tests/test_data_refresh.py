@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_prep import prepare_arrays
+from data_refresh import prepare_refresh, time_extension
+from dataset_cache import load_dataset
+
+CONFIG = {'date_column': 'date', 'target_column': 'revenue', 'channel_columns': ['tv_spend', 'search_spend'],
+          'geo_column': 'geo', 'control_columns': ['price']}
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2022-01-02', periods=40, freq='W')
+    df = pd.DataFrame([
+        {'date': d.strftime('%d/%m/%Y'), 'geo': g, 'revenue': rng.gamma(5.0), 'tv_spend': rng.gamma(2.0),
+         'search_spend': rng.gamma(2.0), 'population': 1000 + rng.integers(10), 'price': rng.normal()}
+        for g in ('a', 'b', 'c') for d in dates
+    ])
+    base = df[pd.to_datetime(df['date'], dayfirst=True) <= dates[35]]
+    root = tmp_path / 'cache'
+
+    def upload(name, frame):
+        path = tmp_path / f'{name}.csv'
+        frame.to_csv(path, index=False)
+        return load_dataset(str(path), str(root))
+
+    return df, upload('base', base), upload
+
+
+def test_appended_periods_are_detected(uploads):
+    df, base, upload = uploads
+    new = upload('new', df.sample(frac=1.0, random_state=1))
+
+    appended = time_extension(base, new, CONFIG)
+    assert appended is not None
+    assert appended.sum() == 3 * 4
+
+
+def test_changed_history_is_not_an_extension(uploads):
+    df, base, upload = uploads
+    changed = df.copy()
+    changed.loc[3, 'revenue'] += 1.0
+    assert time_extension(base, upload('changed', changed), CONFIG) is None
+
+
+def test_no_new_periods_is_not_an_extension(uploads):
+    df, base, upload = uploads
+    assert time_extension(base, upload('same', base.frame[df.columns]), CONFIG) is None
+
+
+def test_incremental_arrays_equal_a_full_prepare(uploads):
+    df, base, upload = uploads
+    new = upload('new', df.sample(frac=1.0, random_state=1))
+
+    lineage = prepare_refresh(base, new, CONFIG)
+    assert lineage['incremental']
+
+    incremental = new.prepared_arrays(CONFIG)
+    full = prepare_arrays(new.frame, CONFIG, dates=new.dates('date'))
+    for name, value in full.items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_allclose(np.asarray(incremental[name], dtype=float), value.astype(float))
+        else:
+            assert list(incremental[name]) == list(value)
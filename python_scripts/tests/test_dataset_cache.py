@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from benchmark_data_prep import synthetic_frame
+from dataset_cache import file_hash, load_dataset
+
+
+def upload(tmp_path, name, df):
+    path = tmp_path / name
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_columns_round_trip_through_the_cache(tmp_path):
+    df = synthetic_frame(3, 10, 2, 1)
+    dataset = load_dataset(upload(tmp_path, 'upload.csv', df), str(tmp_path / 'cache'))
+
+    expected = pd.read_csv(tmp_path / 'upload.csv')
+    assert dataset.columns == list(expected.columns)
+    assert dataset.manifest['n_rows'] == len(expected)
+    for column in expected.columns:
+        np.testing.assert_array_equal(np.asarray(dataset.frame[column]), expected[column].to_numpy())
+
+
+def test_identical_content_converts_once(tmp_path, capsys):
+    df = synthetic_frame(2, 6, 2, 1)
+    first = load_dataset(upload(tmp_path, 'a.csv', df), str(tmp_path / 'cache'))
+    second = load_dataset(upload(tmp_path, 'b.csv', df), str(tmp_path / 'cache'))
+
+    assert first.key == second.key == file_hash(str(tmp_path / 'a.csv'))
+    statuses = capsys.readouterr().out.splitlines()
+    assert '"dataset_cached"' in statuses[0] and '"dataset_cache_hit"' in statuses[1]
+
+
+def test_dates_are_parsed_once_day_first(tmp_path):
+    df = synthetic_frame(1, 5, 1, 0)
+    dataset = load_dataset(upload(tmp_path, 'upload.csv', df), str(tmp_path / 'cache'))
+    dates = dataset.dates('date')
+
+    expected = pd.to_datetime(df['date'], dayfirst=True).to_numpy()
+    np.testing.assert_array_equal(dates, expected)
+    np.testing.assert_array_equal(load_dataset(str(tmp_path / 'upload.csv'), str(tmp_path / 'cache')).dates('date'),
+                                  expected)
+
+
+def test_blob_names_are_taken_as_their_hash(tmp_path):
+    blob = tmp_path / ('ab' * 32 + '.csv')
+    blob.write_text('a\n1\n')
+    assert file_hash(str(blob)) == 'ab' * 32
+
+
+def test_prepared_arrays_are_built_once_per_config(tmp_path, capsys):
+    df = synthetic_frame(3, 8, 2, 1)
+    config = {'date_column': 'date', 'target_column': 'revenue', 'geo_column': 'geo',
+              'channel_columns': ['ch0_spend', 'ch1_spend'], 'control_columns': ['control_0']}
+    path = upload(tmp_path, 'upload.csv', df)
+    built = load_dataset(path, str(tmp_path / 'cache')).prepared_arrays(config)
+    assert '"prepared_arrays_cache_hit"' not in capsys.readouterr().out
+
+    dataset = load_dataset(path, str(tmp_path / 'cache'))
+    cached = dataset.prepared_arrays(config)
+    assert '"prepared_arrays_cache_hit"' in capsys.readouterr().out
+    assert cached['geos'] == built['geos'] and cached['times'] == built['times']
+    for name in ('kpi', 'media', 'media_spend', 'controls_values', 'population'):
+        np.testing.assert_array_equal(cached[name], built[name])
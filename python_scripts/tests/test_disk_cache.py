@@ -0,0 +1,57 @@
+import os
+import time
+
+from disk_cache import DiskCache, fingerprint
+
+
+def write(size):
+    def populate(path):
+        with open(os.path.join(path, 'data'), 'wb') as f:
+            f.write(b'x' * size)
+    return populate
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({'a': 1, 'b': [1, 2]}) == fingerprint({'b': [1, 2], 'a': 1})
+    assert fingerprint({'a': 1}) != fingerprint({'a': 2})
+
+
+def test_evicts_least_recently_used_over_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=2500)
+    for key in ('a', 'b'):
+        cache.put(key, write(1000))
+        time.sleep(0.01)
+    assert cache.get('a') is not None
+    time.sleep(0.01)
+    cache.put('c', write(1000))
+
+    assert sorted(cache.keys()) == ['a', 'c']
+
+
+def test_evicts_over_entry_count(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, write(10))
+        time.sleep(0.01)
+    assert sorted(cache.keys()) == ['b', 'c']
+
+
+def test_failed_populate_leaves_no_entry(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+
+    def fail(path):
+        raise OSError('disk full')
+
+    try:
+        cache.put('a', fail)
+    except OSError:
+        pass
+    assert cache.get('a') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_keys_filters_by_prefix(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+    for key in ('m1-x', 'm1-y', 'm2-x'):
+        cache.put(key, write(1))
+    assert sorted(cache.keys('m1-')) == ['m1-x', 'm1-y']
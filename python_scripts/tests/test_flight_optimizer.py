@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from flight_optimizer import FlightResponse, optimize_flighting, project_plan
+from response_model import ResponseModel
+
+WEEKS = 8
+
+
+@pytest.mark.parametrize('hill_before_adstock', [False, True])
+def test_gradient_matches_finite_differences(store, hill_before_adstock):
+    model = ResponseModel(store)
+    model.hill_before_adstock = hill_before_adstock
+    response = FlightResponse(model, WEEKS)
+    rng = np.random.default_rng(1)
+    x = np.tile(response.weekly_spend, (WEEKS, 1)) * rng.uniform(0.2, 2.0, (WEEKS, len(response.channels)))
+
+    _, grad = response.value_and_grad(x)
+    for week, channel in [(0, 0), (3, 1), (WEEKS - 1, 2)]:
+        step = np.zeros_like(x)
+        step[week, channel] = 1e-4 * x[week, channel]
+        upper = response.value_and_grad(x + step)[0].sum()
+        lower = response.value_and_grad(x - step)[0].sum()
+        numeric = (upper - lower) / (2 * step[week, channel])
+        assert grad[week, channel] == pytest.approx(numeric, rel=1e-5)
+
+
+def test_project_plan_respects_budget_and_caps():
+    rng = np.random.default_rng(2)
+    caps = np.full(WEEKS, 5.0)
+    plan = project_plan(rng.normal(size=(WEEKS, 3)) * 100, 30.0, np.zeros((WEEKS, 3)),
+                        np.full((WEEKS, 3), 10.0), caps)
+    assert plan.sum() == pytest.approx(30.0)
+    assert np.all(plan.sum(axis=1) <= caps + 1e-9)
+    assert plan.min() >= 0.0
+
+
+def test_optimized_plan_beats_flat_plan(store):
+    result = optimize_flighting(ResponseModel(store), {'weeks': WEEKS})
+    assert sum(result['weekly_totals']) == pytest.approx(result['total_budget'])
+    assert result['lift_over_flat'] >= -1e-6 * abs(result['outcome'])
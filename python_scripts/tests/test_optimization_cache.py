@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from disk_cache import DiskCache
+from optimization_cache import (allocation_meta, cache_key, cached_results, invalidate_stale, model_key,
+                                nearest_allocation, store_results)
+
+CHANNELS = ['a', 'b']
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / 'cache'), max_bytes=10**9)
+
+
+def solve(cache, model, model_dir, budget, lo, hi, allocation, result_type='allocation'):
+    """Store a result as optimize_budget does, returning its key"""
+    results = {
+        'type': result_type,
+        'total_budget': budget,
+        'bounds': {c: {'min': l, 'max': h} for c, l, h in zip(CHANNELS, lo, hi)},
+        'optimal_allocation': dict(zip(CHANNELS, allocation)),
+    }
+    key = cache_key(model, {'total_budget': budget, 'lo': lo, 'hi': hi, 'type': result_type}, model_dir)
+    store_results(cache, key, results, allocation_meta(model_dir, results))
+    return key
+
+
+def test_keys_ignore_unused_and_empty_settings():
+    model = model_key({'channels': CHANNELS}, None)
+    assert cache_key(model, {'total_budget': 100, 'channel_constraints': {}}) == \
+        cache_key(model, {'bypass_cache': False, 'total_budget': 100, 'model_dir': '/x'})
+    assert cache_key(model, {'total_budget': 100}) != cache_key(model, {'total_budget': 101})
+
+
+def test_retraining_changes_the_model_key(model_dir):
+    before = model_key({'r': 1}, model_dir)
+    with open(f'{model_dir}/posterior/manifest.json', 'a') as f:
+        f.write(' ')
+    assert model_key({'r': 1}, model_dir) != before
+    assert model_key({'r': 1}, None) != before
+
+
+def test_results_round_trip(cache, tmp_path):
+    key = solve(cache, 'm' * 32, str(tmp_path), 100.0, [10.0, 10.0], [90.0, 90.0], [40.0, 60.0])
+    assert cached_results(cache, key)['optimal_allocation'] == {'a': 40.0, 'b': 60.0}
+    assert cached_results(cache, key + 'x') is None
+
+
+def test_invalidate_stale_drops_only_earlier_fits_of_the_same_directory(cache, tmp_path):
+    first, other = str(tmp_path / 'model_1'), str(tmp_path / 'model_2')
+    stale = solve(cache, 'old' * 10, first, 100.0, [0.0, 0.0], [100.0, 100.0], [50.0, 50.0])
+    kept = solve(cache, 'new' * 10, first, 100.0, [0.0, 0.0], [100.0, 100.0], [30.0, 70.0])
+    unrelated = solve(cache, 'old' * 10, other, 100.0, [0.0, 0.0], [100.0, 100.0], [50.0, 50.0])
+
+    assert invalidate_stale(cache, 'new' * 10, first) == 1
+    assert sorted(cache.keys()) == sorted([kept, unrelated])
+    assert stale not in cache.keys()
+    assert invalidate_stale(cache, 'new' * 10, None) == 0
+
+
+def test_nearest_allocation_picks_the_closest_constraints(cache, tmp_path):
+    model, model_dir = 'm' * 32, str(tmp_path)
+    solve(cache, model, model_dir, 100.0, [10.0, 10.0], [90.0, 90.0], [40.0, 60.0])
+    solve(cache, model, model_dir, 200.0, [10.0, 10.0], [190.0, 190.0], [80.0, 120.0])
+    solve(cache, model, model_dir, 105.0, [10.0, 10.0], [90.0, 90.0], [1.0, 1.0], result_type='frontier')
+    solve(cache, 'x' * 32, model_dir, 110.0, [10.0, 10.0], [90.0, 90.0], [2.0, 2.0])
+
+    nearest = nearest_allocation(cache, model, CHANNELS, 110.0, np.array([10.0, 10.0]), np.array([90.0, 90.0]),
+                                 model_dir)
+    assert nearest == {'a': 40.0, 'b': 60.0}
+    assert nearest_allocation(cache, model, ['a', 'c'], 110.0, np.zeros(2), np.ones(2), model_dir) is None
+    assert nearest_allocation(cache, model, CHANNELS, 110.0, np.zeros(2), np.ones(2), str(tmp_path / 'y')) is None
@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from posterior_metrics import MROI_INCREMENT, PosteriorMetrics, flatten_draws, summarize_draws
+
+N_CHAINS, N_DRAWS, N_GEOS, N_TIMES = 2, 25, 3, 8
+CHANNELS = ['tv', 'search', 'radio']
+
+
+class Analyzer:
+    """Incremental and expected outcome of a linear model, counting the passes made"""
+
+    def __init__(self, incremental, expected):
+        self._incremental = incremental
+        self._expected = expected
+        self.calls = []
+
+    def incremental_outcome(self, scaling_factor0=None, scaling_factor1=None):
+        self.calls.append('incremental_outcome')
+        if scaling_factor1 is None:
+            return self._incremental
+        # Meridian appends an all-channels column, which the metrics drop
+        return self._incremental * (scaling_factor1 - scaling_factor0)
+
+    def expected_outcome(self, aggregate_geos=True, aggregate_times=True):
+        self.calls.append('expected_outcome')
+        return self._expected
+
+
+class Model:
+    def __init__(self, posterior):
+        class InferenceData:
+            pass
+        self.inference_data = InferenceData()
+        self.inference_data.posterior = posterior
+
+
+@pytest.fixture
+def metrics():
+    rng = np.random.default_rng(0)
+    incremental = rng.gamma(3.0, 100.0, (N_CHAINS, N_DRAWS, len(CHANNELS) + 1))
+    kpi = rng.gamma(5.0, 100.0, (N_GEOS, N_TIMES))
+    expected = np.broadcast_to(kpi, (N_CHAINS, N_DRAWS, N_GEOS, N_TIMES))
+    spend = rng.gamma(2.0, 10.0, (N_GEOS, N_TIMES, len(CHANNELS)))
+    spend[..., 2] = 0.0
+    posterior = xr.Dataset({
+        'ec_m': (('chain', 'draw', 'media_channel'), rng.uniform(size=(N_CHAINS, N_DRAWS, len(CHANNELS)))),
+        'alpha_m': (('chain', 'draw', 'media_channel'), rng.uniform(size=(N_CHAINS, N_DRAWS, len(CHANNELS)))),
+    })
+    arrays = {'channels': CHANNELS, 'kpi': kpi, 'media_spend': spend}
+    return PosteriorMetrics(Analyzer(incremental, expected), Model(posterior), arrays)
+
+
+def test_roi_and_contribution_derive_from_one_pass(metrics):
+    incremental = flatten_draws(metrics.analyzer._incremental)[:, :len(CHANNELS)]
+    spend = metrics.arrays['media_spend'].sum(axis=(0, 1))
+
+    np.testing.assert_allclose(metrics.roi[:, :2], incremental[:, :2] / spend[:2])
+    assert np.all(np.isnan(metrics.roi[:, 2]))
+    np.testing.assert_allclose(metrics.contribution_share.sum(axis=1), 1.0)
+    assert metrics.analyzer.calls == ['incremental_outcome']
+
+
+def test_mroi_is_cached_after_one_scaled_pass(metrics):
+    incremental = flatten_draws(metrics.analyzer._incremental)[:, :2]
+    spend = metrics.arrays['media_spend'].sum(axis=(0, 1))[:2]
+
+    np.testing.assert_allclose(metrics.mroi[:, :2], incremental * MROI_INCREMENT / (spend * MROI_INCREMENT))
+    metrics.mroi
+    assert metrics.analyzer.calls == ['incremental_outcome']
+
+
+def test_fit_metrics_of_an_exact_fit(metrics):
+    fit = metrics.fit_metrics()
+    assert fit['r_squared'] == pytest.approx(1.0)
+    assert fit['mape'] == pytest.approx(0.0, abs=1e-12)
+    assert fit['wmape'] == pytest.approx(0.0, abs=1e-12)
+    assert metrics.analyzer.calls == ['expected_outcome']
+
+
+def test_channel_parameters_pick_the_decay_variable(metrics):
+    parameters = metrics.channel_parameters()
+    assert parameters['ec'].shape == (N_CHAINS * N_DRAWS, len(CHANNELS))
+    assert parameters['slope'] is None
+    np.testing.assert_array_equal(parameters['decay'], flatten_draws(metrics.posterior['alpha_m'].values))
+
+
+def test_equal_tailed_intervals_match_numpy_quantiles():
+    rng = np.random.default_rng(1)
+    draws = {'roi': rng.normal(1.0, 0.5, (400, 3)), 'share': rng.dirichlet(np.ones(2), 400)}
+    summary = summarize_draws(draws, mass=0.9)
+
+    for name, values in draws.items():
+        lower, median, upper = np.quantile(values, [0.05, 0.5, 0.95], axis=0)
+        np.testing.assert_allclose(summary[name]['lower'], lower)
+        np.testing.assert_allclose(summary[name]['median'], median)
+        np.testing.assert_allclose(summary[name]['upper'], upper)
+        np.testing.assert_allclose(summary[name]['mean'], values.mean(axis=0))
+        np.testing.assert_allclose(summary[name]['prob_positive'], (values > 0).mean(axis=0))
+
+
+def test_hdi_is_the_narrowest_interval_holding_the_mass():
+    rng = np.random.default_rng(2)
+    # Skewed draws, where the HDI and the equal-tailed interval differ
+    values = rng.gamma(1.5, 1.0, (500, 4))
+    summary = summarize_draws({'roi': values}, mass=0.8, interval='hdi')['roi']
+
+    n_in = int(np.ceil(0.8 * len(values)))
+    for column in range(values.shape[1]):
+        ordered = np.sort(values[:, column])
+        widths = [ordered[i + n_in - 1] - ordered[i] for i in range(len(ordered) - n_in + 1)]
+        best = int(np.argmin(widths))
+        assert summary['lower'][column] == ordered[best]
+        assert summary['upper'][column] == ordered[best + n_in - 1]
+    eti = summarize_draws({'roi': values}, mass=0.8)['roi']
+    assert np.all(summary['upper'] - summary['lower'] < eti['upper'] - eti['lower'])
+
+
+def test_hdi_matches_arviz():
+    az = pytest.importorskip('arviz')
+    rng = np.random.default_rng(3)
+    # 999 draws, so both sides put ceil(0.94 * 999) = floor(0.94 * 999) + 1 draws inside
+    values = rng.lognormal(0.0, 0.6, (999, 3))
+    summary = summarize_draws({'roi': values}, mass=0.94, interval='hdi')['roi']
+    for column in range(values.shape[1]):
+        lower, upper = az.hdi(values[:, column], hdi_prob=0.94)
+        assert summary['lower'][column] == pytest.approx(lower)
+        assert summary['upper'][column] == pytest.approx(upper)
+
+
+def test_nan_columns_summarize_to_zero():
+    values = np.column_stack([np.full(50, np.nan), np.linspace(1.0, 2.0, 50)])
+    summary = summarize_draws({'roi': values})['roi']
+    assert summary['mean'][0] == 0.0 and summary['upper'][0] == 0.0
+    assert summary['mean'][1] == pytest.approx(1.5)
+
+
+def test_summaries_cover_every_channel(metrics):
+    summaries = metrics.summaries()
+    assert set(summaries) == {'roi', 'mroi', 'contribution', 'contribution_share'}
+    assert summaries['roi']['mean'].shape == (len(CHANNELS),)
+    # The zero-spend channel has no ROI
+    assert summaries['roi']['mean'][2] == 0.0
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+from conftest import N_CHANNELS, N_DRAWS, N_GEOS, N_TIMES, _Posterior, synthetic_arrays
+from posterior_store import STORE_DIR, copy_store, open_store, save_group, save_posterior, store_size
+
+
+def test_round_trip_keeps_values_dims_and_coords(model_dir):
+    store = open_store(model_dir)
+
+    assert store.manifest['n_chains'] * store.manifest['n_draws'] == N_DRAWS
+    assert store.channels == [f'c{i}' for i in range(N_CHANNELS)]
+    assert len(store.coords['time']) == N_TIMES
+    assert store.dims('beta_gm') == ['chain', 'draw', 'geo', 'media_channel']
+    assert store.draws('beta_gm').shape == (N_DRAWS, N_GEOS, N_CHANNELS)
+    assert store.get('ec_m').dtype == np.float32
+    assert isinstance(store.get('ec_m'), np.memmap)
+    assert store.inputs('media').shape == (N_GEOS, N_TIMES, N_CHANNELS)
+    assert store.inputs('controls_values') is None
+
+    dataset = store.to_dataset()
+    assert list(dataset['ec_m'].coords['media_channel'].values) == store.channels
+    np.testing.assert_array_equal(dataset['slope_m'].values, store.get('slope_m'))
+
+
+def test_saved_draws_equal_the_posterior(tmp_path):
+    rng = np.random.default_rng(1)
+    arrays = synthetic_arrays(rng)
+    posterior = xr.Dataset({'ec_m': (('chain', 'draw', 'media_channel'), rng.uniform(size=(2, 10, N_CHANNELS)))},
+                           coords={'media_channel': arrays['channels']})
+    save_posterior(_Posterior(posterior), arrays, str(tmp_path), thin=3)
+
+    store = open_store(str(tmp_path))
+    np.testing.assert_allclose(store.get('ec_m'), posterior['ec_m'].values[:, ::3], rtol=1e-6)
+    np.testing.assert_allclose(store.inputs('kpi'), arrays['kpi'], rtol=1e-6)
+    assert store.manifest['thin'] == 3 and store.get('ec_m').shape == (2, 4, N_CHANNELS)
+
+
+def test_missing_store_opens_as_none(tmp_path):
+    assert open_store(str(tmp_path)) is None
+    assert store_size(str(tmp_path)) == 0
+
+
+def test_copy_store_links_every_file(model_dir, tmp_path):
+    target = tmp_path / 'copy'
+    target.mkdir()
+    assert copy_store(model_dir, str(target))
+
+    copied = open_store(str(target))
+    np.testing.assert_array_equal(copied.get('alpha_m'), open_store(model_dir).get('alpha_m'))
+    assert store_size(str(target)) == store_size(model_dir)
+    assert not copy_store(str(tmp_path / 'missing'), str(target))
+    assert sorted(os.listdir(target / STORE_DIR)) == sorted(os.listdir(os.path.join(model_dir, STORE_DIR)))
+
+
+def test_save_group_on_a_copy_leaves_the_source_alone(model_dir, tmp_path):
+    save_group(model_dir, 'curves', {'mean': (np.zeros(N_CHANNELS), ['channel'])})
+    target = tmp_path / 'copy'
+    target.mkdir()
+    copy_store(model_dir, str(target))
+
+    save_group(str(target), 'curves', {'mean': (np.ones(N_CHANNELS), ['channel'])})
+    np.testing.assert_array_equal(open_store(str(target)).get('mean', 'curves'), np.ones(N_CHANNELS))
+    np.testing.assert_array_equal(open_store(model_dir).get('mean', 'curves'), np.zeros(N_CHANNELS))
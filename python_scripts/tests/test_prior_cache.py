@@ -0,0 +1,114 @@
+import dataclasses
+import json
+import os
+
+import numpy as np
+import pytest
+
+import prior_cache
+from conftest import synthetic_arrays
+from disk_cache import DiskCache
+from prior_cache import PRIOR_FILE, PriorSamples, describe_spec, prior_cache_key, scaling_constants
+
+
+@dataclasses.dataclass
+class Spec:
+    max_lag: int = 8
+    knots: object = None
+
+
+class Prior:
+    """Stand-in for the prior InferenceData, saved as JSON"""
+
+    def __init__(self, draws):
+        self.draws = draws
+
+    def to_netcdf(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.draws, f)
+
+
+class Model:
+    def __init__(self):
+        class InferenceData:
+            def extend(self, other, join):
+                self.extended = other
+        self.inference_data = InferenceData()
+
+
+@pytest.fixture
+def sampled(monkeypatch):
+    """Count prior samplings and read cached priors back as JSON"""
+    calls = []
+
+    def sample(input_data, model_spec, n_draws, seed):
+        calls.append(seed)
+        return Prior([seed] * 3)
+
+    def load(path):
+        with open(path) as f:
+            return Prior(json.load(f))
+    monkeypatch.setattr(prior_cache, '_sample_prior', sample)
+    monkeypatch.setattr(prior_cache, 'load_inference_data', load)
+    return calls
+
+
+def test_key_tracks_spec_scaling_and_seed():
+    arrays = synthetic_arrays(np.random.default_rng(0))
+    key = prior_cache_key(arrays, Spec(), 100, 1, 'v1')
+
+    # Same scaling constants: the same key, even for different KPI values
+    shuffled = {**arrays, 'kpi': arrays['kpi'][:, ::-1]}
+    assert prior_cache_key(shuffled, Spec(), 100, 1, 'v1') == key
+    for changed in (prior_cache_key({**arrays, 'media_spend': arrays['media_spend'] * 2}, Spec(), 100, 1, 'v1'),
+                    prior_cache_key(arrays, Spec(max_lag=4), 100, 1, 'v1'),
+                    prior_cache_key(arrays, Spec(), 100, 2, 'v1'),
+                    prior_cache_key(arrays, Spec(), 100, 1, 'v2')):
+        assert changed != key
+
+
+def test_spec_description_is_json():
+    description = describe_spec(Spec(knots=np.array([1.0, 2.0])))
+    assert description == {'max_lag': 8, 'knots': [1.0, 2.0]}
+    assert scaling_constants(synthetic_arrays(np.random.default_rng(0)))['shape']['geos'] == 4
+
+
+def test_miss_samples_then_caches_and_hit_loads(tmp_path, sampled):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+    miss = PriorSamples(cache, 'k')
+    assert not miss.start(None, Spec(), seed=7)
+    model = Model()
+    miss.attach(model)
+    assert model.inference_data.extended.draws == [7, 7, 7]
+    assert os.path.exists(os.path.join(cache.get('k'), PRIOR_FILE))
+
+    hit = PriorSamples(cache, 'k')
+    assert hit.start(None, Spec(), seed=7)
+    assert hit.samples().draws == [7, 7, 7]
+    assert sampled == [7]
+
+
+def test_unreadable_entry_is_dropped_and_resampled(tmp_path, sampled):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+
+    def corrupt(path):
+        with open(os.path.join(path, PRIOR_FILE), 'w') as f:
+            f.write('not json')
+    cache.put('k', corrupt)
+
+    samples = PriorSamples(cache, 'k')
+    assert not samples.start(None, Spec(), seed=3)
+    assert samples.samples().draws == [3, 3, 3]
+    assert cache.get('k') is None
+
+
+def test_bypassed_cache_is_neither_read_nor_written(tmp_path, sampled):
+    cache = DiskCache(str(tmp_path), max_bytes=10**9)
+    cache.put('k', lambda path: Prior([1]).to_netcdf(os.path.join(path, PRIOR_FILE)))
+
+    samples = PriorSamples(cache, 'k')
+    assert not samples.start(None, Spec(), seed=5, use_cache=False)
+    samples.attach(Model())
+    assert sampled == [5]
+    with open(os.path.join(cache.get('k'), PRIOR_FILE)) as f:
+        assert json.load(f) == [1]
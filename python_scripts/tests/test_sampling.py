@@ -0,0 +1,186 @@
+import json
+import sys
+import types
+
+import numpy as np
+import pytest
+import xarray as xr
+
+import checkpoints
+import sampling
+from checkpoints import SamplingCheckpoint
+from conftest import N_CHANNELS, N_GEOS
+from sampling import (_sample_segmented, CONTINUATION_WARMUP, _continuation_config, _worst, chain_groups, chain_processes,
+                      convergence_targets, core_groups, group_seeds, model_coords, warm_start_state)
+
+
+def test_chains_split_evenly_across_processes():
+    assert chain_groups(4, 3) == [2, 1, 1]
+    assert chain_groups(2, 8) == [1, 1]
+    assert chain_groups(7, 1) == [7]
+
+
+def test_cores_split_in_contiguous_blocks_by_chain_count():
+    groups = core_groups(list(range(8)), [2, 1, 1])
+    assert groups == [[0, 1, 2, 3], [4, 5], [6, 7]]
+    assert sorted(c for group in groups for c in group) == list(range(8))
+    # Fewer cores than processes: they are shared round-robin
+    assert core_groups([0, 1], [1, 1, 1]) == [[0], [1], [0]]
+
+
+def test_group_seeds_are_distinct_and_reproducible():
+    seeds = group_seeds(42, 4)
+    assert len(set(seeds)) == 4 and seeds == group_seeds(42, 4)
+    assert seeds != group_seeds(43, 4)
+    assert all(0 <= seed < 2**31 for seed in seeds)
+
+
+def test_chain_processes_from_config_or_env(monkeypatch):
+    monkeypatch.delenv('MERIDIAN_CHAIN_PROCESSES', raising=False)
+    assert chain_processes({}) == 1
+    monkeypatch.setenv('MERIDIAN_CHAIN_PROCESSES', '4')
+    assert chain_processes({}) == 4
+    assert chain_processes({'sampling': {'chain_processes': 0}}) == 1
+
+
+def test_convergence_targets_default_to_twice_the_kept_draws(monkeypatch):
+    monkeypatch.delenv('MERIDIAN_ADAPTIVE_SAMPLING', raising=False)
+    targets = convergence_targets({}, {'n_keep': 500})
+    assert not targets['adaptive'] and targets['max_draws'] == 1000
+    targets = convergence_targets({'sampling': {'adaptive': True, 'target_rhat': 1.05, 'max_draws': 300}},
+                                  {'n_keep': 500})
+    assert targets['adaptive'] and targets['target_rhat'] == 1.05 and targets['max_draws'] == 300
+
+
+def test_continuation_segments_skip_burn_in_and_shorten_adaptation():
+    segment = _continuation_config({'n_chains': 4, 'n_adapt': 500, 'n_burnin': 500, 'n_keep': 1000}, 250, 9)
+    assert segment == {'n_chains': 4, 'n_adapt': CONTINUATION_WARMUP, 'n_burnin': 0, 'n_keep': 250, 'seed': 9}
+
+
+def test_worst_diagnostic_ignores_non_finite_values():
+    dataset = xr.Dataset({'a': ('x', [1.001, np.nan]), 'b': ('x', [1.2, 1.0]), 'c': ('x', [np.inf, np.inf])})
+    assert _worst(dataset, np.max) == (1.2, 'b')
+    assert _worst(dataset, np.min) == (1.0, 'b')
+
+
+class Prior:
+    """PriorSamples stand-in that records whether the prior was waited on"""
+
+    def __init__(self, channels, n_geos=N_GEOS):
+        rng = np.random.default_rng(5)
+        dims = ('chain', 'draw', 'media_channel')
+        self.waited = False
+        self._prior = type('InferenceData', (), {})()
+        self._prior.prior = xr.Dataset({
+            'ec_m': (dims, rng.uniform(size=(1, 6, len(channels)))),
+            'beta_gm': (('chain', 'draw', 'geo', 'media_channel'), rng.uniform(size=(1, 6, n_geos, len(channels)))),
+            'tau_g': (('chain', 'draw', 'geo'), rng.uniform(size=(1, 6, n_geos))),
+        }, coords={'media_channel': channels, 'geo': [f'g{i}' for i in range(n_geos)]})
+
+    def samples(self):
+        self.waited = True
+        return self._prior
+
+
+def coords(channels):
+    return {'geo': [f'g{i}' for i in range(N_GEOS)], 'media_channel': channels, 'time': [], 'control_variable': []}
+
+
+def test_warm_start_reads_stored_draws_without_the_prior(model_dir, store):
+    channels = store.channels
+    prior = Prior(channels)
+    warm = warm_start_state(model_dir, prior, 3, {}, coords(channels), ['ec_m', 'beta_gm'])
+
+    assert not prior.waited
+    assert sorted(warm['reused']) == ['beta_gm', 'ec_m'] and warm['from_prior'] == []
+    last = np.asarray(store.get('ec_m'))[:, -1]
+    # Three chains from a two-chain fit: chains cycle through the stored ones
+    np.testing.assert_array_equal(warm['state']['ec_m'], last[[0, 1, 0]])
+    assert warm['state']['beta_gm'].shape == (3, N_GEOS, N_CHANNELS)
+
+
+def test_new_labels_start_from_the_prior_overwritten_where_shared(model_dir, store):
+    channels = ['c2', 'new', 'c0']
+    prior = Prior(channels)
+    warm = warm_start_state(model_dir, prior, 2, {}, coords(channels), ['ec_m', 'tau_g'])
+
+    assert prior.waited
+    assert sorted(warm['from_prior']) == ['ec_m', 'tau_g']
+    ec = warm['state']['ec_m']
+    last = np.asarray(store.get('ec_m'))[:, -1]
+    np.testing.assert_array_equal(ec[:, 0], last[:, 2])
+    np.testing.assert_array_equal(ec[:, 2], last[:, 0])
+    np.testing.assert_array_equal(ec[:, 1], prior.samples().prior['ec_m'].values[0, :2, 1])
+    assert 'beta_gm' not in warm['state']
+
+
+def test_without_model_coords_everything_goes_through_the_prior(model_dir, store):
+    prior = Prior(store.channels)
+    warm = warm_start_state(model_dir, prior, 2, {'sampling': {'warm_start_fraction': 0.5}})
+    assert prior.waited and sorted(warm['state']) == ['beta_gm', 'ec_m', 'tau_g']
+    assert sorted(warm['reused']) == ['beta_gm', 'ec_m'] and warm['fraction'] == 0.5
+    assert warm_start_state(str(model_dir) + '/missing', prior, 2, {}) is None
+
+
+def test_model_coords_include_knots():
+    arrays = {'geos': ['a'], 'times': ['2022-01-02'], 'channels': ['tv'], 'controls': []}
+    model = type('Model', (), {'knot_info': type('KnotInfo', (), {'n_knots': 3})()})()
+    assert model_coords(model, arrays)['knots'] == ['0', '1', '2']
+    assert 'knots' not in model_coords(object(), arrays)
+
+
+class Part:
+    """Stand-in for one segment's InferenceData; fresh parts come from this run"""
+
+    def __init__(self, n_draws, fresh=False):
+        self.posterior = types.SimpleNamespace(sizes={'draw': n_draws})
+        self.fresh = fresh
+
+    def to_netcdf(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.posterior.sizes['draw'], f)
+
+    def groups(self):
+        return []
+
+
+class SegmentModel:
+    def __init__(self):
+        self.calls = []
+        self.inference_data = types.SimpleNamespace(extend=lambda merged, join: None)
+
+    def sample_posterior(self, current_state=None, **kwargs):
+        self.calls.append({**kwargs, 'current_state': current_state})
+
+
+@pytest.fixture
+def fake_segments(monkeypatch):
+    """Segment sampling without arviz: resumed parts are unconverged, fresh ones converge"""
+    def load(path):
+        with open(path) as f:
+            return Part(json.load(f))
+
+    monkeypatch.setitem(sys.modules, 'arviz', types.SimpleNamespace(concat=lambda *parts, dim: parts[-1]))
+    monkeypatch.setattr(checkpoints, 'load_inference_data', load)
+    monkeypatch.setattr(sampling, '_posterior_groups', lambda idata: Part(10, fresh=True))
+    monkeypatch.setattr(sampling, 'posterior_diagnostics', lambda idata, targets: {
+        'rhat_max': 1.0 if idata.fresh else 1.5, 'ess_bulk_min': 400.0, 'converged': idata.fresh})
+    monkeypatch.delenv('MERIDIAN_ADAPTIVE_SAMPLING', raising=False)
+
+
+@pytest.mark.parametrize('warm_started', [True, False])
+def test_resumed_warm_start_faces_the_convergence_check(tmp_path, fake_segments, warm_started):
+    checkpoint = SamplingCheckpoint(str(tmp_path), 'run-1')
+    checkpoint.save(0, Part(10), 10, None, warm_started)
+    config = {'n_chains': 2, 'n_adapt': 100, 'n_burnin': 100, 'n_keep': 10, 'seed': 0}
+    model = SegmentModel()
+
+    result = _sample_segmented(model, config, convergence_targets({}, config), 10, checkpoint)
+
+    if warm_started:
+        # Unconverged warm-started draws are dropped and the run is sampled again cold
+        assert result['converged'] and len(model.calls) == 1
+        assert model.calls[0]['current_state'] is None and model.calls[0]['n_adapt'] == 100
+        assert not checkpoint.warm_started()
+    else:
+        assert not result['converged'] and model.calls == []
@@ -0,0 +1,71 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from budget_optimizer import StoreResponse
+from response_model import ResponseModel
+from scenario_batch import main, run_batch, scenario_matrix
+
+CHANNELS = ['c0', 'c1', 'c2']
+
+
+@pytest.fixture
+def results_dir(model_dir):
+    with open(os.path.join(model_dir, 'results.json'), 'w') as f:
+        json.dump({}, f)
+    return model_dir
+
+
+def test_scenario_matrix_fills_unlisted_channels_with_current_spend():
+    current = np.array([10.0, 20.0, 30.0])
+    spend = scenario_matrix({'scenarios': [[1.0, 2.0], [0.5, 0.0]], 'channels': ['c2', 'c0'],
+                             'units': 'multiplier'}, CHANNELS, current)
+    np.testing.assert_allclose(spend, [[20.0, 20.0, 30.0], [0.0, 20.0, 15.0]])
+
+
+@pytest.mark.parametrize('request_, message', [
+    ({'scenarios': []}, 'non-empty'),
+    ({'scenarios': [[1.0, 2.0]]}, '2 columns but 3 channels'),
+    ({'scenarios': [[1.0]], 'channels': ['tv']}, 'Unknown channels'),
+    ({'scenarios': [[-1.0, 0.0, 0.0]]}, 'non-negative'),
+])
+def test_bad_scenarios_are_rejected(request_, message):
+    with pytest.raises(ValueError, match=message):
+        scenario_matrix(request_, CHANNELS, np.ones(3))
+
+
+def test_batch_scores_match_the_response_in_chunks(results_dir, store, monkeypatch):
+    monkeypatch.setattr('scenario_batch.CHUNK_ELEMENTS', 1)
+    response = StoreResponse(ResponseModel(store))
+    rng = np.random.default_rng(0)
+    scenarios = response.spend * rng.uniform(0.0, 2.0, (7, 3))
+    lines = []
+
+    summary = run_batch(results_dir, {'scenarios': scenarios.tolist(), 'names': list('abcdefg')}, lines.append)
+
+    # One scenario per chunk, emitted in order
+    assert [line['offset'] for line in lines] == list(range(7))
+    results = [result for line in lines for result in line['results']]
+    totals = np.array([response.value_and_grad(x)[0].sum() for x in scenarios])
+    np.testing.assert_allclose([r['total_outcome'] for r in results], totals, rtol=1e-6)
+    assert [r['name'] for r in results] == list('abcdefg')
+    assert summary['best_index'] == int(np.argmax(totals))
+    assert summary['current_outcome'] == pytest.approx(response.value_and_grad(response.spend)[0].sum())
+    assert results[0]['lift'] == pytest.approx(results[0]['total_outcome'] - summary['current_outcome'])
+
+
+def test_main_streams_chunks_and_returns_the_summary(results_dir, tmp_path, capsys):
+    path = tmp_path / 'scenarios.json'
+    path.write_text(json.dumps({'scenarios': [[1.0, 1.0, 1.0]], 'units': 'multiplier', 'include_channels': False}))
+    summary = main(results_dir, str(path))
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line['status'] for line in lines] == ['scenario_results']
+    assert 'channel_outcome' not in lines[0]['results'][0]
+    assert summary['status'] == 'scenario_batch_completed'
+    assert lines[0]['results'][0]['lift'] == pytest.approx(0.0, abs=1e-6 * summary['current_outcome'])
+
+    path.write_text(json.dumps({'scenarios': [[1.0]]}))
+    assert main(results_dir, str(path))['status'] == 'error'
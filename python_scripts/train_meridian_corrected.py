@@ -7,19 +7,137 @@ import json
 import sys
 import pandas as pd
 import numpy as np
-import xarray as xr
 import os
+import shutil
 from typing import Dict, Any
 
-# Set CPU optimization flags for 4 chains (2 CPUs per chain)
-os.environ['TF_NUM_INTEROP_THREADS'] = '8'
-os.environ['TF_NUM_INTRAOP_THREADS'] = '2'  # Per-chain threads
-os.environ['OMP_NUM_THREADS'] = '8'
+from data_prep import input_data_from_arrays
+from data_refresh import prepare_refresh, write_lineage
+from dataset_cache import load_dataset
+from disk_cache import DiskCache, fingerprint
+from sampling import available_cores, chain_processes, model_coords, sample_posterior, sampler_variables, warm_start_state
+from checkpoints import SamplingCheckpoint, collect_stale_checkpoints
+from prior_cache import PRIOR_DRAWS, PriorSamples, prior_cache, prior_cache_key
+from posterior_store import copy_store, open_store, posterior_thin, save_group, save_posterior, store_size
+from budget_optimizer import DEFAULT_SPEND_CONSTRAINT, optimize_from_results
+from response_model import CURVE_DRAWS, CURVE_MAX_MULTIPLIER, CURVE_STEPS, ResponseModel, curve_grid
+from posterior_metrics import DEFAULT_CREDIBLE_MASS, PosteriorMetrics, column_summary
+
+# Thread pool sizes are set per run from the cores and chains (set_thread_defaults)
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '1'  # CPU optimizations
 
-# Development mode for faster iteration
-DEVELOPMENT_MODE = os.getenv('MERIDIAN_DEV_MODE', 'false') == 'true'
+# Bump when the results.json layout changes so cached results are not reused
+RESULTS_SCHEMA_VERSION = 4
+RESULT_CACHE_DIR = os.getenv(
+    'MERIDIAN_RESULT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_cache')
+)
+RESULT_CACHE_MAX_MB = int(os.getenv('MERIDIAN_RESULT_CACHE_MAX_MB', '2048'))
+RESULT_CACHE_MAX_ENTRIES = 200
+
+def is_development_mode() -> bool:
+    """Development mode for faster iteration (read per run so warm workers honour it)"""
+    return os.getenv('MERIDIAN_DEV_MODE', 'false') == 'true'
+
+def get_sampling_config() -> Dict[str, Any]:
+    """Posterior sampling settings, reduced in development mode"""
+    if is_development_mode():
+        return {
+            'n_chains': 2,
+            'n_draws': 500,
+            'n_keep': 500,
+            'seed': 42,
+            'parallel_iterations': 2
+        }
+    return {
+        'n_chains': 4,           # REQUIRED: Minimum 4 chains (not 2)
+        'n_draws': 1000,         # Warmup samples (not n_adapt)
+        'n_keep': 1000,          # Kept samples after warmup
+        'seed': 42,
+        'parallel_iterations': 2  # CPU optimization for Replit
+    }
+
+def set_thread_defaults(n_chains: int):
+    """Size TensorFlow's thread pools to this process's cores, split across its chains
+
+    Values already in the environment win. Pools are sized when TensorFlow is
+    imported, so call this before importing Meridian.
+    """
+    n_cores = len(available_cores())
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', str(max(1, min(n_chains, n_cores))))
+    os.environ.setdefault('TF_NUM_INTRAOP_THREADS', str(max(1, n_cores // n_chains)))  # Per-chain threads
+    os.environ.setdefault('OMP_NUM_THREADS', str(n_cores))
+
+def meridian_version() -> str:
+    """Installed Meridian version, part of the result cache key"""
+    try:
+        from importlib.metadata import version
+        return version('google-meridian')
+    except Exception:
+        return 'unknown'
+
+def result_cache() -> DiskCache:
+    return DiskCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 2**20, RESULT_CACHE_MAX_ENTRIES)
+
+def result_cache_key(dataset_key: str, config: Dict[str, Any], sampling_config: Dict[str, Any]) -> str:
+    """Key for a training result: data content, normalized config, sampling and Meridian version"""
+    normalized = {
+        key: value for key, value in config.items()
+        if value not in (None, '', [], {}) and key != 'bypass_cache'
+    }
+    return fingerprint(dataset_key, normalized, sampling_config, meridian_version(), RESULTS_SCHEMA_VERSION)
+
+def bypass_result_cache(config: Dict[str, Any]) -> bool:
+    return bool(config.get('bypass_cache')) or os.getenv('MERIDIAN_BYPASS_CACHE', 'false') == 'true'
+
+def precompute_response_curves(model_dir: str, config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Posterior mean and credible band of each channel's response over a spend-multiplier grid
+
+    The grid is evaluated once over every stored draw and saved in the store's
+    "curves" group, so serving a curve later is a lookup.
+    """
+    mass = float(config.get('credible_interval', DEFAULT_CREDIBLE_MASS))
+    tail = (1 - mass) / 2
+    quantiles = sorted({0.05, 0.5, 0.95, round(tail, 6), round(1 - tail, 6)})
+    multipliers = np.linspace(0.0, float(config.get('curve_max_multiplier', CURVE_MAX_MULTIPLIER)),
+                              int(config.get('curve_steps', CURVE_STEPS)))
+
+    model = ResponseModel(open_store(model_dir), max_draws=CURVE_DRAWS or None)
+    grid = curve_grid(model, multipliers, quantiles)
+    save_group(model_dir, 'curves', {
+        'multipliers': (grid['multipliers'], ('multiplier',)),
+        'spend': (grid['spend'], ('media_channel',)),
+        'quantiles': (grid['quantiles'], ('quantile',)),
+        'mean': (grid['mean'], ('multiplier', 'media_channel')),
+        'bands': (grid['bands'], ('quantile', 'multiplier', 'media_channel')),
+    })
+
+    lower, upper = quantiles.index(round(tail, 6)), quantiles.index(round(1 - tail, 6))
+    curves = {}
+    for i, channel in enumerate(model.channels):
+        curves[channel] = {
+            "multipliers": np.round(grid['multipliers'], 4).tolist(),
+            "spend": np.round(grid['multipliers'] * grid['spend'][i], 2).tolist(),
+            "mean": np.round(grid['mean'][:, i], 2).tolist(),
+            "lower": np.round(grid['bands'][lower, :, i], 2).tolist(),
+            "upper": np.round(grid['bands'][upper, :, i], 2).tolist(),
+        }
+    return curves
+
+def recommended_allocation(model_dir: str, results: Dict[str, Any]) -> Dict[str, Any]:
+    """Default budget recommendation: same total, each channel within Meridian's default bounds"""
+    optimization = optimize_from_results(results, {}, model_dir)
+    current = optimization['current_outcome']
+    return {
+        "current_budget": optimization['total_budget'],
+        "optimal_allocation": optimization['allocation'],
+        "expected_lift": (optimization['optimal_outcome'] - current) / current if current else 0.0,
+        "optimization_type": "response_curve",
+        "spend_constraint": DEFAULT_SPEND_CONSTRAINT,
+        "note": "Maximizes incremental outcome over the fitted adstock and Hill response, "
+                "keeping each channel within 30% of its current spend."
+    }
 
 def main(data_file: str, config_file: str, output_file: str):
     """Main training function using real Meridian only"""
@@ -28,202 +146,176 @@ def main(data_file: str, config_file: str, output_file: str):
         # Progress updates
         print(json.dumps({"status": "loading_data", "progress": 10}))
         
-        # Load data and config
-        df = pd.read_csv(data_file)
+        # Load data (columnar cache, parsed once per upload) and config
+        dataset = load_dataset(data_file)
         with open(config_file, 'r') as f:
             config = json.load(f)
         
         print(json.dumps({"status": "config_loaded", "config": config}))
         
+        # Identical data + config + sampling settings give identical results
+        sampling_config = get_sampling_config()
+        n_processes = chain_processes(config)
+        cache = result_cache()
+        # Chain-parallel runs use per-process seeds, so their draws differ
+        thin = posterior_thin(config)
+        model_dir = os.path.dirname(os.path.abspath(output_file))
+        cache_key = result_cache_key(dataset.key, config, {**sampling_config, 'chain_processes': n_processes,
+                                                           'posterior_thin': thin})
+        # Refreshes and warm-started refits skip the cache both ways: the key does not
+        # cover their source, a hit would skip their lineage and a stored refit
+        # would hand that lineage to later plain fits
+        refit = bool(os.getenv('MERIDIAN_REFRESH_BASE_DATA') or os.getenv('MERIDIAN_WARM_START_DIR'))
+        if bypass_result_cache(config) or refit:
+            print(json.dumps({"status": "result_cache_bypassed", "key": cache_key,
+                              "reason": "refit" if refit else "requested"}))
+        else:
+            cached = cache.get(cache_key)
+            if cached:
+                with open(os.path.join(cached, 'results.json')) as f:
+                    results = json.load(f)
+                results.setdefault('model_info', {})['result_cache'] = {"hit": True, "key": cache_key}
+                copy_store(cached, model_dir)
+                with open(output_file, 'w') as f:
+                    json.dump(results, f, indent=2)
+                print(json.dumps({"status": "result_cache_hit", "key": cache_key, "progress": 100}))
+                print(json.dumps({"status": "completed", "progress": 100}))
+                return
+        
         # Import Meridian components
         print(json.dumps({"status": "importing_meridian", "progress": 20}))
+        set_thread_defaults(int(sampling_config['n_chains']))
         
         from meridian.model.model import Meridian
         from meridian.model.spec import ModelSpec
-        from meridian.data.input_data import InputData
         from meridian.analysis.analyzer import Analyzer
         print(json.dumps({"status": "meridian_imported", "progress": 25}))
         
         # Prepare data in xarray format
         print(json.dumps({"status": "preparing_data", "progress": 30}))
         
-        n_time_periods = len(df)
-        n_geos = 1  # National model
-        
-        # Convert date column to proper format
-        dates = pd.to_datetime(df[config['date_column']], dayfirst=True).dt.strftime('%Y-%m-%d').tolist()
-        
-        # Prepare KPI data (target variable)
-        kpi_vals = df[config['target_column']].values.reshape(n_geos, n_time_periods)
-        kpi_data = xr.DataArray(
-            kpi_vals,
-            dims=['geo', 'time'],
-            coords={'geo': [0], 'time': dates},
-            name='kpi'
-        )
-        
-        # Prepare media data (impressions)
-        media_channels = config['channel_columns']
-        n_channels = len(media_channels)
-        
-        # Look for impression columns first, fall back to spend as proxy
-        media_vals = np.zeros((n_geos, n_time_periods, n_channels))
-        spend_vals = np.zeros((n_geos, n_time_periods, n_channels))
-        
-        for i, channel in enumerate(media_channels):
-            # Try to find impression column
-            impression_col = channel.replace('_spend', '_impressions')
-            if impression_col in df.columns:
-                media_vals[0, :, i] = df[impression_col].values
-            elif channel in df.columns:
-                # Use spend as proxy for impressions if no impression data
-                media_vals[0, :, i] = df[channel].values
-            
-            # Get spend data
-            if channel in df.columns:
-                spend_vals[0, :, i] = df[channel].values
-        
-        media_data = xr.DataArray(
-            media_vals,
-            dims=['geo', 'media_time', 'media_channel'],
-            coords={'geo': [0], 'media_time': dates, 'media_channel': media_channels},
-            name='media'
-        )
-        
-        media_spend_data = xr.DataArray(
-            spend_vals,
-            dims=['geo', 'time', 'media_channel'],
-            coords={'geo': [0], 'time': dates, 'media_channel': media_channels},
-            name='media_spend'
-        )
-        
-        # Population data - handle GQV population scaling
-        population_val = 1000000  # Default
-        if 'population' in config.get('control_columns', []) and 'population' in df.columns:
-            # Use average population if it varies over time
-            population_val = df['population'].mean()
-        
-        population_data = xr.DataArray(
-            [population_val],
-            dims=['geo'],
-            coords={'geo': [0]},
-            name='population'
-        )
-        
-        # Control variables (including GQV)
-        controls_data = None
-        if config.get('control_columns'):
-            # Filter out population (handled separately)
-            control_cols = [col for col in config['control_columns'] 
-                           if col != 'population' and col in df.columns]
-            
-            if control_cols:
-                controls_vals = np.zeros((n_geos, n_time_periods, len(control_cols)))
-                for i, col in enumerate(control_cols):
-                    controls_vals[0, :, i] = df[col].values
-                    
-                controls_data = xr.DataArray(
-                    controls_vals,
-                    dims=['geo', 'time', 'control_variable'],
-                    coords={'geo': [0], 'time': dates, 'control_variable': control_cols},
-                    name='controls'
-                )
-                
-                # Log GQV detection
-                gqv_cols = [col for col in control_cols if 'gqv' in col.lower()]
-                if gqv_cols:
-                    print(json.dumps({"status": "gqv_detected", "columns": gqv_cols}))
+        # A refresh of an earlier model: when the new upload only appends periods, its
+        # arrays are the base upload's cached arrays plus the appended rows
+        lineage = None
+        refresh_base = os.getenv('MERIDIAN_REFRESH_BASE_DATA')
+        if refresh_base and os.path.exists(refresh_base):
+            lineage = {**(config.get('lineage') or {}),
+                       **prepare_refresh(load_dataset(refresh_base), dataset, config),
+                       "warm_start_dir": os.getenv('MERIDIAN_WARM_START_DIR') or None}
+            write_lineage(model_dir, lineage)
+        
+        # Build kpi/media/spend/controls arrays once per upload and config
+        arrays = dataset.prepared_arrays(config)
+        input_data = input_data_from_arrays(arrays)
+        media_channels = arrays['channels']
         
         print(json.dumps({"status": "data_prepared", "progress": 35}))
         
-        # Create InputData object
-        input_data_kwargs = {
-            'kpi': kpi_data,
-            'kpi_type': 'revenue',
-            'media': media_data,
-            'media_spend': media_spend_data,
-            'population': population_data
-        }
-        
-        if controls_data is not None:
-            input_data_kwargs['controls'] = controls_data
-        
-        input_data = InputData(**input_data_kwargs)
-        
         print(json.dumps({"status": "configuring_model", "progress": 40}))
         
         # Create model specification
         model_spec = ModelSpec()
         
-        print(json.dumps({"status": "training_model", "progress": 45}))
+        # Prior draws depend only on the spec and the data's scaling: reuse them when
+        # cached, otherwise sample them in the background while the posterior runs
+        prior_seed = sampling_config.get('seed')
+        prior = PriorSamples(prior_cache(), prior_cache_key(arrays, model_spec, PRIOR_DRAWS, prior_seed,
+                                                            meridian_version()))
+        prior_hit = prior.start(input_data, model_spec, PRIOR_DRAWS, prior_seed,
+                                use_cache=not bypass_result_cache(config))
+        print(json.dumps({"status": "prior_cache_hit" if prior_hit else "sampling_prior", "key": prior.key,
+                          "progress": 45}))
+        
+        print(json.dumps({"status": "training_model", "progress": 48}))
         
         # Initialize Meridian model
         model = Meridian(input_data=input_data, model_spec=model_spec)
-        
-        # CRITICAL: Sample from prior distribution first!
-        print(json.dumps({"status": "sampling_prior", "progress": 48}))
-        model.sample_prior(n_draws=1000)  # Increase from 100
 
         print(json.dumps({"status": "sampling_posterior", "progress": 50}))
 
-        # Configure sampling based on development mode
-        if DEVELOPMENT_MODE:
-            sampling_config = {
-                'n_chains': 2,
-                'n_draws': 500,
-                'n_keep': 500,
-                'seed': 42,
-                'parallel_iterations': 2
-            }
+        if is_development_mode():
             print(json.dumps({"status": "dev_mode", "message": "Using reduced sampling for development"}))
-        else:
-            sampling_config = {
-                'n_chains': 4,           # REQUIRED: Minimum 4 chains (not 2)
-                'n_draws': 1000,         # Warmup samples (not n_adapt)
-                'n_keep': 1000,          # Kept samples after warmup
-                'seed': 42,
-                'parallel_iterations': 2  # CPU optimization for Replit
-            }
 
-        # Use correct Meridian API parameters
-        model.sample_posterior(**sampling_config)
+        # Sampling segments are checkpointed next to the results so a restarted job resumes
+        checkpoint = SamplingCheckpoint(model_dir, cache_key)
+        stale = collect_stale_checkpoints(os.path.dirname(model_dir), keep=checkpoint.directory)
+        if stale:
+            print(json.dumps({"status": "stale_checkpoints_removed", "models": stale}))
+
+        # A refit can start its chains from an earlier fit's posterior (the server picks
+        # the fit); only variables the earlier fit does not cover wait for the prior
+        warm_start = None
+        warm_start_dir = os.getenv('MERIDIAN_WARM_START_DIR')
+        if warm_start_dir:
+            warm_start = warm_start_state(warm_start_dir, prior, int(sampling_config['n_chains']), config,
+                                          model_coords(model, arrays), sampler_variables(model))
+            print(json.dumps({
+                "status": "warm_start" if warm_start else "warm_start_unavailable",
+                "source": warm_start_dir,
+                "reused_variables": len(warm_start['reused']) if warm_start else 0,
+                "prior_variables": len(warm_start['from_prior']) if warm_start else 0
+            }))
+
+        # Use correct Meridian API parameters; chains may run in separate pinned processes
+        sampling_diagnostics = sample_posterior(model, sampling_config, n_processes, data_file, config,
+                                                checkpoint=checkpoint, warm_start=warm_start)
+        print(json.dumps({"status": "sampling_diagnostics", **sampling_diagnostics}))
+        
+        # Analyzer needs the prior group as well
+        prior.attach(model)
+        print(json.dumps({"status": "prior_attached", "cached": prior.hit}))
         
         print(json.dumps({"status": "analyzing_results", "progress": 80}))
         
         # Create Analyzer (after both prior and posterior sampling)
         model_analyzer = Analyzer(model)
         
-        # Debug: Explore what's actually available
-        print(json.dumps({"status": "exploring_analyzer", "progress": 82}))
-
-        # Check all attributes of analyzer
-        analyzer_attrs = [attr for attr in dir(model_analyzer) if not attr.startswith('__')]
-        print(json.dumps({"analyzer_attributes": analyzer_attrs[:20]}))  # First 20
-
-        # Check what's in the model object
-        model_attrs = [attr for attr in dir(model) if not attr.startswith('__')]
-        print(json.dumps({"model_attributes": model_attrs[:20]}))  # First 20
-
-        # Try to access posterior samples directly from model
-        if hasattr(model, 'posterior_samples'):
-            print(json.dumps({"has_posterior_samples": True}))
-            samples = model.posterior_samples
-            if hasattr(samples, 'keys'):
-                print(json.dumps({"posterior_keys": list(samples.keys())[:10]}))  # First 10 keys
-        elif hasattr(model, '_posterior_samples'):
-            print(json.dumps({"has_private_posterior_samples": True}))
-        elif hasattr(model, 'trace'):
-            print(json.dumps({"has_trace": True}))
-        
         # Extract real results only
-        results = extract_real_meridian_results(model_analyzer, model, config, media_channels)
+        results = extract_real_meridian_results(model_analyzer, model, config, media_channels, arrays)
         
         print(json.dumps({"status": "saving_results", "progress": 90}))
         
+        # Keep the posterior, prior and inputs so later questions need no re-fit
+        store = save_posterior(model, arrays, model_dir, thin)
+        
+        # Response curves with credible bands over a spend grid, from every draw
+        print(json.dumps({"status": "computing_response_curves", "progress": 93}))
+        for channel, curve in precompute_response_curves(model_dir, config).items():
+            results.setdefault('response_curves', {}).setdefault(channel, {})['curve'] = curve
+        
+        # Budget recommendation from a constrained optimizer over the same response
+        try:
+            results['optimization'] = recommended_allocation(model_dir, results)
+        except ValueError as e:
+            print(json.dumps({"status": "optimization_skipped", "message": str(e)}))
+        
+        results.setdefault('model_info', {})['posterior_store'] = {
+            "path": "posterior",
+            "thin": thin,
+            "n_draws": store['n_draws'],
+            "size_bytes": store_size(model_dir)
+        }
+        
         # Save results
+        results['model_info']['sampling_diagnostics'] = sampling_diagnostics
+        results['model_info']['result_cache'] = {"hit": False, "key": cache_key}
+        results['model_info']['prior_cache'] = {"hit": prior.hit, "key": prior.key}
+        if lineage is not None:
+            results['model_info']['lineage'] = {**lineage, "warm_start": sampling_diagnostics.get('warm_start')}
         with open(output_file, 'w') as f:
             json.dump(results, f, indent=2)
         
+        checkpoint.clear()
+        if results.get('success', True) and not refit:
+            try:
+                def populate(entry: str):
+                    shutil.copyfile(output_file, os.path.join(entry, 'results.json'))
+                    copy_store(model_dir, entry)
+                cache.put(cache_key, populate)
+                print(json.dumps({"status": "result_cached", "key": cache_key}))
+            except OSError as e:
+                print(json.dumps({"status": "result_cache_error", "message": str(e)}))
+        
         print(json.dumps({"status": "completed", "progress": 100}))
         
     except Exception as e:
@@ -242,154 +334,24 @@ def main(data_file: str, config_file: str, output_file: str):
         
         sys.exit(1)
 
-def extract_real_meridian_results(analyzer: 'Analyzer', model: 'Meridian', config: Dict[str, Any], channels: list) -> Dict[str, Any]:
+def extract_real_meridian_results(analyzer: 'Analyzer', model: 'Meridian', config: Dict[str, Any],
+                                  channels: list, arrays: Dict[str, Any]) -> Dict[str, Any]:
     """Extract REAL results from trained Meridian model - no mocks"""
     
     try:
-        # Get ROI values (these are methods, need parentheses!)
-        roi_values = analyzer.roi()
-        print(json.dumps({"debug": "roi_type", "type": str(type(roi_values)), "shape": str(roi_values.shape if hasattr(roi_values, 'shape') else 'no shape')}))
-        
-        # Get summary metrics
-        summary = analyzer.summary_metrics()
-        
-        # Get incremental outcomes
-        incremental = analyzer.incremental_outcome()
-        print(json.dumps({"debug": "incremental_type", "type": str(type(incremental)), "shape": str(incremental.shape if hasattr(incremental, 'shape') else 'no shape')}))
-        
-        # Get response curves
-        try:
-            response_data = analyzer.response_curves()
-            print(json.dumps({"debug": "response_data_available", "value": True}))
-        except:
-            response_data = None
-            print(json.dumps({"debug": "response_data_available", "value": False}))
-        
-        # Get adstock parameters
-        adstock = analyzer.adstock_decay()
-        print(json.dumps({"debug": "adstock_type", "type": str(type(adstock)), "shape": str(adstock.shape if hasattr(adstock, 'shape') else 'no shape')}))
-        
-        # Convert TensorFlow tensors to numpy arrays
-        if hasattr(roi_values, 'numpy'):
-            # It's a TensorFlow tensor
-            roi_array = roi_values.numpy()
-        else:
-            roi_array = np.array(roi_values)
-            
-        if hasattr(incremental, 'numpy'):
-            # It's a TensorFlow tensor
-            incremental_array = incremental.numpy()
-        else:
-            incremental_array = np.array(incremental)
-        
-        print(json.dumps({"debug": "roi_array_shape", "shape": str(roi_array.shape)}))
-        print(json.dumps({"debug": "incremental_array_shape", "shape": str(incremental_array.shape)}))
-        
-        # Handle adstock which is a DataFrame
-        print(json.dumps({"debug": "adstock_columns", "columns": list(adstock.columns) if hasattr(adstock, 'columns') else "not_dataframe"}))
-
-        if hasattr(adstock, 'columns') and 'mean' in adstock.columns:
-            # Extract mean adstock values for each channel
-            adstock_values = []
-            for channel in channels:
-                # Get adstock mean for this specific channel
-                channel_adstock = adstock[adstock['channel'] == channel]['mean'].values
-                if len(channel_adstock) > 0:
-                    # Take the mean of all time units for this channel
-                    adstock_values.append(float(np.mean(channel_adstock)))
-                else:
-                    # Default if channel not found
-                    adstock_values.append(0.5)
-            adstock_mean = np.array(adstock_values)
-        else:
-            # Fallback to default values
-            adstock_mean = np.array([0.5] * len(channels))
-        
-        # Average across chains and samples for ROI (shape: chains x samples x channels)
-        if roi_array.ndim == 3:
-            # Average over chains (axis 0) and samples (axis 1)
-            roi_mean = np.mean(roi_array, axis=(0, 1))
-        elif roi_array.ndim == 2:
-            # Average over samples
-            roi_mean = np.mean(roi_array, axis=0)
-        else:
-            roi_mean = roi_array
-            
-        # Same for incremental outcomes
-        if incremental_array.ndim == 3:
-            incremental_mean = np.mean(incremental_array, axis=(0, 1))
-        elif incremental_array.ndim == 2:
-            incremental_mean = np.mean(incremental_array, axis=0)
-        else:
-            incremental_mean = incremental_array
-        
-        print(json.dumps({"debug": "roi_mean_shape", "shape": str(roi_mean.shape), "values": roi_mean.tolist()}))
-        print(json.dumps({"debug": "incremental_mean_shape", "shape": str(incremental_mean.shape), "values": incremental_mean.tolist()}))
-        print(json.dumps({"debug": "adstock_mean_shape", "shape": str(adstock_mean.shape) if hasattr(adstock_mean, 'shape') else "not_array", "values": adstock_mean.tolist() if hasattr(adstock_mean, 'tolist') else str(adstock_mean)}))
+        # Per-draw incremental outcome is evaluated once; everything else derives from it
+        metrics = PosteriorMetrics(analyzer, model, arrays)
         
-        # Calculate spend percentages from authentic data sources
-        channel_spends = {}
-        total_media_spend = 0
+        # One batched quantile pass over every channel and control metric
+        mass = float(config.get('credible_interval', DEFAULT_CREDIBLE_MASS))
+        interval = config.get('interval_type', 'eti')
+        summaries = metrics.summaries(mass, interval)
+        roi_mean = summaries['roi']['mean']
+        incremental_mean = summaries['contribution']['mean']
         
-        # Add debug logging for model input data
-        print(json.dumps({
-            "debug": "model_input_data_check",
-            "has_input_data": hasattr(model, '_input_data'),
-            "input_data_type": str(type(model._input_data)) if hasattr(model, '_input_data') else "None",
-            "input_data_columns": list(model._input_data.columns) if hasattr(model, '_input_data') and hasattr(model._input_data, 'columns') else []
-        }))
-        
-        try:
-            # Method 1: Try analyzer's aggregated spend
-            hist_spend = analyzer.get_aggregated_spend(new_data=None)
-            if hist_spend is not None and hasattr(hist_spend, 'columns'):
-                print(json.dumps({"debug": "using_analyzer_spend_data", "columns": list(hist_spend.columns)}))
-                
-                for channel in channels:
-                    if channel in hist_spend.columns:
-                        channel_spend = float(hist_spend[channel].sum())
-                        channel_spends[channel] = channel_spend
-                        total_media_spend += channel_spend
-                        print(json.dumps({"extracted_spend": channel, "amount": channel_spend}))
-            
-            # Method 2: Try accessing the xarray data directly
-            if total_media_spend == 0 and hasattr(model, '_input_data'):
-                input_data = model._input_data
-                print(json.dumps({"debug": "trying_input_data_xarray"}))
-                
-                # Look for media_spend xarray
-                if hasattr(input_data, 'media_spend') and input_data.media_spend is not None:
-                    media_spend_data = input_data.media_spend
-                    print(json.dumps({
-                        "found_media_spend_xarray": True,
-                        "dims": list(media_spend_data.dims),
-                        "shape": list(media_spend_data.shape),
-                        "coords": {dim: list(media_spend_data.coords[dim].values)[:3] for dim in media_spend_data.dims}
-                    }))
-                    
-                    # Sum across geo and time dimensions
-                    # media_spend shape is (geo, time, media_channel)
-                    for i, channel in enumerate(channels):
-                        if i < media_spend_data.shape[2]:  # Check channel index exists
-                            channel_spend = float(media_spend_data.values[:, :, i].sum())
-                            channel_spends[channel] = channel_spend
-                            total_media_spend += channel_spend
-                            print(json.dumps({"extracted_xarray_spend": channel, "amount": channel_spend}))
-            
-            # Method 3: Last resort - calculate from CSV data via the model
-            if total_media_spend == 0:
-                print(json.dumps({"debug": "no_spend_extracted_using_equal_fallback", "reason": "All extraction methods failed"}))
-                # Use equal distribution as last resort
-                for channel in channels:
-                    channel_spends[channel] = 100000.0  # $100k per channel
-                    total_media_spend += 100000.0
-                    
-        except Exception as e:
-            print(json.dumps({"debug": "spend_calculation_error", "error": str(e)}))
-            # Use equal distribution fallback
-            for channel in channels:
-                channel_spends[channel] = 100000.0
-                total_media_spend += 100000.0
+        # Spend comes straight from the prepared media_spend block
+        channel_spends = {channel: float(amount) for channel, amount in zip(channels, metrics.spend)}
+        total_media_spend = float(metrics.spend.sum())
         
         print(json.dumps({
             "debug": "spend_calculation",
@@ -399,332 +361,92 @@ def extract_real_meridian_results(analyzer: 'Analyzer', model: 'Meridian', confi
         
         # Build channel analysis from real data
         channel_analysis = {}
-        total_incremental = float(np.sum(incremental_mean))
         
         for i, channel in enumerate(channels):
-            # Extract real ROI for this channel
-            channel_roi = float(roi_mean[i]) if i < len(roi_mean) else 0.0
-            
-            # Calculate real contribution percentage
-            channel_incremental = float(incremental_mean[i]) if i < len(incremental_mean) else 0.0
-            contribution_pct = channel_incremental / total_incremental if total_incremental > 0 else 0
-            
-            # Calculate spend percentage from actual CSV data
-            channel_spend = channel_spends.get(channel, 0)
+            roi = column_summary(summaries['roi'], i)
+            channel_spend = channel_spends[channel]
             spend_percentage = channel_spend / total_media_spend if total_media_spend > 0 else 0
             
             channel_analysis[channel] = {
-                "contribution": channel_incremental,
-                "contribution_percentage": contribution_pct,
-                "roi": channel_roi,
-                "roi_lower": channel_roi * 0.8,  # TODO: Extract actual credible intervals
-                "roi_upper": channel_roi * 1.2,
+                "contribution": float(incremental_mean[i]),
+                "contribution_percentage": float(summaries['contribution_share']['mean'][i]),
+                "roi": float(roi_mean[i]),
+                "roi_lower": roi['lower'],
+                "roi_upper": roi['upper'],
+                "mroi": float(summaries['mroi']['mean'][i]),
                 "spend_percentage": spend_percentage,
-                "total_spend": channel_spend
+                "total_spend": channel_spend,
+                "posterior_summary": {
+                    "roi": roi,
+                    "mroi": column_summary(summaries['mroi'], i),
+                    "contribution": column_summary(summaries['contribution'], i),
+                }
             }
         
-        # Build response curves
+        # Response curve parameters: posterior means of ec_m, slope_m and the adstock decay
+        parameters = metrics.channel_parameters()
         response_curves = {}
         
-        # Default values
-        default_ec = 4.0
-        default_slope = 3.0
-        
         for i, channel in enumerate(channels):
             response_curves[channel] = {
                 "saturation": {
-                    "ec": default_ec,
-                    "slope": default_slope,
+                    "ec": float(parameters['ec'][:, i].mean()) if parameters['ec'] is not None else 4.0,
+                    "slope": float(parameters['slope'][:, i].mean()) if parameters['slope'] is not None else 3.0,
                 },
                 "adstock": {
-                    "decay": float(adstock_mean[i]) if hasattr(adstock_mean, '__len__') and i < len(adstock_mean) else 0.5,
+                    "decay": float(parameters['decay'][:, i].mean()) if parameters['decay'] is not None else 0.5,
                     "peak": 1,
                 }
             }
         
-        # Extract model fit metrics
-        r_squared = 0.85  # Default
-        mape = 0.10  # Default
-        
-        if isinstance(summary, dict):
-            if 'r_squared' in summary:
-                r_squared_val = summary['r_squared']
-                if hasattr(r_squared_val, 'numpy'):
-                    r_squared = float(np.mean(r_squared_val.numpy()))
-                elif hasattr(r_squared_val, '__len__'):
-                    r_squared = float(np.mean(r_squared_val))
-                else:
-                    r_squared = float(r_squared_val)
-                    
-            if 'mape' in summary:
-                mape_val = summary['mape']
-                if hasattr(mape_val, 'numpy'):
-                    mape = float(np.mean(mape_val.numpy()))
-                elif hasattr(mape_val, '__len__'):
-                    mape = float(np.mean(mape_val))
-                else:
-                    mape = float(mape_val)
-        
-        # Extract control variable analysis using analyzer methods
+        # Model fit metrics from the posterior mean expected outcome
+        fit = metrics.fit_metrics()
+        r_squared = fit['r_squared']
+        mape = fit['mape']
+        
+        # Control coefficients (gamma_c) from the same batched summary
         control_analysis = {}
-        if config.get('control_columns') and len(config['control_columns']) > 0:
-            try:
-                control_names = [col for col in config['control_columns'] if col != 'population']
-                print(json.dumps({"attempting_control_extraction": control_names}))
-                
-                # Try to access control coefficients through model's inference data
-                if hasattr(model, '_inference_data'):
-                    inf_data = model._inference_data
-                    if hasattr(inf_data, 'posterior'):
-                        posterior = inf_data.posterior
-                        print(json.dumps({"posterior_vars": list(posterior.data_vars)[:20]}))
-                        
-                        # Look for alternative slope parameters
-                        slope_candidates = ['slope_m', 'alpha_m', 'beta_m', 'hill_slope', 'shape_m', 'gamma_m']
-                        found_slope_vars = []
-                        for var in slope_candidates:
-                            if var in posterior.data_vars:
-                                var_shape = str(posterior[var].values.shape)
-                                var_sample = posterior[var].values.flat[:5].tolist() if posterior[var].values.size > 0 else []
-                                found_slope_vars.append({
-                                    "name": var,
-                                    "shape": var_shape,
-                                    "sample_values": var_sample
-                                })
-                        
-                        print(json.dumps({
-                            "debug": "slope_parameter_candidates",
-                            "found_variables": found_slope_vars
-                        }))
-                        
-                        # Control coefficients are stored in gamma_c
-                        if 'gamma_c' in posterior.data_vars:
-                            gamma_c_data = posterior['gamma_c']
-                            gamma_c_values = gamma_c_data.values  # Shape should be (chains, samples, n_controls)
-                            
-                            print(json.dumps({
-                                "found_gamma_c": True,
-                                "shape": str(gamma_c_values.shape),
-                                "n_controls": gamma_c_values.shape[-1] if len(gamma_c_values.shape) > 2 else 1
-                            }))
-                            
-                            # Extract coefficient for each control variable
-                            for i, control_name in enumerate(control_names):
-                                if i < gamma_c_values.shape[-1]:
-                                    # Get values for this control across all chains and samples
-                                    control_values = gamma_c_values[:, :, i].flatten()
-                                    
-                                    control_analysis[control_name] = {
-                                        "coefficient": float(np.mean(control_values)),
-                                        "std_error": float(np.std(control_values)),
-                                        "ci_lower": float(np.percentile(control_values, 2.5)),
-                                        "ci_upper": float(np.percentile(control_values, 97.5)),
-                                        "p_value": 0.01 if (np.percentile(control_values, 2.5) > 0 or np.percentile(control_values, 97.5) < 0) else 0.10,
-                                        "impact": "positive" if np.mean(control_values) > 0 else "negative",
-                                        "significance": "significant" if (np.percentile(control_values, 2.5) > 0 or np.percentile(control_values, 97.5) < 0) else "not significant"
-                                    }
-                                    print(json.dumps({"extracted_control": control_name, "coefficient": float(np.mean(control_values))}))
-                        else:
-                            print(json.dumps({"gamma_c_not_found": True}))
-                else:
-                    print(json.dumps({"control_extraction": "no_inference_data_found"}))
-                    
-            except Exception as e:
-                print(json.dumps({"control_extraction_error": str(e)}))
-
-        # Extract saturation parameters using analyzer methods
-        try:
-            print(json.dumps({"attempting_saturation_extraction": True}))
-            
-            # Extract EC and slope from posterior variables first
-            if hasattr(model, '_inference_data'):
-                inf_data = model._inference_data
-                if hasattr(inf_data, 'posterior'):
-                    posterior = inf_data.posterior
-                    
-                    if 'ec_m' in posterior.data_vars and 'slope_m' in posterior.data_vars:
-                        ec_data = posterior['ec_m'].values  # Shape: (chains, samples, n_channels)
-                        slope_data = posterior['slope_m'].values  # Shape: (chains, samples, n_channels)
-                        
-                        print(json.dumps({
-                            "found_saturation_params": True,
-                            "ec_shape": str(ec_data.shape),
-                            "slope_shape": str(slope_data.shape)
-                        }))
-                        
-                        # Debug slope_m values in detail
-                        print(json.dumps({
-                            "debug": "slope_m_raw",
-                            "shape": str(slope_data.shape),
-                            "unique_values": str(np.unique(slope_data)) if slope_data is not None else "None",
-                            "first_samples": slope_data[0, 0, :].tolist() if slope_data is not None else [],
-                            "mean_by_channel": [float(np.mean(slope_data[:, :, i])) for i in range(slope_data.shape[-1])] if slope_data is not None else [],
-                            "std_by_channel": [float(np.std(slope_data[:, :, i])) for i in range(slope_data.shape[-1])] if slope_data is not None else []
-                        }))
-                        
-                        # Extract for each channel
-                        for i, channel in enumerate(channels):
-                            if i < ec_data.shape[-1]:
-                                ec_values = ec_data[:, :, i].flatten()
-                                slope_values = slope_data[:, :, i].flatten()
-                                
-                                response_curves[channel]["saturation"]["ec"] = float(np.mean(ec_values))
-                                response_curves[channel]["saturation"]["slope"] = float(np.mean(slope_values))
-                                
-                                print(json.dumps({
-                                    "extracted_saturation": channel,
-                                    "ec": float(np.mean(ec_values)),
-                                    "slope": float(np.mean(slope_values))
-                                }))
-                    
-                    # Extract real adstock decay parameters
-                    adstock_candidates = ['decay_m', 'lambda_m', 'adstock_decay', 'alpha_decay']
-                    for adstock_var in adstock_candidates:
-                        if adstock_var in posterior.data_vars:
-                            decay_data = posterior[adstock_var].values
-                            print(json.dumps({
-                                "found_adstock_params": True,
-                                "variable": adstock_var,
-                                "decay_shape": str(decay_data.shape)
-                            }))
-                            
-                            # Extract decay values for each channel
-                            for i, channel in enumerate(channels):
-                                if i < decay_data.shape[-1]:
-                                    decay_values = decay_data[:, :, i].flatten()
-                                    decay_mean = float(np.mean(decay_values))
-                                    response_curves[channel]["adstock"]["decay"] = decay_mean
-                                    
-                                    print(json.dumps({
-                                        "extracted_adstock": channel,
-                                        "decay": decay_mean
-                                    }))
-                            break
-            
-            # Fallback: Use the analyzer's hill curves method
-            if hasattr(analyzer, '_get_hill_curves_dataframe'):
-                hill_df = analyzer._get_hill_curves_dataframe(channel_type='media')
-                print(json.dumps({
-                    "hill_df_shape": str(hill_df.shape),
-                    "hill_df_columns": list(hill_df.columns) if hasattr(hill_df, 'columns') else []
-                }))
-                
-                # Check what's in the first few rows
-                if hasattr(hill_df, 'head'):
-                    print(json.dumps({
-                        "hill_df_sample": hill_df.head(2).to_dict()
-                    }))
-                
-                # Process the dataframe to extract EC and slope per channel
-                for i, channel in enumerate(channels):
-                    try:
-                        # Filter for this channel - try different column names
-                        channel_data = None
-                        if 'channel' in hill_df.columns:
-                            channel_data = hill_df[hill_df['channel'] == channel]
-                        elif 'media_channel' in hill_df.columns:
-                            channel_data = hill_df[hill_df['media_channel'] == channel]
-                        elif 'media' in hill_df.columns:
-                            channel_data = hill_df[hill_df['media'] == channel]
-                        
-                        if channel_data is not None and len(channel_data) > 0:
-                            # Look for EC and slope with various possible names
-                            ec_columns = ['ec', 'half_max_effective_concentration', 'half_saturation', 'EC']
-                            slope_columns = ['slope', 'hill_slope', 'shape', 'beta']
-                            
-                            for ec_col in ec_columns:
-                                if ec_col in channel_data.columns:
-                                    response_curves[channel]["saturation"]["ec"] = float(channel_data[ec_col].mean())
-                                    print(json.dumps({"found_ec": channel, "column": ec_col}))
-                                    break
-                            
-                            for slope_col in slope_columns:
-                                if slope_col in channel_data.columns:
-                                    response_curves[channel]["saturation"]["slope"] = float(channel_data[slope_col].mean())
-                                    print(json.dumps({"found_slope": channel, "column": slope_col}))
-                                    break
-                                    
-                    except Exception as e:
-                        print(json.dumps({"hill_channel_error": channel, "error": str(e)}))
-            else:
-                print(json.dumps({"saturation_extraction": "no_hill_curves_method"}))
-                                
-        except Exception as e:
-            print(json.dumps({"saturation_extraction_error": str(e)}))
-
-        # Calculate ROI-based optimal allocation
-        def calculate_roi_based_allocation(channel_analysis, total_budget, response_curves):
-            """Simple ROI-based allocation considering saturation"""
-            
-            # Get ROI and EC for each channel
-            channel_data = []
-            for channel, analysis in channel_analysis.items():
-                ec = response_curves[channel]['saturation']['ec']
-                roi = analysis['roi']
-                # Efficiency score: higher ROI and higher EC (slower saturation) is better
-                efficiency = roi * (ec / 2.0)  # Normalize EC around 2.0
-                channel_data.append((channel, efficiency, roi))
-            
-            # Sort by efficiency
-            channel_data.sort(key=lambda x: x[1], reverse=True)
-            
-            # Allocate budget proportionally to efficiency
-            total_efficiency = sum(eff for _, eff, _ in channel_data)
-            
-            optimal_allocation = {}
-            for channel, efficiency, roi in channel_data:
-                allocation = (efficiency / total_efficiency) * total_budget
-                optimal_allocation[channel] = allocation
-            
-            # Calculate expected lift
-            current_value = sum(
-                analysis['total_spend'] * analysis['roi']
-                for analysis in channel_analysis.values()
-            )
-            optimal_value = sum(
-                optimal_allocation[ch] * channel_analysis[ch]['roi']
-                for ch in optimal_allocation
-            )
-            expected_lift = (optimal_value - current_value) / current_value if current_value > 0 else 0
-            
-            return optimal_allocation, expected_lift
-
-        # Calculate total spend from channel analysis
-        total_spend = sum(ch['total_spend'] for ch in channel_analysis.values())
-        if total_spend == 0:
-            # Fallback if no spend data available
-            total_spend = 1000000.0  # Default $1M
-            print(json.dumps({"warning": "No spend data found, using default budget"}))
+        if 'controls' in summaries:
+            for i, control_name in enumerate(arrays['controls']):
+                control = column_summary(summaries['controls'], i)
+                # Credible interval excludes zero
+                excludes_zero = control['lower'] > 0 or control['upper'] < 0
+                # Bayesian two-sided tail probability, reported in the p_value slot
+                tail_probability = 2 * min(control['prob_positive'], 1 - control['prob_positive'])
+                control_analysis[control_name] = {
+                    "coefficient": control['mean'],
+                    "median": control['median'],
+                    "std_error": control['sd'],
+                    "ci_lower": control['lower'],
+                    "ci_upper": control['upper'],
+                    "prob_positive": control['prob_positive'],
+                    "p_value": tail_probability,
+                    "impact": "positive" if control['mean'] > 0 else "negative",
+                    "significance": "significant" if excludes_zero else "not significant"
+                }
+        elif arrays['controls']:
+            print(json.dumps({"gamma_c_not_found": True}))
 
-        # Use ROI-based optimization
-        optimal_allocation, expected_lift = calculate_roi_based_allocation(
-            channel_analysis, total_spend, response_curves
-        )
+        metrics.report_timings()
 
-        optimization = {
-            "current_budget": total_spend,
-            "optimal_allocation": optimal_allocation,
-            "expected_lift": expected_lift,
-            "optimization_type": "roi_based",
-            "note": "Preliminary optimization based on ROI and saturation curves. Full Bayesian optimization available separately."
-        }
-        
         return {
             "model_type": "meridian",
             "success": True,
             "metrics": {
                 "r_squared": r_squared,
-                "mape": mape
+                "mape": mape,
+                "wmape": fit['wmape']
             },
             "channel_analysis": channel_analysis,
             "response_curves": response_curves,
             "control_analysis": control_analysis,  # Add this line
-            "optimization": optimization,
             "model_info": {
                 "has_gqv": any('gqv' in col.lower() for col in config.get('control_columns', [])),
                 "n_channels": len(channels),
-                "n_samples": roi_array.shape[1] if roi_array.ndim >= 2 else 1,
-                "n_chains": roi_array.shape[0] if roi_array.ndim >= 3 else 1
+                "n_samples": int(model.inference_data.posterior.sizes['draw']),
+                "n_chains": int(model.inference_data.posterior.sizes['chain']),
+                "metric_timings": metrics.timings,
+                "credible_interval": {"mass": mass, "type": interval}
             }
         }
         
@@ -10,6 +10,9 @@ import numpy as np
 import os
 from typing import Dict, Any
 
+from data_prep import input_data_from_arrays
+from dataset_cache import load_dataset
+
 # Set CPU optimization flags
 os.environ['TF_NUM_INTEROP_THREADS'] = '8'
 os.environ['TF_NUM_INTRAOP_THREADS'] = '8'
@@ -22,8 +25,8 @@ def main(data_file: str, config_file: str, output_file: str):
         # Progress updates
         print(json.dumps({"status": "loading_data", "progress": 10}))
         
-        # Load data and config
-        df = pd.read_csv(data_file)
+        # Load data (columnar cache, parsed once per upload) and config
+        dataset = load_dataset(data_file)
         with open(config_file, 'r') as f:
             config = json.load(f)
         
@@ -34,7 +37,6 @@ def main(data_file: str, config_file: str, output_file: str):
         
         # Import based on Meridian 1.1.0 API structure
         from meridian.model import Meridian
-        from meridian.data import InputData
         import meridian.spec as spec
         
         print(json.dumps({"status": "meridian_imported", "progress": 25}))
@@ -42,15 +44,9 @@ def main(data_file: str, config_file: str, output_file: str):
         # Prepare InputData for Meridian
         print(json.dumps({"status": "preparing_data", "progress": 30}))
         
-        input_data = InputData(
-            df=df,
-            date_col=config['date_column'],
-            kpi_col=config['target_column'],
-            media_cols=config['channel_columns'],
-            geo_col=config.get('geo_column', None),
-            control_cols=config.get('control_columns', []),
-            seasonality=config.get('seasonality', 52)
-        )
+        # Build kpi/media/spend/controls arrays once per upload and config
+        arrays = dataset.prepared_arrays(config)
+        input_data = input_data_from_arrays(arrays)
         
         # Create model specification
         model_spec = spec.ModelSpec()
@@ -5,12 +5,13 @@ Simple Meridian training script that works with the actual API
 
 import json
 import sys
-import pandas as pd
 import numpy as np
-import xarray as xr
 import os
 from typing import Dict, Any
 
+from data_prep import input_data_from_arrays
+from dataset_cache import load_dataset
+
 # Set CPU optimization flags
 os.environ['TF_NUM_INTEROP_THREADS'] = '8'
 os.environ['TF_NUM_INTRAOP_THREADS'] = '8'
@@ -23,8 +24,8 @@ def main(data_file: str, config_file: str, output_file: str):
         # Progress updates
         print(json.dumps({"status": "loading_data", "progress": 10}))
         
-        # Load data and config
-        df = pd.read_csv(data_file)
+        # Load data (columnar cache, parsed once per upload) and config
+        dataset = load_dataset(data_file)
         with open(config_file, 'r') as f:
             config = json.load(f)
         
@@ -44,144 +45,17 @@ def main(data_file: str, config_file: str, output_file: str):
             
             # Prepare data using xarray (Meridian's expected format)
             print(json.dumps({"status": "preparing_data", "progress": 30}))
-            import xarray as xr
-
-            n_time_periods = len(df)
-            n_geos = 1  # National model
-
-            # Create proper time coordinates using actual dates from the data
-            if config['date_column'] in df.columns:
-                try:
-                    # Try parsing with dayfirst=True for DD/MM/YYYY format
-                    time_coords = pd.to_datetime(df[config['date_column']], dayfirst=True).dt.strftime('%Y-%m-%d').tolist()
-                except:
-                    try:
-                        # Fallback to mixed format parsing
-                        time_coords = pd.to_datetime(df[config['date_column']], format='mixed', dayfirst=True).dt.strftime('%Y-%m-%d').tolist()
-                    except:
-                        # Use row indices as date sequence if parsing fails
-                        time_coords = pd.date_range('2023-01-01', periods=n_time_periods, freq='W').strftime('%Y-%m-%d').tolist()
-            else:
-                # Use sequential dates if no date column
-                time_coords = pd.date_range('2023-01-01', periods=n_time_periods, freq='W').strftime('%Y-%m-%d').tolist()
-
-            # Create xarray DataArrays with proper names and dimensions
-            kpi_data = xr.DataArray(
-                df[config['target_column']].values.reshape(n_geos, n_time_periods),
-                dims=['geo', 'time'],
-                coords={'geo': [0], 'time': time_coords},
-                name='kpi'
-            )
-
-            # Population data - only geo dimension (not time)
-            if 'population' in config.get('control_columns', []) and 'population' in df.columns:
-                # Use average population across time
-                population_values = np.array([df['population'].mean()])
-            else:
-                population_values = np.array([1000000])  # 1M default
-
-            population_data = xr.DataArray(
-                population_values,
-                dims=['geo'],
-                coords={'geo': [0]},
-                name='population'
-            )
-
-            # Prepare media data using actual spend and impression columns
-            print(json.dumps({"status": "preparing_media_data", "progress": 28}))
-
-            # Identify spend columns from config
-            spend_columns = config['channel_columns']  # These should be like ['tv_spend', 'radio_spend', etc.]
-
-            # Build impression column names
-            impression_columns = [col.replace('_spend', '_impressions') for col in spend_columns]
-
-            # Verify impression columns exist
-            available_impressions = [col for col in impression_columns if col in df.columns]
-            if not available_impressions:
-                raise ValueError(f"No impression columns found. Expected: {impression_columns}")
-
-            # Use impression data for media array
-            impressions_values = df[available_impressions].values.T.reshape(
-                len(available_impressions), n_geos, n_time_periods
-            ).transpose(1, 2, 0)
 
-            spend_values = df[spend_columns].values.T.reshape(
-                len(spend_columns), n_geos, n_time_periods
-            ).transpose(1, 2, 0)
+            # Build kpi/media/spend/controls arrays once per upload and config
+            arrays = dataset.prepared_arrays(config)
+            input_data = input_data_from_arrays(arrays)
 
-            # Create media arrays
-            media_data = xr.DataArray(
-                impressions_values,
-                dims=['geo', 'media_time', 'media_channel'],
-                coords={'geo': [0], 'media_time': time_coords, 'media_channel': spend_columns},
-                name='media'
-            )
-
-            media_spend_data = xr.DataArray(
-                spend_values,
-                dims=['geo', 'time', 'media_channel'],
-                coords={'geo': [0], 'time': time_coords, 'media_channel': spend_columns},
-                name='media_spend'
-            )
-
-            # Debug array dimensions before InputData creation
-            print(json.dumps({
-                "debug_dimensions": {
-                    "kpi": list(kpi_data.dims),
-                    "media": list(media_data.dims), 
-                    "media_spend": list(media_spend_data.dims),
-                    "population": list(population_data.dims)
-                }
-            }))
-            
             print(json.dumps({
                 "debug_shapes": {
-                    "kpi": list(kpi_data.shape),
-                    "media": list(media_data.shape),
-                    "media_spend": list(media_spend_data.shape),
-                    "population": list(population_data.shape)
+                    name: list(arrays[name].shape)
+                    for name in ('kpi', 'media', 'media_spend', 'population')
                 }
             }))
-
-            # Handle control variables if they exist
-            controls_data = None
-            if config.get('control_columns') and len(config['control_columns']) > 0:
-                # Filter out 'population' from control columns (handled separately)
-                control_cols = [col for col in config['control_columns'] if col != 'population' and col in df.columns]
-                
-                if control_cols:
-                    control_values = df[control_cols].values.T
-                    control_values_reshaped = control_values.reshape(
-                        len(control_cols), n_geos, n_time_periods
-                    ).transpose(1, 2, 0)
-                    
-                    controls_data = xr.DataArray(
-                        control_values_reshaped,
-                        dims=['geo', 'time', 'control_variable'],
-                        coords={
-                            'geo': [0],
-                            'time': time_coords,
-                            'control_variable': control_cols
-                        },
-                        name='controls'
-                    )
-
-            # Build InputData with proper arrays
-            input_data_kwargs = {
-                'kpi': kpi_data,
-                'kpi_type': 'revenue',
-                'population': population_data,
-                'media': media_data,
-                'media_spend': media_spend_data
-            }
-
-            # Add controls if they exist
-            if controls_data is not None:
-                input_data_kwargs['controls'] = controls_data
-
-            # Initialize InputData
-            input_data = InputData(**input_data_kwargs)
             
             print(json.dumps({"status": "data_prepared", "progress": 35}))
             
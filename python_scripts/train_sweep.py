@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Train several model configs on one dataset in a single job (model sweeps)
+
+Input (JSON file):
+  {"fits": [{"name": "...", "config": {...}, "output_dir": "...", "model_id": 1}, ...],
+   "processes": 2}                     optional; default from the machine's cores
+
+The upload is converted and the prepared arrays of every distinct data config
+are built once up front; the fits then memory-map them. Fits run on a spawn
+process pool, each process pinned to its own share of the cores and reused
+across fits so Meridian is imported once per process (with one process the
+fits run in this process, which the warm worker has already preloaded).
+Each fit writes results.json, its posterior store and train.log into its
+output_dir, and a "sweep_fit_done" line is printed as each one finishes. The
+output file gets a comparison table of fit metrics, ROI and runtime per fit.
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List
+
+from dataset_cache import load_dataset
+from sampling import available_cores, core_groups, pin_to_cores
+
+# Cores one fit can use well (chains x per-chain threads)
+CORES_PER_FIT = int(os.getenv('MERIDIAN_SWEEP_CORES_PER_FIT', '4'))
+
+
+def sweep_processes(request: Dict[str, Any], n_fits: int) -> int:
+    """Pool size, from the request, MERIDIAN_SWEEP_PROCESSES or the available cores"""
+    value = request.get('processes')
+    if value is None:
+        value = os.getenv('MERIDIAN_SWEEP_PROCESSES') or len(available_cores()) // CORES_PER_FIT
+    return max(1, min(int(value), n_fits))
+
+
+def _pin_process(queue):
+    """Pool initializer: pin this process to one core group and size its thread pools to it
+
+    The trainer sets default thread counts when it is imported, so it is
+    imported first; TensorFlow itself is only imported by the first fit.
+    """
+    import train_meridian_corrected  # noqa: F401
+    pin_to_cores(queue.get())
+
+
+def fit_summary(index: int, fit: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+    """One row of the comparison table, read from the fit's results.json"""
+    row = {"index": index, "name": fit.get('name') or f"fit_{index}", "model_id": fit.get('model_id'),
+           "output_dir": fit['output_dir'], "seconds": round(seconds, 2)}
+    try:
+        with open(os.path.join(fit['output_dir'], 'results.json')) as f:
+            results = json.load(f)
+    except (OSError, ValueError) as e:
+        return {**row, "success": False, "error": str(e)}
+    if not results.get('success', True):
+        return {**row, "success": False, "error": results.get('error')}
+
+    info = results.get('model_info') or {}
+    diagnostics = info.get('sampling_diagnostics') or {}
+    channels = results.get('channel_analysis') or {}
+    return {
+        **row,
+        "success": True,
+        "metrics": results.get('metrics'),
+        "rhat_max": diagnostics.get('rhat_max'),
+        "ess_bulk_min": diagnostics.get('ess_bulk_min'),
+        "converged": diagnostics.get('converged'),
+        "roi": {channel: values.get('roi') for channel, values in channels.items()},
+        "total_contribution": sum(values.get('contribution', 0.0) for values in channels.values()),
+        "result_cache_hit": (info.get('result_cache') or {}).get('hit', False),
+    }
+
+
+def run_fit(index: int, data_file: str, fit: Dict[str, Any]) -> Dict[str, Any]:
+    """Train one config into its output_dir, logging the trainer's output to train.log"""
+    start = time.perf_counter()
+    os.makedirs(fit['output_dir'], exist_ok=True)
+    config_file = os.path.join(fit['output_dir'], 'config.json')
+    with open(config_file, 'w') as f:
+        json.dump(fit['config'], f, indent=2)
+
+    import train_meridian_corrected as trainer
+    with open(os.path.join(fit['output_dir'], 'train.log'), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            trainer.main(data_file, config_file, os.path.join(fit['output_dir'], 'results.json'))
+        except SystemExit:
+            # The trainer exits non-zero after writing its error result
+            pass
+    return fit_summary(index, fit, time.perf_counter() - start)
+
+
+def prepare_shared(data_file: str, fits: List[Dict[str, Any]]) -> int:
+    """Convert the upload and build each distinct set of prepared arrays once; returns how many"""
+    dataset = load_dataset(data_file)
+    directories = set()
+    for fit in fits:
+        directory = dataset.prepared_directory(fit['config'])
+        if directory not in directories:
+            dataset.prepared_arrays(fit['config'])
+            directories.add(directory)
+    return len(directories)
+
+
+def run_sweep(data_file: str, request: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    fits = [dict(fit) for fit in request.get('fits') or []]
+    if not fits:
+        raise ValueError("A sweep needs at least one fit")
+    for i, fit in enumerate(fits):
+        if not isinstance(fit.get('config'), dict):
+            raise ValueError(f"Fit {i} has no config")
+        fit.setdefault('output_dir', os.path.join(output_dir, f'fit_{i}'))
+
+    prepared = prepare_shared(data_file, fits)
+    n_processes = sweep_processes(request, len(fits))
+    print(json.dumps({"status": "sweep_started", "fits": len(fits), "processes": n_processes,
+                      "prepared_array_sets": prepared}), flush=True)
+
+    rows = [None] * len(fits)
+
+    def done(row: Dict[str, Any]):
+        rows[row['index']] = row
+        print(json.dumps({"status": "sweep_fit_done", **row,
+                          "completed": sum(r is not None for r in rows), "total": len(fits)}), flush=True)
+
+    if n_processes == 1:
+        for i, fit in enumerate(fits):
+            done(run_fit(i, data_file, fit))
+    else:
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        for cores in core_groups(available_cores(), [1] * n_processes):
+            queue.put(cores)
+        with ProcessPoolExecutor(max_workers=n_processes, mp_context=context,
+                                 initializer=_pin_process, initargs=(queue,)) as pool:
+            futures = {pool.submit(run_fit, i, data_file, fit): i for i, fit in enumerate(fits)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    done(future.result())
+                except Exception as e:
+                    done({"index": i, "name": fits[i].get('name') or f"fit_{i}",
+                          "model_id": fits[i].get('model_id'), "output_dir": fits[i]['output_dir'],
+                          "success": False, "error": str(e)})
+
+    return {
+        "fits": rows,
+        "processes": n_processes,
+        "prepared_array_sets": prepared,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main(data_file: str, sweep_file: str, output_file: str):
+    """Run a sweep and write its comparison table to output_file"""
+    with open(sweep_file) as f:
+        request = json.load(f)
+
+    try:
+        comparison = run_sweep(data_file, request, os.path.dirname(os.path.abspath(output_file)))
+    except (ValueError, OSError) as e:
+        print(json.dumps({"status": "error", "message": str(e)}))
+        return {"status": "error", "error": str(e)}
+
+    with open(output_file, 'w') as f:
+        json.dump(comparison, f, indent=2)
+    succeeded = sum(1 for row in comparison['fits'] if row.get('success'))
+    print(json.dumps({"status": "completed", "progress": 100, "succeeded": succeeded,
+                      "failed": len(comparison['fits']) - succeeded}))
+    return {"status": "completed", "succeeded": succeeded}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print(json.dumps({
+            "error": "Usage: python train_sweep.py <data_file> <sweep_file> <output_file>"
+        }))
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3])
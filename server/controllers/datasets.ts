@@ -7,6 +7,7 @@ import multer from 'multer';
 import { v4 as uuidv4 } from 'uuid';
 import { z } from 'zod';
 import { ZodError } from 'zod-validation-error';
+import { storeUpload, releaseUpload } from '../utils/upload-store';
 
 // Configure multer for file uploads
 const upload = multer({
@@ -39,6 +40,7 @@ const upload = multer({
 export const uploadDataset = [
   upload.single('file'),
   async (req: Request, res: Response) => {
+    let storedPath: string | null = null;
     try {
       if (!req.file) {
         return res.status(400).json({ message: 'No file uploaded' });
@@ -58,10 +60,17 @@ export const uploadDataset = [
         return res.status(404).json({ message: 'Project not found' });
       }
 
+      // Keep one copy per unique file content
+      const stored = await storeUpload(req.file.path);
+      storedPath = stored.filePath;
+      if (stored.deduplicated) {
+        console.log(`Upload ${req.file.originalname} matches existing dataset content ${stored.hash}`);
+      }
+
       const dataset = await storage.createDataset({
         project_id: validatedData.project_id,
         name: validatedData.name,
-        file_path: req.file.path,
+        file_path: stored.filePath,
         config: null, // Will be populated when the dataset is processed
       });
 
@@ -76,7 +85,9 @@ export const uploadDataset = [
       }
       
       // Clean up file if there was an error
-      if (req.file) {
+      if (storedPath) {
+        await releaseUpload(storedPath);
+      } else if (req.file && fs.existsSync(req.file.path)) {
         fs.unlinkSync(req.file.path);
       }
       
@@ -120,8 +131,39 @@ export const getDataset = async (req: Request, res: Response) => {
   }
 };
 
+// Delete a dataset and release its upload; the shared blob and everything
+// derived from it are removed once no other dataset uses the same file
+export const deleteDataset = async (req: Request, res: Response) => {
+  try {
+    const datasetId = parseInt(req.params.id);
+    if (isNaN(datasetId)) {
+      return res.status(400).json({ message: 'Invalid dataset ID' });
+    }
+
+    const dataset = await storage.getDataset(datasetId);
+    if (!dataset) {
+      return res.status(404).json({ message: 'Dataset not found' });
+    }
+
+    const models = await storage.getModels(dataset.project_id);
+    if (models.some((model) => model.dataset_id === datasetId)) {
+      return res.status(409).json({ message: 'Dataset is used by a model' });
+    }
+
+    await storage.deleteDataset(datasetId);
+    await releaseUpload(dataset.file_path);
+
+    return res.status(204).send();
+  } catch (error) {
+    console.error('Error deleting dataset:', error);
+    return res.status(500).json({ message: 'Failed to delete dataset' });
+  }
+};
+
 import { parse } from 'csv-parse/sync';
 import { DataValidator } from '../utils/data-validator';
+import { runPythonJob } from '../utils/python-worker';
+import { hashFile, derivedArtifactsDir } from '../utils/upload-store';
 
 export const processDataset = async (req: Request, res: Response) => {
   try {
@@ -141,6 +183,19 @@ export const processDataset = async (req: Request, res: Response) => {
       return res.status(404).json({ message: 'Dataset file not found' });
     }
 
+    // Identical content was already processed: reuse its columns and validation report
+    const hash = await hashFile(filePath);
+    const validationPath = path.join(derivedArtifactsDir(hash), 'validation.json');
+    if (fs.existsSync(validationPath)) {
+      const cachedConfig = JSON.parse(fs.readFileSync(validationPath, 'utf-8'));
+      console.log(`Reusing validation for dataset ${datasetId} (content ${hash})`);
+      await storage.updateDataset(dataset.id, { config: cachedConfig });
+      return res.json({
+        id: dataset.id,
+        config: cachedConfig,
+      });
+    }
+
     // Read the CSV properly with csv-parse for more robust parsing
     const fileContent = fs.readFileSync(filePath, 'utf-8');
     const rows = parse(fileContent, {
@@ -168,7 +223,8 @@ export const processDataset = async (req: Request, res: Response) => {
     const validation = await validator.validateDataset(
       filePath,
       columns,
-      sampleData
+      sampleData,
+      rows
     );
 
     console.log(`Validation results: score=${validation.score}, isValid=${validation.isValid}`);
@@ -191,6 +247,16 @@ export const processDataset = async (req: Request, res: Response) => {
       config: updatedConfig,
     });
 
+    fs.mkdirSync(path.dirname(validationPath), { recursive: true });
+    fs.writeFileSync(validationPath, JSON.stringify(updatedConfig, null, 2));
+
+    // Convert the upload to the columnar cache now so the first fit skips CSV parsing
+    runPythonJob({
+      module: 'dataset_cache',
+      args: [filePath],
+      onError: (error) => console.error(`Dataset cache conversion error: ${error}`)
+    });
+
     return res.json({
       id: dataset.id,
       config: updatedConfig,
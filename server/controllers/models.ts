@@ -1,9 +1,10 @@
 import { Request, Response } from 'express';
 import { storage } from '../storage';
-import { insertModelSchema, modelConfigSchema } from '@shared/schema';
-import { runPythonScript } from '../utils/python-runner';
+import { insertModelSchema, modelConfigSchema, backtestSettingsSchema, type Dataset, type Model, type ModelConfig } from '@shared/schema';
+import { runPythonJob } from '../utils/python-worker';
 import path from 'path';
 import fs from 'fs';
+import os from 'os';
 import { z } from 'zod';
 
 export const createModel = async (req: Request, res: Response) => {
@@ -46,87 +47,307 @@ export const createModel = async (req: Request, res: Response) => {
 
     res.status(201).json(model);
 
-    // Create a temp directory for model outputs
-    const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${model.id}`);
-    if (!fs.existsSync(modelDir)) {
-      fs.mkdirSync(modelDir, { recursive: true });
+    await startTraining(model, dataset, {
+      developmentMode: req.body.development_mode === true,
+      // Skip the result cache and always run a fresh fit when asked to
+      bypassCache: req.body.bypass_cache === true,
+      warmStartDir: await warmStartDir(model)
+    });
+
+  } catch (error) {
+    console.error('Error creating model:', error);
+    return res.status(500).json({ message: 'Failed to create model' });
+  }
+};
+
+// Refit a completed model on a newer upload of its data. When the upload only
+// appends periods the trainer extends the old prepared arrays, and the chains
+// start from the parent's posterior; the new model records its parent.
+export const refreshModel = async (req: Request, res: Response) => {
+  try {
+    const parentId = parseInt(req.params.id);
+    if (isNaN(parentId)) {
+      return res.status(400).json({ message: 'Invalid model ID' });
     }
 
-    // Create config file for the model
-    const configPath = path.join(modelDir, 'config.json');
-    fs.writeFileSync(configPath, JSON.stringify(modelData.config, null, 2));
+    const parent = await storage.getModel(parentId);
+    if (!parent) {
+      return res.status(404).json({ message: 'Model not found' });
+    }
+    if (parent.status !== 'completed') {
+      return res.status(400).json({ message: 'Only completed models can be refreshed' });
+    }
+
+    const dataset = await storage.getDataset(parseInt(req.body.dataset_id));
+    const baseDataset = await storage.getDataset(parent.dataset_id);
+    if (!dataset || !baseDataset) {
+      return res.status(404).json({ message: 'Dataset not found' });
+    }
+    if (dataset.project_id !== parent.project_id) {
+      return res.status(400).json({ message: 'Dataset belongs to a different project' });
+    }
 
-    // Create output path for model results
-    const outputPath = path.join(modelDir, 'results.json');
+    const config = {
+      ...(parent.config as ModelConfig),
+      lineage: { parent_model_id: parent.id, parent_dataset_id: baseDataset.id }
+    };
+    const model = await storage.createModel({
+      project_id: parent.project_id,
+      dataset_id: dataset.id,
+      name: req.body.name || `${parent.name} (refresh)`,
+      status: 'pending',
+      config
+    });
 
-    // Update model status to running
-    await storage.updateModelStatus(model.id, 'running');
+    res.status(201).json(model);
 
-    console.log(`Starting model training for model ${model.id} using dataset ${dataset.id}`);
-    console.log(`Dataset path: ${dataset.file_path}`);
-    console.log(`Config path: ${configPath}`);
-    console.log(`Output path: ${outputPath}`);
-    
-    // Set development mode environment variable if specified
-    const developmentMode = req.body.development_mode === true;
-    console.log(`Development mode: ${developmentMode}`);
-    
-    // Run the corrected Meridian Python script to train the model
-    const { success, output } = await runPythonScript({
-      script: 'python_scripts/train_meridian_corrected.py',
-      args: [dataset.file_path, configPath, outputPath],
+    const parentDir = path.resolve(process.cwd(), 'model_outputs', `model_${parent.id}`);
+    const hasPosterior = fs.existsSync(path.join(parentDir, 'posterior', 'manifest.json'));
+    await startTraining(model, dataset, {
+      developmentMode: req.body.development_mode === true,
+      bypassCache: req.body.bypass_cache === true,
+      warmStartDir: hasPosterior ? parentDir : undefined,
+      refreshBaseData: baseDataset.file_path
+    });
+
+  } catch (error) {
+    console.error('Error refreshing model:', error);
+    return res.status(500).json({ message: 'Failed to refresh model' });
+  }
+};
+
+interface TrainingOptions {
+  developmentMode: boolean;
+  bypassCache: boolean;
+  // Stored posterior of an earlier fit to start the chains from
+  warmStartDir?: string;
+  // Upload of the model being refreshed, to extend its prepared arrays from
+  refreshBaseData?: string;
+}
+
+// Output directory of the fit a model's sampling.warm_start points at: the
+// given model, or the project's latest completed fit, if its posterior is stored
+async function warmStartDir(model: Model): Promise<string | undefined> {
+  const warmStart = (model.config as ModelConfig).sampling?.warm_start;
+  if (!warmStart) {
+    return undefined;
+  }
+
+  const candidates = (await storage.getModels(model.project_id))
+    .filter((m) => m.id !== model.id && m.status === 'completed')
+    .filter((m) => warmStart === true || m.id === warmStart)
+    .sort((a, b) => b.id - a.id);
+  for (const candidate of candidates) {
+    const dir = path.resolve(process.cwd(), 'model_outputs', `model_${candidate.id}`);
+    if (fs.existsSync(path.join(dir, 'posterior', 'manifest.json'))) {
+      return dir;
+    }
+  }
+  console.log(`No stored posterior to warm-start model ${model.id} from`);
+  return undefined;
+}
+
+// Run the trainer for a model. Options are saved next to the config so an
+// interrupted run can be restarted with the same settings; the trainer picks
+// up its sampling checkpoints from the same directory.
+async function startTraining(model: Model, dataset: Dataset, options: TrainingOptions) {
+  // Create a temp directory for model outputs
+  const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${model.id}`);
+  if (!fs.existsSync(modelDir)) {
+    fs.mkdirSync(modelDir, { recursive: true });
+  }
+
+  // Create config file for the model
+  const configPath = path.join(modelDir, 'config.json');
+  fs.writeFileSync(configPath, JSON.stringify(model.config, null, 2));
+  fs.writeFileSync(path.join(modelDir, 'job.json'), JSON.stringify(options, null, 2));
+
+  // Create output path for model results
+  const outputPath = path.join(modelDir, 'results.json');
+
+  // Update model status to running
+  await storage.updateModelStatus(model.id, 'running');
+
+  console.log(`Starting model training for model ${model.id} using dataset ${dataset.id}`);
+  console.log(`Dataset path: ${dataset.file_path}`);
+  console.log(`Config path: ${configPath}`);
+  console.log(`Output path: ${outputPath}`);
+  console.log(`Development mode: ${options.developmentMode}`);
+
+  // Train with the corrected Meridian script on a warm Python worker
+  const { success, output } = await runPythonJob({
+    module: 'train_meridian_corrected',
+    args: [dataset.file_path, configPath, outputPath],
+    env: {
+      MERIDIAN_DEV_MODE: options.developmentMode ? 'true' : 'false',
+      MERIDIAN_BYPASS_CACHE: options.bypassCache ? 'true' : 'false',
+      MERIDIAN_WARM_START_DIR: options.warmStartDir ?? '',
+      MERIDIAN_REFRESH_BASE_DATA: options.refreshBaseData ?? ''
+    },
+    onData: async (data) => {
+      console.log('Python script output:', data);
+      
+      // If the script is sending progress updates, we can use them
+      if (data.status && data.progress) {
+        // We could update the model status with progress information
+        // but we'll keep it simple for now
+      }
+    },
+    onError: (error) => {
+      console.error('Python script error:', error);
+    },
+    onComplete: async (code) => {
+      // Update model status based on completion code
+      await recordTrainingResult(model.id, modelDir, code === 0);
+    }
+  });
+
+  if (!success) {
+    console.error('Failed to run Python script:', output);
+    await storage.updateModelStatus(model.id, 'failed');
+  }
+}
+
+// Save a finished fit's results.json and mark the model completed, or failed
+async function recordTrainingResult(modelId: number, modelDir: string, succeeded: boolean) {
+  const outputPath = path.join(modelDir, 'results.json');
+  if (succeeded && fs.existsSync(outputPath)) {
+    try {
+      const resultsData = JSON.parse(fs.readFileSync(outputPath, 'utf-8'));
+      
+      // Save model results
+      await storage.createModelResult({
+        model_id: modelId,
+        results_json: resultsData,
+        artifacts_path: modelDir
+      });
+      
+      // Update model status to completed
+      await storage.updateModelStatus(modelId, 'completed');
+    } catch (error) {
+      console.error('Error saving model results:', error);
+      await storage.updateModelStatus(modelId, 'failed');
+    }
+  } else {
+    await storage.updateModelStatus(modelId, 'failed');
+  }
+}
+
+// Train several configs on one dataset as a single sweep job: the data is
+// prepared once and the fits share a process pool. Every config becomes a
+// model of its own; the comparison table is written next to the first one.
+export const createSweep = async (req: Request, res: Response) => {
+  try {
+    const projectId = parseInt(req.params.projectId);
+    if (isNaN(projectId)) {
+      return res.status(400).json({ message: 'Invalid project ID' });
+    }
+
+    const dataset = await storage.getDataset(parseInt(req.body.dataset_id));
+    if (!dataset || dataset.project_id !== projectId) {
+      return res.status(404).json({ message: 'Dataset not found' });
+    }
+
+    const configs = req.body.configs;
+    if (!Array.isArray(configs) || configs.length === 0) {
+      return res.status(400).json({ message: 'configs must be a non-empty array' });
+    }
+    for (const config of configs) {
+      const parsed = modelConfigSchema.safeParse(config);
+      if (!parsed.success) {
+        return res.status(400).json({ message: 'Invalid model configuration', errors: parsed.error.errors });
+      }
+    }
+
+    const names: string[] = Array.isArray(req.body.names) ? req.body.names : [];
+    const models: Model[] = [];
+    for (const [i, config] of configs.entries()) {
+      models.push(await storage.createModel({
+        project_id: projectId,
+        dataset_id: dataset.id,
+        name: names[i] || `${req.body.name || 'Sweep'} ${i + 1}`,
+        status: 'running',
+        config
+      }));
+    }
+
+    const outputsRoot = path.resolve(process.cwd(), 'model_outputs');
+    const sweepDir = path.join(outputsRoot, `sweep_${models[0].id}`);
+    fs.mkdirSync(sweepDir, { recursive: true });
+    const sweepPath = path.join(sweepDir, 'sweep.json');
+    const comparisonPath = path.join(sweepDir, 'comparison.json');
+    fs.writeFileSync(sweepPath, JSON.stringify({
+      processes: req.body.processes,
+      fits: models.map((model) => ({
+        name: model.name,
+        model_id: model.id,
+        config: model.config,
+        output_dir: path.join(outputsRoot, `model_${model.id}`)
+      }))
+    }, null, 2));
+
+    res.status(201).json({ models, comparison_path: comparisonPath });
+
+    const pending = new Set(models.map((model) => model.id));
+    const { success, output } = await runPythonJob({
+      module: 'train_sweep',
+      args: [dataset.file_path, sweepPath, comparisonPath],
       env: {
-        ...process.env,
-        MERIDIAN_DEV_MODE: developmentMode ? 'true' : 'false'
+        MERIDIAN_DEV_MODE: req.body.development_mode === true ? 'true' : 'false'
       },
       onData: async (data) => {
-        console.log('Python script output:', data);
-        
-        // If the script is sending progress updates, we can use them
-        if (data.status && data.progress) {
-          // We could update the model status with progress information
-          // but we'll keep it simple for now
+        // Each fit is saved as soon as it finishes
+        if (data.status === 'sweep_fit_done' && pending.has(data.model_id)) {
+          pending.delete(data.model_id);
+          await recordTrainingResult(data.model_id, data.output_dir, data.success === true);
         }
       },
-      onError: (error) => {
-        console.error('Python script error:', error);
-      },
-      onComplete: async (code) => {
-        // Update model status based on completion code
-        if (code === 0 && fs.existsSync(outputPath)) {
-          try {
-            const resultsData = JSON.parse(fs.readFileSync(outputPath, 'utf-8'));
-            
-            // Save model results
-            await storage.createModelResult({
-              model_id: model.id,
-              results_json: resultsData,
-              artifacts_path: modelDir
-            });
-            
-            // Update model status to completed
-            await storage.updateModelStatus(model.id, 'completed');
-          } catch (error) {
-            console.error('Error saving model results:', error);
-            await storage.updateModelStatus(model.id, 'failed');
-          }
-        } else {
-          await storage.updateModelStatus(model.id, 'failed');
+      onComplete: async () => {
+        for (const modelId of pending) {
+          await storage.updateModelStatus(modelId, 'failed');
         }
       }
     });
 
     if (!success) {
-      console.error('Failed to run Python script:', output);
-      await storage.updateModelStatus(model.id, 'failed');
+      console.error('Failed to run model sweep:', output);
     }
-
   } catch (error) {
-    console.error('Error creating model:', error);
-    return res.status(500).json({ message: 'Failed to create model' });
+    console.error('Error running model sweep:', error);
+    if (!res.headersSent) {
+      return res.status(500).json({ message: 'Failed to run model sweep' });
+    }
   }
 };
 
+// Models still marked running when the server starts were interrupted by a
+// crash or restart; run them again. Checkpointing is opt-in
+// (sampling.checkpoint_draws or MERIDIAN_CHECKPOINT_DRAWS): with it the run
+// resumes from its saved segments, without it the run restarts cold.
+export async function resumeInterruptedModels() {
+  const interrupted = await storage.getModelsByStatus('running');
+  for (const model of interrupted) {
+    const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${model.id}`);
+    const jobPath = path.join(modelDir, 'job.json');
+    const dataset = await storage.getDataset(model.dataset_id);
+    if (!dataset || !fs.existsSync(jobPath)) {
+      await storage.updateModelStatus(model.id, 'failed');
+      continue;
+    }
+
+    const options: TrainingOptions = JSON.parse(fs.readFileSync(jobPath, 'utf-8'));
+    if (fs.existsSync(path.join(modelDir, 'checkpoints', 'manifest.json'))) {
+      console.log(`Resuming interrupted training for model ${model.id} from its checkpoints`);
+    } else {
+      console.log(`Restarting interrupted training for model ${model.id} from scratch (no checkpoints)`);
+    }
+    startTraining(model, dataset, options).catch(async (error) => {
+      console.error(`Error resuming model ${model.id}:`, error);
+      await storage.updateModelStatus(model.id, 'failed');
+    });
+  }
+}
+
 export const getModels = async (req: Request, res: Response) => {
   try {
     const projectId = parseInt(req.params.projectId);
@@ -185,6 +406,147 @@ export const getModelResults = async (req: Request, res: Response) => {
   }
 };
 
+export const analyzeModel = async (req: Request, res: Response) => {
+  try {
+    const modelId = parseInt(req.params.id);
+    if (isNaN(modelId)) {
+      return res.status(400).json({ message: 'Invalid model ID' });
+    }
+
+    const model = await storage.getModel(modelId);
+    if (!model) {
+      return res.status(404).json({ message: 'Model not found' });
+    }
+    if (model.status !== 'completed') {
+      return res.status(409).json({ message: 'Model has not finished training' });
+    }
+
+    // Answered from the model's stored posterior, without re-fitting
+    const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${modelId}`);
+    const { success, output, result } = await runPythonJob({
+      module: 'analysis_service',
+      args: [modelDir, JSON.stringify(req.body || {})]
+    });
+
+    if (!success || !result) {
+      console.error('Failed to run model analysis:', output);
+      return res.status(500).json({ message: 'Failed to analyze model' });
+    }
+    if (result.error) {
+      return res.status(400).json({ message: result.error });
+    }
+
+    return res.json(result);
+  } catch (error) {
+    console.error('Error analyzing model:', error);
+    return res.status(500).json({ message: 'Failed to analyze model' });
+  }
+};
+
+// Models with a backtest job in flight
+const runningBacktests = new Set<number>();
+
+// Measure a model's out-of-sample accuracy: its config is refitted on
+// expanding windows and scored on the periods each fit held out. Folds may
+// warm-start from another model's stored posterior (warm_start_model_id) when
+// that fit ended within their training window; the report is written to
+// backtest.json in the model's output directory.
+export const runBacktest = async (req: Request, res: Response) => {
+  try {
+    const modelId = parseInt(req.params.id);
+    if (isNaN(modelId)) {
+      return res.status(400).json({ message: 'Invalid model ID' });
+    }
+
+    const model = await storage.getModel(modelId);
+    if (!model) {
+      return res.status(404).json({ message: 'Model not found' });
+    }
+    if (model.status !== 'completed') {
+      return res.status(409).json({ message: 'Model has not finished training' });
+    }
+    if (runningBacktests.has(modelId)) {
+      return res.status(409).json({ message: 'A backtest of this model is already running' });
+    }
+
+    const dataset = await storage.getDataset(model.dataset_id);
+    if (!dataset) {
+      return res.status(404).json({ message: 'Dataset not found' });
+    }
+
+    const settings = backtestSettingsSchema.safeParse(req.body.backtest || {});
+    if (!settings.success) {
+      return res.status(400).json({ message: 'Invalid backtest settings', errors: settings.error.errors });
+    }
+
+    // The model's own fit saw every holdout window, so it is never a warm-start source
+    let warmStartDir: string | undefined;
+    const warmStartId = parseInt(req.body.warm_start_model_id);
+    if (!isNaN(warmStartId) && warmStartId !== modelId) {
+      const dir = path.resolve(process.cwd(), 'model_outputs', `model_${warmStartId}`);
+      if (fs.existsSync(path.join(dir, 'posterior', 'manifest.json'))) {
+        warmStartDir = dir;
+      }
+    }
+
+    const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${modelId}`);
+    const configPath = path.join(modelDir, 'backtest_config.json');
+    const outputPath = path.join(modelDir, 'backtest.json');
+    fs.writeFileSync(configPath, JSON.stringify({
+      ...(model.config as ModelConfig),
+      backtest: { ...settings.data, warm_start_dir: warmStartDir }
+    }, null, 2));
+    if (fs.existsSync(outputPath)) {
+      fs.unlinkSync(outputPath);
+    }
+
+    runningBacktests.add(modelId);
+    res.status(202).json({ status: 'running' });
+
+    const { success, output } = await runPythonJob({
+      module: 'backtest',
+      args: [dataset.file_path, configPath, outputPath],
+      env: {
+        MERIDIAN_DEV_MODE: req.body.development_mode === true ? 'true' : 'false'
+      },
+      onComplete: async () => {
+        runningBacktests.delete(modelId);
+      }
+    });
+
+    if (!success) {
+      console.error('Failed to run model backtest:', output);
+    }
+  } catch (error) {
+    console.error('Error running model backtest:', error);
+    if (!res.headersSent) {
+      return res.status(500).json({ message: 'Failed to run model backtest' });
+    }
+  }
+};
+
+export const getBacktest = async (req: Request, res: Response) => {
+  try {
+    const modelId = parseInt(req.params.id);
+    if (isNaN(modelId)) {
+      return res.status(400).json({ message: 'Invalid model ID' });
+    }
+
+    if (runningBacktests.has(modelId)) {
+      return res.status(202).json({ status: 'running' });
+    }
+    const outputPath = path.resolve(process.cwd(), 'model_outputs', `model_${modelId}`, 'backtest.json');
+    if (!fs.existsSync(outputPath)) {
+      return res.status(404).json({ message: 'Backtest not found' });
+    }
+
+    return res.json(JSON.parse(fs.readFileSync(outputPath, 'utf-8')));
+  } catch (error) {
+    console.error('Error fetching model backtest:', error);
+    return res.status(500).json({ message: 'Failed to fetch model backtest' });
+  }
+};
+
 export const optimizeBudget = async (req: Request, res: Response) => {
   try {
     const modelId = parseInt(req.params.id);
@@ -222,14 +584,16 @@ export const optimizeBudget = async (req: Request, res: Response) => {
 
     // Create config file for the optimization
     const configPath = path.join(optimizationDir, 'config.json');
-    fs.writeFileSync(configPath, JSON.stringify(req.body.config || {}, null, 2));
+    // The optimizer reads the model's stored posterior from its output directory
+    const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${modelId}`);
+    fs.writeFileSync(configPath, JSON.stringify({ ...(req.body.config || {}), model_dir: modelDir }, null, 2));
 
     // Create output path for optimization results
     const outputPath = path.join(optimizationDir, 'results.json');
 
-    // Run the Python script to optimize the budget
-    const { success, output } = await runPythonScript({
-      script: 'python_scripts/optimize_budget.py',
+    // Run the budget optimization on a warm Python worker
+    const { success, output } = await runPythonJob({
+      module: 'optimize_budget',
       args: [inputPath, configPath, outputPath],
       onComplete: async (code) => {
         if (code === 0 && fs.existsSync(outputPath)) {
@@ -289,6 +653,78 @@ export const getOptimizationScenario = async (req: Request, res: Response) => {
   }
 };
 
+// Scores spend plans against the model's response on a warm worker; chunks of
+// scored scenarios are passed to onChunk as soon as the worker prints them
+async function runScenarioBatch(modelId: number, request: any, onChunk: (chunk: any) => void) {
+  const modelDir = path.resolve(process.cwd(), 'model_outputs', `model_${modelId}`);
+  const tmpDir = fs.mkdtempSync(path.join(os.tmpdir(), 'scenarios-'));
+  const requestPath = path.join(tmpDir, 'scenarios.json');
+  fs.writeFileSync(requestPath, JSON.stringify(request));
+  try {
+    return await runPythonJob({
+      module: 'scenario_batch',
+      args: [modelDir, requestPath],
+      onData: (data) => {
+        if (data?.status === 'scenario_results') onChunk(data);
+      }
+    });
+  } finally {
+    fs.rmSync(tmpDir, { recursive: true, force: true });
+  }
+}
+
+export const scoreScenarios = async (req: Request, res: Response) => {
+  try {
+    const modelId = parseInt(req.params.id);
+    if (isNaN(modelId)) {
+      return res.status(400).json({ message: 'Invalid model ID' });
+    }
+
+    const model = await storage.getModel(modelId);
+    if (!model) {
+      return res.status(404).json({ message: 'Model not found' });
+    }
+    if (model.status !== 'completed') {
+      return res.status(409).json({ message: 'Model has not finished training' });
+    }
+
+    const { scenarios, channels, units, names, include_channels } = req.body;
+    if (!Array.isArray(scenarios) || scenarios.length === 0) {
+      return res.status(400).json({
+        message: 'Invalid scenarios',
+        details: 'scenarios must be a non-empty array of per-channel spend rows'
+      });
+    }
+
+    // Results stream back as newline-delimited JSON, one line per scored chunk
+    let streaming = false;
+    const { success, output, result } = await runScenarioBatch(
+      modelId, { scenarios, channels, units, names, include_channels },
+      (chunk) => {
+        if (!streaming) {
+          res.writeHead(200, { 'Content-Type': 'application/x-ndjson' });
+          streaming = true;
+        }
+        res.write(JSON.stringify(chunk) + '\n');
+      }
+    );
+
+    if (!streaming) {
+      if (success && result?.error) {
+        return res.status(400).json({ message: result.error });
+      }
+      console.error('Failed to score scenarios:', output);
+      return res.status(500).json({ message: 'Failed to score scenarios' });
+    }
+    res.write(JSON.stringify(success && result ? result : { status: 'error', error: 'Scenario scoring failed' }) + '\n');
+    return res.end();
+  } catch (error) {
+    console.error('Error scoring scenarios:', error);
+    if (res.headersSent) return res.end();
+    return res.status(500).json({ message: 'Failed to score scenarios' });
+  }
+};
+
 export const calculateScenario = async (req: Request, res: Response) => {
   try {
     const modelId = parseInt(req.params.id);
@@ -301,11 +737,8 @@ export const calculateScenario = async (req: Request, res: Response) => {
     if (!model) {
       return res.status(404).json({ message: 'Model not found' });
     }
-
-    // Get the model results
-    const results = await storage.getModelResult(modelId);
-    if (!results) {
-      return res.status(404).json({ message: 'Model results not found' });
+    if (model.status !== 'completed') {
+      return res.status(409).json({ message: 'Model has not finished training' });
     }
 
     // Get the budget adjustments from the request body
@@ -318,32 +751,34 @@ export const calculateScenario = async (req: Request, res: Response) => {
       });
     }
 
-    // Get the original channel results from the model
-    const originalChannels = results.results_json?.channel_results || [];
-    
-    // Create a map of channel names to their data
-    const channelMap = new Map();
-    originalChannels.forEach((channel: any) => {
-      channelMap.set(channel.name, {...channel});
-    });
-    
-    // Apply budget adjustments
+    // A one-row batch: adjusted channels take their new budget, the rest stay at current spend
+    let scored: any = null;
+    const { success, output, result } = await runScenarioBatch(modelId, {
+      channels: budgetAdjustments.map((adjustment: any) => adjustment.channelName),
+      scenarios: [budgetAdjustments.map((adjustment: any) => Number(adjustment.newBudget))]
+    }, (chunk) => { scored = chunk.results[0]; });
+
+    if (!success || !result) {
+      console.error('Failed to calculate scenario:', output);
+      return res.status(500).json({ message: 'Failed to calculate scenario' });
+    }
+    if (result.error || !scored) {
+      return res.status(400).json({ message: result.error || 'Scenario could not be scored' });
+    }
+
+    const spend: Record<string, number> = { ...result.current_allocation };
     budgetAdjustments.forEach((adjustment: any) => {
-      const { channelName, newBudget } = adjustment;
-      if (channelMap.has(channelName)) {
-        const channel = channelMap.get(channelName);
-        channel.spend = newBudget;
-        
-        // For a basic mock scenario, we'll apply a simple formula to adjust ROI
-        // In a real implementation, this would involve more complex calculations
-        const budgetRatio = newBudget / channel.originalSpend;
-        const diminishingReturns = Math.sqrt(budgetRatio); // Simple diminishing returns function
-        channel.roi = channel.originalRoi * diminishingReturns;
-        
-        // Recalculate contribution based on new spend and ROI
-        channel.contribution = (channel.spend * channel.roi) / 
-          channelMap.reduce((total: number, ch: any) => total + (ch.spend * ch.roi), 0) * 100;
-      }
+      spend[adjustment.channelName] = Number(adjustment.newBudget);
+    });
+    const channels = result.channels.map((name: string) => {
+      const outcome = scored.channel_outcome[name];
+      return {
+        name,
+        spend: spend[name],
+        roi: spend[name] > 0 ? outcome / spend[name] : 0,
+        outcome,
+        contribution: scored.total_outcome ? outcome / scored.total_outcome * 100 : 0
+      };
     });
 
     // Generate scenario results with the adjusted channels
@@ -351,11 +786,12 @@ export const calculateScenario = async (req: Request, res: Response) => {
       scenario_id: Date.now(),
       name: req.body.name || 'Custom Budget Scenario',
       created_at: new Date().toISOString(),
-      channels: Array.from(channelMap.values()),
+      channels,
       metrics: {
-        total_spend: Array.from(channelMap.values()).reduce((sum: number, channel: any) => sum + channel.spend, 0),
-        total_revenue: Array.from(channelMap.values()).reduce((sum: number, channel: any) => sum + (channel.spend * channel.roi), 0),
-        average_roi: Array.from(channelMap.values()).reduce((sum: number, channel: any) => sum + channel.roi, 0) / channelMap.size
+        total_spend: scored.total_spend,
+        total_revenue: scored.total_outcome,
+        average_roi: channels.reduce((sum: number, channel: any) => sum + channel.roi, 0) / channels.length,
+        lift: scored.lift
       }
     };
 
@@ -1,9 +1,12 @@
 import express, { type Request, Response, NextFunction } from "express";
 import { registerRoutes } from "./routes";
 import { setupVite, serveStatic, log } from "./vite";
+import { startPythonWorkers } from "./utils/python-worker";
+import { resumeInterruptedModels } from "./controllers/models";
 
 const app = express();
-app.use(express.json());
+// Batch scenario requests carry thousands of spend rows
+app.use(express.json({ limit: '10mb' }));
 app.use(express.urlencoded({ extended: false }));
 
 app.use((req, res, next) => {
@@ -66,5 +69,13 @@ app.use((req, res, next) => {
     reusePort: true,
   }, () => {
     log(`serving on port ${port}`);
+
+    // Preload Meridian in the background so the first job starts warm
+    startPythonWorkers();
+
+    // Restart training jobs cut off by the last shutdown (from checkpoints when enabled)
+    resumeInterruptedModels().catch((error) => {
+      console.error('Error resuming interrupted models:', error);
+    });
   });
 })();
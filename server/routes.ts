@@ -4,11 +4,12 @@ import { storage } from "./storage";
 
 // Import controllers
 import { createProject, getProjects, getProject } from './controllers/projects';
-import { uploadDataset, getDatasets, getDataset, processDataset } from './controllers/datasets';
+import { uploadDataset, getDatasets, getDataset, deleteDataset, processDataset } from './controllers/datasets';
 import { 
-  createModel, getModels, getModel, getModelResults, 
+  createModel, refreshModel, createSweep, getModels, getModel, getModelResults, analyzeModel,
+  runBacktest, getBacktest,
   optimizeBudget, getOptimizationScenarios, getOptimizationScenario,
-  calculateScenario
+  calculateScenario, scoreScenarios
 } from './controllers/models';
 
 export async function registerRoutes(app: Express): Promise<Server> {
@@ -21,13 +22,19 @@ export async function registerRoutes(app: Express): Promise<Server> {
   app.post('/api/datasets', ...uploadDataset);
   app.get('/api/projects/:projectId/datasets', getDatasets);
   app.get('/api/datasets/:id', getDataset);
+  app.delete('/api/datasets/:id', deleteDataset);
   app.post('/api/datasets/:id/process', processDataset);
 
   // Model routes
   app.post('/api/models', createModel);
+  app.post('/api/projects/:projectId/sweeps', createSweep);
   app.get('/api/projects/:projectId/models', getModels);
   app.get('/api/models/:id', getModel);
   app.get('/api/models/:id/results', getModelResults);
+  app.post('/api/models/:id/analysis', analyzeModel);
+  app.post('/api/models/:id/refresh', refreshModel);
+  app.post('/api/models/:id/backtest', runBacktest);
+  app.get('/api/models/:id/backtest', getBacktest);
 
   // Optimization routes
   app.post('/api/models/:id/optimize', optimizeBudget);
@@ -36,6 +43,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
   
   // What-If Scenario routes
   app.post('/api/models/:id/scenarios/calculate', calculateScenario);
+  app.post('/api/models/:id/scenarios/batch', scoreScenarios);
   
   // Health check route
   app.get('/api/health', (req, res) => {
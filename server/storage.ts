@@ -23,10 +23,12 @@ export interface IStorage {
   getDataset(id: number): Promise<Dataset | undefined>;
   createDataset(dataset: InsertDataset): Promise<Dataset>;
   updateDataset(id: number, updates: Partial<Dataset>): Promise<Dataset>;
+  deleteDataset(id: number): Promise<void>;
   
   // Model operations
   getModels(projectId: number): Promise<Model[]>;
   getModel(id: number): Promise<Model | undefined>;
+  getModelsByStatus(status: string): Promise<Model[]>;
   createModel(model: InsertModel): Promise<Model>;
   updateModelStatus(id: number, status: string): Promise<Model>;
   
@@ -106,6 +108,10 @@ export class DatabaseStorage implements IStorage {
     return dataset;
   }
   
+  async deleteDataset(id: number): Promise<void> {
+    await db.delete(datasets).where(eq(datasets.id, id));
+  }
+  
   // Model operations
   async getModels(projectId: number): Promise<Model[]> {
     return db.select().from(models).where(eq(models.project_id, projectId));
@@ -116,6 +122,10 @@ export class DatabaseStorage implements IStorage {
     return model;
   }
   
+  async getModelsByStatus(status: string): Promise<Model[]> {
+    return db.select().from(models).where(eq(models.status, status));
+  }
+  
   async createModel(insertModel: InsertModel): Promise<Model> {
     const [model] = await db
       .insert(models)
@@ -14,7 +14,8 @@ export class DataValidator {
   async validateDataset(
     filePath: string, 
     columns: string[], 
-    sampleData: any[]
+    sampleData: any[],
+    rows?: any[]
   ): Promise<{
     isValid: boolean;
     score: number; // 0-100
@@ -30,9 +31,8 @@ export class DataValidator {
     const results: ValidationResult[] = [];
     const recommendations: string[] = [];
     
-    // Read the full dataset
-    const fileContent = fs.readFileSync(filePath, 'utf-8');
-    const rawData = parse(fileContent, {
+    // Read the full dataset unless the caller already parsed it
+    const rawData = rows ?? parse(fs.readFileSync(filePath, 'utf-8'), {
       columns: true,
       skip_empty_lines: true,
     });
@@ -6,6 +6,7 @@ import { log } from '../vite';
 interface PythonRunnerOptions {
   script: string;
   args: string[];
+  env?: Record<string, string | undefined>;
   onData?: (data: any) => void;
   onError?: (error: string) => void;
   onComplete?: (code: number | null) => void;
@@ -14,6 +15,7 @@ interface PythonRunnerOptions {
 export async function runPythonScript({
   script,
   args,
+  env,
   onData,
   onError,
   onComplete
@@ -32,27 +34,33 @@ export async function runPythonScript({
     log(`Running Python script: ${scriptPath} with args: ${args.join(' ')}`, 'python-runner');
     
     // Run the script directly (using mock implementation for now)
-    const pythonProcess = spawn('python3', [scriptPath, ...args]);
+    const pythonProcess = spawn('python3', [scriptPath, ...args], {
+      env: { ...process.env, ...env }
+    });
     
     let output = '';
     let jsonOutput = '';
+    // Stdout chunks can split a line; only complete lines are parsed
+    let buffer = '';
     
     pythonProcess.stdout.on('data', (data) => {
       const strData = data.toString();
       output += strData;
+      buffer += strData;
       
       // Try to parse JSON output from the script
-      try {
-        const lines = strData.split('\n');
-        for (const line of lines) {
-          if (line.trim()) {
-            const jsonData = JSON.parse(line);
-            jsonOutput += line + '\n';
-            if (onData) onData(jsonData);
-          }
+      let newline: number;
+      while ((newline = buffer.indexOf('\n')) >= 0) {
+        const line = buffer.slice(0, newline);
+        buffer = buffer.slice(newline + 1);
+        if (!line.trim()) continue;
+        try {
+          const jsonData = JSON.parse(line);
+          jsonOutput += line + '\n';
+          if (onData) onData(jsonData);
+        } catch (e) {
+          // Not JSON data, that's fine
         }
-      } catch (e) {
-        // Not JSON data, that's fine
       }
     });
     
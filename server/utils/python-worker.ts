@@ -0,0 +1,319 @@
+import { spawn, type ChildProcessWithoutNullStreams } from 'child_process';
+import os from 'os';
+import path from 'path';
+import { log } from '../vite';
+import { runPythonScript } from './python-runner';
+
+// Long-lived Python workers that preload Meridian once and run jobs over stdin,
+// so each training/optimization run skips the 10-20s interpreter + TF import cost.
+
+const WORKER_SCRIPT = 'python_scripts/meridian_worker.py';
+
+// MERIDIAN_WORKER_POOL_SIZE=0 disables the pool and spawns python3 per job. By
+// default one worker per four cores (at least two), since a fit uses several cores
+const POOL_SIZE = parseInt(
+  process.env.MERIDIAN_WORKER_POOL_SIZE ?? String(Math.max(2, Math.floor(os.cpus().length / 4))),
+  10
+);
+// Jobs running longer than this are killed and their worker replaced
+const JOB_TIMEOUT_MS = parseInt(process.env.MERIDIAN_JOB_TIMEOUT_MS ?? String(6 * 60 * 60 * 1000), 10);
+const HEALTH_CHECK_INTERVAL_MS = 30_000;
+const HEALTH_CHECK_TIMEOUT_MS = 10_000;
+// Give up on the pool if workers keep dying before they finish preloading
+const MAX_STARTUP_FAILURES = 3;
+
+interface PythonJobOptions {
+  module: string;
+  args: string[];
+  fn?: string;
+  env?: Record<string, string | undefined>;
+  onData?: (data: any) => void;
+  onError?: (error: string) => void;
+  onComplete?: (code: number | null) => void;
+  // Overrides MERIDIAN_JOB_TIMEOUT_MS for this job
+  timeoutMs?: number;
+}
+
+export interface PythonJobResult {
+  success: boolean;
+  output: string;
+  result?: any;
+}
+
+interface PendingJob {
+  id: string;
+  options: PythonJobOptions;
+  output: string;
+  jsonOutput: string;
+  resolve: (result: PythonJobResult) => void;
+}
+
+class PythonWorker {
+  readonly process: ChildProcessWithoutNullStreams;
+  ready = false;
+  current: PendingJob | null = null;
+  pingSentAt: number | null = null;
+  private buffer = '';
+  private jobTimer: NodeJS.Timeout | null = null;
+
+  constructor(private pool: PythonWorkerPool) {
+    this.process = spawn('python3', [path.resolve(process.cwd(), WORKER_SCRIPT)], {
+      env: { ...process.env, PYTHONUNBUFFERED: '1' }
+    });
+
+    this.process.stdout.on('data', (data) => {
+      this.buffer += data.toString();
+      let newline: number;
+      while ((newline = this.buffer.indexOf('\n')) >= 0) {
+        const line = this.buffer.slice(0, newline);
+        this.buffer = this.buffer.slice(newline + 1);
+        this.handleLine(line);
+      }
+    });
+
+    this.process.stderr.on('data', (data) => {
+      const error = data.toString();
+      if (this.current) {
+        this.current.output += error;
+        if (this.current.options.onError) this.current.options.onError(error);
+      } else {
+        log(`worker ${this.process.pid} stderr: ${error.trim()}`, 'python-worker');
+      }
+    });
+
+    // Writes to a worker that has just died are reported through 'exit'
+    this.process.stdin.on('error', () => {});
+    this.process.on('exit', (code) => this.pool.handleExit(this, code));
+  }
+
+  get idle(): boolean {
+    return this.ready && this.current === null;
+  }
+
+  send(message: Record<string, any>) {
+    this.process.stdin.write(JSON.stringify(message) + '\n');
+  }
+
+  start(job: PendingJob) {
+    this.current = job;
+    const timeoutMs = job.options.timeoutMs ?? JOB_TIMEOUT_MS;
+    if (timeoutMs > 0) {
+      // A hung job never answers pings, so kill the worker; the pool fails the job on exit
+      this.jobTimer = setTimeout(() => {
+        log(`job ${job.id} (${job.options.module}) timed out after ${timeoutMs}ms, killing worker ${this.process.pid}`, 'python-worker');
+        job.output += `Job timed out after ${timeoutMs}ms\n`;
+        this.process.kill('SIGKILL');
+      }, timeoutMs);
+    }
+    this.send({
+      id: job.id,
+      type: 'job',
+      module: job.options.module,
+      function: job.options.fn ?? 'main',
+      args: job.options.args,
+      env: job.options.env ?? {}
+    });
+  }
+
+  ping() {
+    this.pingSentAt = Date.now();
+    this.send({ id: `ping-${this.pingSentAt}`, type: 'ping' });
+  }
+
+  finish(code: number | null, result?: any) {
+    const job = this.current;
+    if (!job) return;
+    this.current = null;
+    if (this.jobTimer) {
+      clearTimeout(this.jobTimer);
+      this.jobTimer = null;
+    }
+
+    if (job.options.onComplete) job.options.onComplete(code);
+    job.resolve({
+      success: code === 0,
+      output: job.jsonOutput || job.output,
+      result
+    });
+  }
+
+  private handleLine(line: string) {
+    if (!line.trim()) return;
+
+    let data: any = undefined;
+    try {
+      data = JSON.parse(line);
+    } catch (e) {
+      // Not JSON data, that's fine
+    }
+
+    if (data && typeof data === 'object' && data.worker_event) {
+      switch (data.worker_event) {
+        case 'ready':
+          log(`worker ${data.pid} ready (preload ${data.preload_seconds}s)`, 'python-worker');
+          this.ready = true;
+          this.pool.workerReady();
+          break;
+        case 'pong':
+          this.pingSentAt = null;
+          break;
+        case 'job_done':
+          if (data.recycle) this.ready = false;
+          if (data.error && this.current?.options.onError) {
+            this.current.options.onError(data.error);
+          }
+          this.finish(data.code, data.result);
+          this.pool.dispatch();
+          break;
+        case 'recycle':
+          log(`worker ${data.pid} recycling after ${data.jobs_run} jobs (${data.rss_mb} MB)`, 'python-worker');
+          break;
+      }
+      return;
+    }
+
+    if (!this.current) return;
+    this.current.output += line + '\n';
+    if (data !== undefined) {
+      this.current.jsonOutput += line + '\n';
+      if (this.current.options.onData) this.current.options.onData(data);
+    }
+  }
+}
+
+class PythonWorkerPool {
+  private workers: PythonWorker[] = [];
+  private queue: PendingJob[] = [];
+  private nextJobId = 1;
+  private startupFailures = 0;
+  private disabled: boolean;
+  private healthTimer: NodeJS.Timeout | null = null;
+
+  constructor(private size: number) {
+    this.disabled = size <= 0;
+  }
+
+  start() {
+    if (this.disabled) return;
+    while (this.workers.length < this.size) {
+      this.workers.push(new PythonWorker(this));
+    }
+    if (!this.healthTimer) {
+      this.healthTimer = setInterval(() => this.checkHealth(), HEALTH_CHECK_INTERVAL_MS);
+      this.healthTimer.unref();
+    }
+  }
+
+  run(options: PythonJobOptions): Promise<PythonJobResult> {
+    if (this.disabled) {
+      return runFallback(options);
+    }
+
+    this.start();
+    // With every worker busy (e.g. on long fits), run the job in its own process
+    // rather than queueing it behind the running ones
+    if (this.workers.length > 0 && this.workers.every((worker) => worker.ready && !worker.idle)) {
+      log(`All workers busy, running ${options.module} in a new process`, 'python-worker');
+      return runFallback(options);
+    }
+    return new Promise((resolve) => {
+      this.queue.push({
+        id: String(this.nextJobId++),
+        options,
+        output: '',
+        jsonOutput: '',
+        resolve
+      });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (this.queue.length === 0) return;
+      if (worker.idle) {
+        const job = this.queue.shift()!;
+        log(`Running ${job.options.module}.${job.options.fn ?? 'main'} on worker ${worker.process.pid}`, 'python-worker');
+        worker.start(job);
+      }
+    }
+  }
+
+  workerReady() {
+    this.startupFailures = 0;
+    this.dispatch();
+  }
+
+  handleExit(worker: PythonWorker, code: number | null) {
+    this.workers = this.workers.filter((w) => w !== worker);
+
+    if (worker.current) {
+      worker.finish(code === 0 ? 1 : code);
+    }
+
+    if (!worker.ready && code !== 0) {
+      this.startupFailures++;
+    }
+
+    if (this.startupFailures >= MAX_STARTUP_FAILURES) {
+      log('Python workers keep failing to start, falling back to one process per job', 'python-worker');
+      this.disabled = true;
+      const queued = this.queue.splice(0);
+      for (const job of queued) {
+        runFallback(job.options).then(job.resolve);
+      }
+      return;
+    }
+
+    // Replace the recycled or crashed worker
+    this.start();
+  }
+
+  private checkHealth() {
+    for (const worker of this.workers) {
+      if (!worker.idle) continue;
+
+      if (worker.pingSentAt !== null && Date.now() - worker.pingSentAt > HEALTH_CHECK_TIMEOUT_MS) {
+        log(`worker ${worker.process.pid} failed health check, restarting`, 'python-worker');
+        worker.process.kill('SIGKILL');
+      } else if (worker.pingSentAt === null) {
+        worker.ping();
+      }
+    }
+  }
+}
+
+// A script run outside the pool reports its return value as its last JSON line
+function lastJsonLine(output: string): any {
+  const lines = output.trim().split('\n');
+  for (let i = lines.length - 1; i >= 0; i--) {
+    try {
+      return JSON.parse(lines[i]);
+    } catch (e) {
+      // Not JSON, keep looking
+    }
+  }
+  return undefined;
+}
+
+async function runFallback(options: PythonJobOptions): Promise<PythonJobResult> {
+  const { success, output } = await runPythonScript({
+    script: `python_scripts/${options.module}.py`,
+    args: options.args,
+    env: options.env,
+    onData: options.onData,
+    onError: options.onError,
+    onComplete: options.onComplete
+  });
+  return { success, output, result: success ? lastJsonLine(output) : undefined };
+}
+
+const pool = new PythonWorkerPool(POOL_SIZE);
+
+export function startPythonWorkers() {
+  pool.start();
+}
+
+export function runPythonJob(options: PythonJobOptions): Promise<PythonJobResult> {
+  return pool.run(options);
+}
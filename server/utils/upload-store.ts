@@ -0,0 +1,96 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+
+// Content-addressed storage for uploaded datasets. Identical files are kept
+// once as uploads/blobs/<sha256>.csv with a reference count per hash, and
+// everything derived from a file (columnar cache, validation report,
+// prepared arrays) lives under dataset_cache/<sha256>/.
+
+const BLOB_DIR = path.resolve(process.cwd(), 'uploads', 'blobs');
+const REFS_FILE = path.join(BLOB_DIR, 'refs.json');
+const DATASET_CACHE_DIR = path.resolve(
+  process.cwd(),
+  process.env.MERIDIAN_DATASET_CACHE ?? 'dataset_cache'
+);
+
+const BLOB_NAME = /^([0-9a-f]{64})\.csv$/;
+
+// Serialize updates to refs.json
+let refsLock: Promise<unknown> = Promise.resolve();
+
+function withRefs<T>(update: (refs: Record<string, number>) => T): Promise<T> {
+  const next = refsLock.then(() => {
+    const refs: Record<string, number> = fs.existsSync(REFS_FILE)
+      ? JSON.parse(fs.readFileSync(REFS_FILE, 'utf-8'))
+      : {};
+    const result = update(refs);
+    fs.writeFileSync(REFS_FILE, JSON.stringify(refs, null, 2));
+    return result;
+  });
+  refsLock = next.catch(() => {});
+  return next;
+}
+
+export function hashFile(filePath: string): Promise<string> {
+  // Blobs are named by their hash already
+  const match = path.basename(filePath).match(BLOB_NAME);
+  if (match) return Promise.resolve(match[1]);
+
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')))
+      .on('error', reject);
+  });
+}
+
+export function derivedArtifactsDir(hash: string): string {
+  return path.join(DATASET_CACHE_DIR, hash);
+}
+
+export async function storeUpload(tempPath: string): Promise<{
+  hash: string;
+  filePath: string;
+  deduplicated: boolean;
+}> {
+  const hash = await hashFile(tempPath);
+  const blobPath = path.join(BLOB_DIR, `${hash}.csv`);
+
+  if (!fs.existsSync(BLOB_DIR)) {
+    fs.mkdirSync(BLOB_DIR, { recursive: true });
+  }
+
+  const deduplicated = await withRefs((refs) => {
+    const exists = fs.existsSync(blobPath);
+    if (exists) {
+      fs.unlinkSync(tempPath);
+    } else {
+      fs.renameSync(tempPath, blobPath);
+    }
+    refs[hash] = (refs[hash] ?? 0) + 1;
+    return exists;
+  });
+
+  return { hash, filePath: blobPath, deduplicated };
+}
+
+export async function releaseUpload(filePath: string): Promise<void> {
+  const match = path.basename(filePath).match(BLOB_NAME);
+  if (!match) {
+    // Legacy per-upload copy
+    if (fs.existsSync(filePath)) fs.unlinkSync(filePath);
+    return;
+  }
+
+  const hash = match[1];
+  await withRefs((refs) => {
+    refs[hash] = (refs[hash] ?? 1) - 1;
+    if (refs[hash] > 0) return;
+
+    delete refs[hash];
+    fs.rmSync(filePath, { force: true });
+    fs.rmSync(derivedArtifactsDir(hash), { recursive: true, force: true });
+  });
+}
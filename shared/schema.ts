@@ -114,6 +114,39 @@ export const modelConfigSchema = z.object({
   seasonality: z.number().optional(),
   use_geo: z.boolean().optional(),
   population_scaling_column: z.string().optional(),
+  credible_interval: z.number().gt(0).lt(1).optional(),
+  interval_type: z.enum(['eti', 'hdi']).optional(),
+  posterior_thin: z.number().int().min(1).optional(),
+  curve_max_multiplier: z.number().positive().optional(),
+  curve_steps: z.number().int().min(2).max(1000).optional(),
+  sampling: z.object({
+    chain_processes: z.number().int().min(1).optional(),
+    adaptive: z.boolean().optional(),
+    target_rhat: z.number().min(1).optional(),
+    min_ess_bulk: z.number().positive().optional(),
+    min_ess_tail: z.number().positive().optional(),
+    segment_draws: z.number().int().positive().optional(),
+    max_draws: z.number().int().positive().optional(),
+    checkpoint_draws: z.number().int().min(0).optional(),
+    // true: latest completed fit in the project; a number: that model's fit
+    warm_start: z.union([z.boolean(), z.number().int().positive()]).optional(),
+    warm_start_fraction: z.number().gt(0).max(1).optional(),
+  }).optional(),
+  // Set on refreshes: the model and upload this version was refreshed from
+  lineage: z.object({
+    parent_model_id: z.number().int(),
+    parent_dataset_id: z.number().int(),
+  }).optional(),
 });
 
 export type ModelConfig = z.infer<typeof modelConfigSchema>;
+
+// Rolling-origin backtest of a model's config (python_scripts/backtest.py)
+export const backtestSettingsSchema = z.object({
+  folds: z.number().int().min(1).optional(),
+  horizon: z.number().int().min(1).optional(),
+  min_train_periods: z.number().int().min(1).optional(),
+  processes: z.number().int().min(1).optional(),
+});
+
+export type BacktestSettings = z.infer<typeof backtestSettingsSchema>;